@@ -0,0 +1,307 @@
+"""Shard archive writers and readers.
+
+Shards are intermediate artifacts: `plan` and `apply` read them straight back,
+so the codec is a speed/size trade-off the caller picks rather than a fixed
+`w:gz` at level 9. An `ArchiveSpec` is an engine (who walks the tree and
+emits tar headers) plus a codec (what compresses the stream):
+
+  engines: tarfile (stdlib, default), bsdtar, gnutar
+  codecs:  none -> .tar, gzip[:L] / pigz[:L] -> .tar.gz, zstd[:L] -> .tar.zst
+
+External engines and compressors are plain subprocess pipelines. Under
+fakeroot they inherit LD_PRELOAD, so ownership comes out the same as with
+the stdlib engine.
+
+`archive_writer` hands out the open TarFile for producers that emit members
+themselves (the cpio transcoder in cpio.py) instead of walking a directory;
+those always use the stdlib engine but honour the codec.
+
+Both writers also leave a member index sidecar beside the archive (see
+memberindex.py). The stdlib engine records members as it writes them; the
+external engines' output is read back once. With the stdlib engine, gzip
+and (given `zstandard`) zstd output is written in independently enterable
+spans, and the sidecar carries the table that lets FragmentCache seek
+straight to a member (see seekable.py).
+
+`open_tar` is the matching reader used by FragmentCache and apply_plan. The
+stdlib handles .tar and .tar.gz; .tar.zst goes through `zstandard` if it is
+importable, else the `zstd` CLI, into a seekable temp file.
+"""
+from __future__ import annotations
+
+import contextlib
+import shutil
+import subprocess
+import tarfile
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+from .memberindex import IndexingTarFile, MemberIndexBuilder, index_existing
+from .seekable import CheckpointGzipWriter, FramedZstdWriter, can_write_zstd_frames
+
+
+class ArchiveError(RuntimeError):
+    pass
+
+
+ENGINES = ("tarfile", "bsdtar", "gnutar")
+
+# codec -> (file suffix, default level, (min, max) level)
+CODECS: dict[str, tuple[str, Optional[int], Optional[tuple[int, int]]]] = {
+    "none": (".tar", None, None),
+    "gzip": (".tar.gz", 6, (0, 9)),
+    "pigz": (".tar.gz", 6, (0, 11)),
+    "zstd": (".tar.zst", 3, (1, 19)),
+}
+
+# Every suffix a shard or fw2tar fragment may carry, longest first so
+# `strip_archive_suffix` never leaves a dangling `.tar`.
+ARCHIVE_SUFFIXES = (".tar.gz", ".tar.zst", ".tar")
+
+# Regex fragment matching any of ARCHIVE_SUFFIXES, for the name parsers in
+# tools.py.
+ARCHIVE_SUFFIX_RE = r"\.tar(?:\.gz|\.zst)?"
+
+_ENGINE_BINARIES = {"bsdtar": "bsdtar", "gnutar": "tar"}
+_CODEC_BINARIES = {"pigz": "pigz", "zstd": "zstd"}
+
+
+def is_archive_name(name: str) -> bool:
+    return name.endswith(ARCHIVE_SUFFIXES)
+
+
+def strip_archive_suffix(name: str) -> str:
+    for suffix in ARCHIVE_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def parse_codec(value: str) -> tuple[str, Optional[int]]:
+    """Parse `codec[:level]`, e.g. `none`, `gzip:1`, `zstd:19`. Raises
+    ValueError (argparse turns that into a usage error when used as `type=`).
+    """
+    codec, _, level_s = value.partition(":")
+    codec = codec.strip().lower()
+    if codec not in CODECS:
+        raise ValueError(f"unknown codec {codec!r} (known: {', '.join(CODECS)})")
+    _suffix, default, bounds = CODECS[codec]
+    if not level_s:
+        return codec, default
+    if bounds is None:
+        raise ValueError(f"codec {codec!r} takes no level")
+    level = int(level_s)
+    lo, hi = bounds
+    if not lo <= level <= hi:
+        raise ValueError(f"{codec} level must be in [{lo}, {hi}], got {level}")
+    return codec, level
+
+
+@dataclass(frozen=True)
+class ArchiveSpec:
+    engine: str = "tarfile"
+    codec: str = "gzip"
+    level: Optional[int] = 6
+
+    @classmethod
+    def parse(cls, codec_spec: str = "gzip", engine: str = "tarfile") -> "ArchiveSpec":
+        if engine not in ENGINES:
+            raise ValueError(f"unknown tar engine {engine!r} (known: {', '.join(ENGINES)})")
+        codec, level = parse_codec(codec_spec)
+        return cls(engine=engine, codec=codec, level=level)
+
+    @property
+    def suffix(self) -> str:
+        return CODECS[self.codec][0]
+
+    def describe(self) -> str:
+        lvl = f":{self.level}" if self.level is not None else ""
+        return f"{self.engine}+{self.codec}{lvl}"
+
+    def check_tools(self) -> None:
+        """Fail early (before a long extraction) if a required binary is missing."""
+        needed = []
+        if self.engine in _ENGINE_BINARIES:
+            needed.append(_ENGINE_BINARIES[self.engine])
+            if self.codec == "gzip":
+                needed.append("gzip")
+        if self.codec in _CODEC_BINARIES:
+            needed.append(_CODEC_BINARIES[self.codec])
+        missing = [b for b in needed if shutil.which(b) is None]
+        if missing:
+            raise ArchiveError(
+                f"archive spec {self.describe()} needs {', '.join(missing)} on PATH"
+            )
+
+    def _compressor_cmd(self) -> Optional[list[str]]:
+        """stdin->stdout compressor for this codec, or None for plain tar."""
+        if self.codec == "none":
+            return None
+        if self.codec == "gzip":
+            return ["gzip", f"-{self.level}", "-c", "-n"]
+        if self.codec == "pigz":
+            return ["pigz", f"-{self.level}", "-c", "-n"]
+        if self.codec == "zstd":
+            return ["zstd", f"-{self.level}", "-T0", "-q", "-c"]
+        raise ArchiveError(f"unknown codec {self.codec!r}")
+
+    def _engine_cmd(self, src: Path) -> list[str]:
+        if self.engine == "bsdtar":
+            return ["bsdtar", "-c", "-f", "-", "-C", str(src), "."]
+        if self.engine == "gnutar":
+            return ["tar", "--sort=name", "-c", "-f", "-", "-C", str(src), "."]
+        raise ArchiveError(f"unknown tar engine {self.engine!r}")
+
+
+def write_archive(src: Path, dest: Path, spec: ArchiveSpec, index: bool = True) -> None:
+    """Archive the tree at `src` into `dest` (members rooted at `.`).
+
+    Writes to `<dest>.part` and renames into place, so a reader never sees a
+    half-written shard and an existing `dest` (possibly hard-linked into the
+    run cache) is replaced rather than truncated. With `index`, the member
+    index sidecar is written next to `dest` afterwards.
+    """
+    part = dest.with_name(dest.name + ".part")
+    builder = MemberIndexBuilder() if index and spec.engine == "tarfile" else None
+    try:
+        _write_archive(src, part, spec, builder)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    part.replace(dest)
+    if builder is not None:
+        builder.write(dest)
+    elif index:
+        index_existing(dest, open_tar, _PLAIN_SEEK if spec.codec == "none" else None)
+
+
+@contextlib.contextmanager
+def archive_writer(dest: Path, spec: ArchiveSpec, index: bool = True) -> Iterator[tarfile.TarFile]:
+    """Open `dest` for writing tar members directly, with `spec`'s codec.
+    The engine is always the stdlib one. Same `.part` + rename contract as
+    `write_archive`; an exception in the body discards the partial file.
+    """
+    part = dest.with_name(dest.name + ".part")
+    builder = MemberIndexBuilder() if index else None
+    try:
+        with _tar_writer(part, spec, builder) as t:
+            yield t
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    part.replace(dest)
+    if builder is not None:
+        builder.write(dest)
+
+
+_PLAIN_SEEK = {"codec": "none", "checkpoints": []}
+
+
+@contextlib.contextmanager
+def _tar_writer(dest: Path, spec: ArchiveSpec,
+                index: Optional[MemberIndexBuilder] = None) -> Iterator[tarfile.TarFile]:
+    if spec.codec == "none":
+        with IndexingTarFile.open(dest, "w") as t:
+            t.member_index = index
+            yield t
+        if index is not None:
+            index.seek = _PLAIN_SEEK
+        return
+    if spec.codec == "gzip" or (spec.codec == "zstd" and can_write_zstd_frames()):
+        with open(dest, "wb") as raw:
+            if spec.codec == "gzip":
+                comp = CheckpointGzipWriter(raw, spec.level)
+            else:
+                comp = FramedZstdWriter(raw, spec.level)
+            with IndexingTarFile.open(fileobj=comp, mode="w") as t:
+                t.member_index = index
+                yield t
+            comp.close()
+        if index is not None:
+            index.seek = comp.seek_table()
+        return
+    with open(dest, "wb") as out:
+        comp = subprocess.Popen(spec._compressor_cmd(), stdin=subprocess.PIPE,
+                                stdout=out, stderr=subprocess.PIPE)
+        try:
+            with IndexingTarFile.open(fileobj=comp.stdin, mode="w|") as t:
+                t.member_index = index
+                yield t
+        finally:
+            comp.stdin.close()
+            err = comp.stderr.read()
+            comp.wait()
+    if comp.returncode != 0:
+        raise ArchiveError(f"{spec.codec} failed for {dest.name}: {err[:200]!r}")
+
+
+def _write_archive(src: Path, dest: Path, spec: ArchiveSpec,
+                   index: Optional[MemberIndexBuilder] = None) -> None:
+    if spec.engine == "tarfile":
+        with _tar_writer(dest, spec, index) as t:
+            t.add(src, arcname=".", recursive=True)
+        return
+
+    comp_cmd = spec._compressor_cmd()
+    with open(dest, "wb") as out:
+        producer = subprocess.Popen(spec._engine_cmd(src), stdout=out if comp_cmd is None else subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+        comp = None
+        if comp_cmd is not None:
+            comp = subprocess.Popen(comp_cmd, stdin=producer.stdout, stdout=out,
+                                    stderr=subprocess.DEVNULL)
+            producer.stdout.close()
+        _, err = producer.communicate()
+        if comp is not None:
+            comp.wait()
+    if producer.returncode != 0 or (comp is not None and comp.returncode != 0):
+        raise ArchiveError(f"{spec.describe()} failed for {dest.name}: {err[:200]!r}")
+
+
+class _OwningTarFile(tarfile.TarFile):
+    """A TarFile that also closes the file it reads (the decompressed
+    temp file), as tarfile.open does for the gzip stream it creates."""
+
+    owned: Optional[IO[bytes]] = None
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            if self.owned is not None:
+                self.owned.close()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _open_zstd(path: Path) -> tarfile.TarFile:
+    tmp = tempfile.TemporaryFile()
+    try:
+        import zstandard  # type: ignore
+    except ImportError:
+        zstandard = None
+    try:
+        if zstandard is not None:
+            with open(path, "rb") as src:
+                zstandard.ZstdDecompressor().copy_stream(src, tmp)
+        elif shutil.which("zstd"):
+            subprocess.run(["zstd", "-dc", "-q", str(path)], stdout=tmp, check=True)
+        else:
+            raise ArchiveError(f"{path.name}: reading .tar.zst needs the zstandard module or zstd on PATH")
+        tmp.seek(0)
+        tf = _OwningTarFile.open(fileobj=tmp, mode="r:")
+    except BaseException:
+        tmp.close()
+        raise
+    tf.owned = tmp
+    return tf
+
+
+def open_tar(path: Path) -> tarfile.TarFile:
+    """Open any shard/fragment archive for random-access reading."""
+    if str(path).endswith(".tar.zst"):
+        return _open_zstd(path)
+    return tarfile.open(path, "r:*")
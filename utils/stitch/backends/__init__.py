@@ -13,7 +13,7 @@ blocks) translate at the API boundary in their own `call()` method.
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Any, Protocol
+from typing import Any, Callable, Protocol
 
 
 @dataclass
@@ -48,6 +48,7 @@ class Backend(Protocol):
         messages: list[dict],
         tools: list[dict],
         force_tool: str | None = None,
+        on_tool_call: Callable[[ToolCall], None] | None = None,
     ) -> BackendResponse:
         """Issue one round-trip to the model.
 
@@ -61,6 +62,25 @@ class Backend(Protocol):
           translate this into a JSON-mode instruction or ignore it.
         - `force_tool`: name of a tool the model MUST call (used on the
           final-turn submit_plan force). None means "auto".
+        - `on_tool_call`: called with each ToolCall as soon as the backend
+          knows it in full, before the call returns (streamed replies), so
+          the harness can start the tool early. The same ToolCall objects
+          come back in the response. Backends that only learn the calls at
+          the end may ignore it.
+        """
+        ...
+
+    async def acall(
+        self,
+        system: str,
+        messages: list[dict],
+        tools: list[dict],
+        force_tool: str | None = None,
+        on_tool_call: Callable[[ToolCall], None] | None = None,
+    ) -> BackendResponse:
+        """`call` for asyncio (harness.arun). Same arguments and result.
+        Optional: the harness runs `call` in a worker thread for backends
+        without it.
         """
         ...
 
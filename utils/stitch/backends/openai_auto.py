@@ -47,27 +47,57 @@ class OpenAIAutoBackend:
     def _active(self) -> Backend:
         return self._ensure_json() if self._using_json else self._native
 
-    def call(self, system, messages, tools, force_tool=None) -> BackendResponse:
+    def call(self, system, messages, tools, force_tool=None, on_tool_call=None) -> BackendResponse:
+        turn = (system, messages, tools, force_tool, on_tool_call)
         if self._using_json:
-            return self._json.call(system, messages, tools, force_tool=force_tool)
+            return self._json.call(*turn)
 
         try:
-            resp = self._native.call(system, messages, tools, force_tool=force_tool)
+            resp = self._native.call(*turn)
         except Exception as e:
-            msg = str(e).lower()
-            if any(s in msg for s in ("tool", "function")) and ("not support" in msg or "400" in msg or "unsupported" in msg):
-                self._switch_to_json(f"server rejected tools: {e!s:.200}")
-                return self._ensure_json().call(system, messages, tools, force_tool=force_tool)
-            raise
+            if not self._rejected_tools(e):
+                raise
+            return self._ensure_json().call(*turn)
 
+        if self._gave_up_on_native(resp, force_tool):
+            return self._ensure_json().call(*turn)
+        return resp
+
+    async def acall(self, system, messages, tools, force_tool=None, on_tool_call=None) -> BackendResponse:
+        turn = (system, messages, tools, force_tool, on_tool_call)
+        if self._using_json:
+            return await self._json.acall(*turn)
+
+        try:
+            resp = await self._native.acall(*turn)
+        except Exception as e:
+            if not self._rejected_tools(e):
+                raise
+            return await self._ensure_json().acall(*turn)
+
+        if self._gave_up_on_native(resp, force_tool):
+            return await self._ensure_json().acall(*turn)
+        return resp
+
+    def _rejected_tools(self, e: Exception) -> bool:
+        """Whether a native-mode error means the server rejects `tools`
+        (and switch to JSON mode if so)."""
+        msg = str(e).lower()
+        if any(s in msg for s in ("tool", "function")) and ("not support" in msg or "400" in msg or "unsupported" in msg):
+            self._switch_to_json(f"server rejected tools: {e!s:.200}")
+            return True
+        return False
+
+    def _gave_up_on_native(self, resp: BackendResponse, force_tool: str | None) -> bool:
+        """Count empty native responses; True once it's time for JSON mode."""
         if not resp.tool_calls:
             self._consecutive_empty += 1
             if self._consecutive_empty >= 2 and force_tool is None:
                 self._switch_to_json("two consecutive empty tool_calls")
-                return self._ensure_json().call(system, messages, tools, force_tool=force_tool)
+                return True
         else:
             self._consecutive_empty = 0
-        return resp
+        return False
 
     def assistant_turn(self, response: BackendResponse) -> dict:
         return self._active().assistant_turn(response)
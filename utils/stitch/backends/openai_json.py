@@ -17,6 +17,10 @@ The robustness layer here exists because real models are slop:
   * They sometimes call the same tool with the same args three turns in a row
 
 All of these are recovered locally rather than blowing up to the harness.
+
+With cfg.llm_stream the reply is streamed and the stream is closed as soon
+as it holds a complete {"tool": ...} or {"final": ...} object, so whatever
+the model would have written after it is never generated.
 """
 from __future__ import annotations
 
@@ -24,10 +28,12 @@ import itertools
 import json
 import re
 import uuid
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
 from . import BackendResponse, ToolCall, register
-from .openai_native import _build_client
+from .openai_native import ping
+from .pool import alimited, async_client, limited, shared_client
+from .streaming import aconsume, consume, stream_request
 
 
 # Names of tools registered in tools.py. Filled in by harness at startup so
@@ -196,25 +202,41 @@ def _tool_descriptions_block(tools: list[dict]) -> str:
     return "\n".join(lines)
 
 
+class _ObjectStream:
+    """A streamed JSON-mode reply; `feed` says stop once the text holds a
+    complete tool call or final plan."""
+
+    def __init__(self):
+        self.text = ""
+        self.finish_reason = "stop"
+
+    def feed(self, chunk: Any) -> bool:
+        for choice in chunk.choices[:1]:
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+            piece = choice.delta.content if choice.delta is not None else None
+            if not piece:
+                continue
+            self.text += piece
+            # An object can only have just completed if this piece closed a brace.
+            if "}" in piece:
+                obj = extract_json_object(self.text)
+                if obj is not None and ("tool" in obj or "final" in obj):
+                    return True
+        return False
+
+
 @register("openai-json")
 class OpenAIJSONBackend:
     name = "openai-json"
 
     def __init__(self, cfg):
         self.cfg = cfg
-        self.client = _build_client(cfg)
+        self.client = shared_client(cfg)
         self._id_counter = itertools.count(1)
 
     def reachability_check(self) -> None:
-        try:
-            self.client.chat.completions.create(
-                model=self.cfg.model,
-                messages=[{"role": "user", "content": "ping"}],
-                max_tokens=1,
-                timeout=10.0,
-            )
-        except Exception as e:
-            raise SystemExit(f"LLM endpoint unreachable (model={self.cfg.model!r}): {e}")
+        ping(self.cfg, self.client)
 
     def call(
         self,
@@ -222,7 +244,41 @@ class OpenAIJSONBackend:
         messages: list[dict],
         tools: list[dict],
         force_tool: str | None = None,
+        on_tool_call: Callable[[ToolCall], None] | None = None,
     ) -> BackendResponse:
+        kwargs = self._request(system, messages, tools, force_tool)
+        with limited(self.cfg, kwargs) as grant:
+            if self.cfg.llm_stream:
+                streamed = _ObjectStream()
+                consume(self.client.chat.completions.create(**stream_request(self.cfg, kwargs)),
+                        streamed.feed, grant)
+                return self._parse(streamed.text, streamed.finish_reason)
+            resp = self.client.chat.completions.create(**kwargs)
+            grant.used(resp)
+        return self._response(resp)
+
+    async def acall(
+        self,
+        system: str,
+        messages: list[dict],
+        tools: list[dict],
+        force_tool: str | None = None,
+        on_tool_call: Callable[[ToolCall], None] | None = None,
+    ) -> BackendResponse:
+        kwargs = self._request(system, messages, tools, force_tool)
+        async with alimited(self.cfg, kwargs) as grant:
+            client = async_client(self.cfg)
+            if self.cfg.llm_stream:
+                streamed = _ObjectStream()
+                await aconsume(await client.chat.completions.create(**stream_request(self.cfg, kwargs)),
+                               streamed.feed, grant)
+                return self._parse(streamed.text, streamed.finish_reason)
+            resp = await client.chat.completions.create(**kwargs)
+            grant.used(resp)
+        return self._response(resp)
+
+    def _request(self, system: str, messages: list[dict], tools: list[dict],
+                 force_tool: str | None) -> dict[str, Any]:
         # Build a plan_schema entry for the instructions, lifting it out of
         # the submit_plan tool definition.
         plan_schema = ""
@@ -245,15 +301,13 @@ class OpenAIJSONBackend:
             )
 
         msgs = [{"role": "system", "content": full_system}, *messages]
+        return {"model": self.cfg.model, "messages": msgs, "temperature": 0.0}
 
-        resp = self.client.chat.completions.create(
-            model=self.cfg.model,
-            messages=msgs,
-            temperature=0.0,
-        )
-        text = resp.choices[0].message.content or ""
-        finish = resp.choices[0].finish_reason or "stop"
+    def _response(self, resp: Any) -> BackendResponse:
+        return self._parse(resp.choices[0].message.content or "",
+                           resp.choices[0].finish_reason or "stop", resp)
 
+    def _parse(self, text: str, finish: str, raw: Any = None) -> BackendResponse:
         # Parse with the robustness layer.
         obj = extract_json_object(text)
         tool_calls: list[ToolCall] = []
@@ -280,7 +334,7 @@ class OpenAIJSONBackend:
             tool_calls=tool_calls,
             text=text,
             finish_reason=finish,
-            raw=resp,
+            raw=raw,
         )
 
     def assistant_turn(self, response: BackendResponse) -> dict:
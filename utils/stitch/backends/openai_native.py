@@ -3,38 +3,36 @@
 Works against api.openai.com, vllm, recent ollama, llama.cpp server, etc. —
 anything that implements the OpenAI `chat.completions` endpoint with the
 `tools` parameter.
+
+Clients come from backends/pool.py: one keep-alive pool per endpoint for
+the whole process, shared by every run (and every thread). `acall` is the
+asyncio path used by harness.arun. With cfg.llm_stream the completion is
+streamed and each tool call goes to `on_tool_call` as soon as its
+arguments are complete (backends/streaming.py).
 """
 from __future__ import annotations
 
 import json
-from typing import Any
+from typing import Any, Callable
 
 from . import BackendResponse, ToolCall, register
+from .pool import alimited, async_client, check_once, limited, shared_client
+from .streaming import ToolCallStream, aconsume, consume, parse_arguments, stream_request
 
 
-def _import_openai():
-    try:
-        from openai import OpenAI  # type: ignore
-        return OpenAI
-    except ImportError as e:
-        raise SystemExit(
-            "openai package not installed. "
-            "Install with: pip install -r fw2tar/utils/stitch/requirements.txt"
-        ) from e
-
-
-def _build_client(cfg):
-    OpenAI = _import_openai()
-    if cfg.insecure:
+def ping(cfg, client) -> None:
+    """One-token completion, once per (endpoint, model) per process."""
+    def once() -> None:
         try:
-            import httpx
-        except ImportError as e:
-            raise SystemExit(
-                "--insecure requires httpx (a transitive dep of openai)."
-            ) from e
-        http_client = httpx.Client(verify=False, timeout=cfg.request_timeout)
-        return OpenAI(base_url=cfg.base_url, api_key=cfg.api_key, http_client=http_client)
-    return OpenAI(base_url=cfg.base_url, api_key=cfg.api_key, timeout=cfg.request_timeout)
+            client.chat.completions.create(
+                model=cfg.model,
+                messages=[{"role": "user", "content": "ping"}],
+                max_tokens=1,
+                timeout=10.0,
+            )
+        except Exception as e:
+            raise SystemExit(f"LLM endpoint unreachable (model={cfg.model!r}): {e}")
+    check_once(cfg, once)
 
 
 @register("openai-native")
@@ -43,18 +41,10 @@ class OpenAINativeBackend:
 
     def __init__(self, cfg):
         self.cfg = cfg
-        self.client = _build_client(cfg)
+        self.client = shared_client(cfg)
 
     def reachability_check(self) -> None:
-        try:
-            self.client.chat.completions.create(
-                model=self.cfg.model,
-                messages=[{"role": "user", "content": "ping"}],
-                max_tokens=1,
-                timeout=10.0,
-            )
-        except Exception as e:
-            raise SystemExit(f"LLM endpoint unreachable (model={self.cfg.model!r}): {e}")
+        ping(self.cfg, self.client)
 
     def call(
         self,
@@ -62,7 +52,41 @@ class OpenAINativeBackend:
         messages: list[dict],
         tools: list[dict],
         force_tool: str | None = None,
+        on_tool_call: Callable[[ToolCall], None] | None = None,
+    ) -> BackendResponse:
+        kwargs = self._request(system, messages, tools, force_tool)
+        with limited(self.cfg, kwargs) as grant:
+            if self.cfg.llm_stream:
+                streamed = ToolCallStream(on_tool_call)
+                consume(self.client.chat.completions.create(**stream_request(self.cfg, kwargs)),
+                        streamed.feed, grant)
+                return streamed.response()
+            resp = self.client.chat.completions.create(**kwargs)
+            grant.used(resp)
+        return self._response(resp)
+
+    async def acall(
+        self,
+        system: str,
+        messages: list[dict],
+        tools: list[dict],
+        force_tool: str | None = None,
+        on_tool_call: Callable[[ToolCall], None] | None = None,
     ) -> BackendResponse:
+        kwargs = self._request(system, messages, tools, force_tool)
+        async with alimited(self.cfg, kwargs) as grant:
+            client = async_client(self.cfg)
+            if self.cfg.llm_stream:
+                streamed = ToolCallStream(on_tool_call)
+                await aconsume(await client.chat.completions.create(**stream_request(self.cfg, kwargs)),
+                               streamed.feed, grant)
+                return streamed.response()
+            resp = await client.chat.completions.create(**kwargs)
+            grant.used(resp)
+        return self._response(resp)
+
+    def _request(self, system: str, messages: list[dict], tools: list[dict],
+                 force_tool: str | None) -> dict[str, Any]:
         # OpenAI wants system as the first message.
         msgs = [{"role": "system", "content": system}, *messages]
         kwargs: dict[str, Any] = {
@@ -75,17 +99,15 @@ class OpenAINativeBackend:
             kwargs["tool_choice"] = {"type": "function", "function": {"name": force_tool}}
         else:
             kwargs["tool_choice"] = "auto"
+        return kwargs
 
-        resp = self.client.chat.completions.create(**kwargs)
+    def _response(self, resp: Any) -> BackendResponse:
         msg = resp.choices[0].message
         raw_tool_calls = getattr(msg, "tool_calls", None) or []
         tool_calls: list[ToolCall] = []
         for tc in raw_tool_calls:
-            try:
-                args = json.loads(tc.function.arguments or "{}")
-            except json.JSONDecodeError:
-                args = {"__raw_arguments__": tc.function.arguments}
-            tool_calls.append(ToolCall(id=tc.id, name=tc.function.name, args=args))
+            tool_calls.append(ToolCall(id=tc.id, name=tc.function.name,
+                                       args=parse_arguments(tc.function.arguments)))
 
         return BackendResponse(
             tool_calls=tool_calls,
@@ -0,0 +1,226 @@
+"""Process-wide OpenAI clients and per-endpoint request limits.
+
+`batch`, or a caller running many `harness.arun` loops at once, plans
+hundreds of shard dirs against one model server from a single process.
+Building a client per run re-pays TLS setup and the reachability ping
+every time, and N unthrottled runs can swamp the server. So everything
+that talks to an endpoint goes through this module:
+
+  shared_client(cfg)   one synchronous client per (base_url, api_key,
+                       insecure, timeout), on a keep-alive connection pool;
+                       safe to share between threads.
+  async_client(cfg)    the same for asyncio, one per event loop (a pool's
+                       connections belong to the loop that opened them).
+  check_once(cfg, ping)
+                       a (base_url, model) pair is pinged once per process;
+                       runs starting together wait for the first ping.
+  limited / alimited   hold a slot on the endpoint's EndpointLimiter around
+                       one completion, if cfg sets a concurrency or
+                       tokens-per-minute cap.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+_lock = threading.Lock()
+_clients: dict[tuple, Any] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple, Any]]" = \
+    weakref.WeakKeyDictionary()
+_reachable: set[tuple[Optional[str], str]] = set()
+_ping_locks: dict[tuple[Optional[str], str], threading.Lock] = {}
+_limiters: dict[Optional[str], "EndpointLimiter"] = {}
+
+# Polling interval while waiting for a concurrency slot.
+_SLOT_POLL = 0.05
+# Rough prompt-size estimate before the server reports real usage.
+_CHARS_PER_TOKEN = 4
+
+
+def _import_openai():
+    try:
+        import openai  # type: ignore
+        return openai
+    except ImportError as e:
+        raise SystemExit(
+            "openai package not installed. "
+            "Install with: pip install -r fw2tar/utils/stitch/requirements.txt"
+        ) from e
+
+
+def _client_key(cfg) -> tuple:
+    return (cfg.base_url, cfg.api_key, bool(cfg.insecure), cfg.request_timeout)
+
+
+def _new_client(cfg, asynchronous: bool):
+    openai = _import_openai()
+    # openai's default http clients already keep connections alive; build
+    # one explicitly so --insecure and the timeout apply to the pool.
+    http_cls = openai.DefaultAsyncHttpxClient if asynchronous else openai.DefaultHttpxClient
+    http_client = http_cls(verify=not cfg.insecure, timeout=cfg.request_timeout)
+    client_cls = openai.AsyncOpenAI if asynchronous else openai.OpenAI
+    return client_cls(base_url=cfg.base_url, api_key=cfg.api_key, http_client=http_client)
+
+
+def shared_client(cfg):
+    key = _client_key(cfg)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = _new_client(cfg, asynchronous=False)
+        return client
+
+
+def async_client(cfg):
+    """The running event loop's client for cfg's endpoint."""
+    loop = asyncio.get_running_loop()
+    key = _client_key(cfg)
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = _new_client(cfg, asynchronous=True)
+        return client
+
+
+async def close_async_clients() -> None:
+    """Close the running loop's clients; call before the loop ends."""
+    with _lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
+def check_once(cfg, ping: Callable[[], None]) -> None:
+    """Run `ping` unless it already succeeded for cfg's endpoint and model."""
+    key = (cfg.base_url, cfg.model)
+    with _lock:
+        ping_lock = _ping_locks.setdefault(key, threading.Lock())
+    with ping_lock:
+        if key in _reachable:
+            return
+        ping()
+        _reachable.add(key)
+
+
+# --------------- limits ---------------
+
+class EndpointLimiter:
+    """At most `concurrency` completions in flight and `tokens_per_minute`
+    tokens per minute against one endpoint (0 = no cap), across threads and
+    event loops.
+
+    Tokens are a bucket refilled at tokens_per_minute / 60 per second. A
+    request takes its estimated prompt size up front, then is charged the
+    difference once the server reports usage, so the bucket can go into
+    debt and make later requests wait.
+    """
+
+    def __init__(self, concurrency: int, tokens_per_minute: int):
+        self.concurrency = concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._active = 0
+        self._tokens = float(tokens_per_minute)
+        self._stamp = time.monotonic()
+
+    def _try_acquire(self, estimate: int) -> float:
+        """0 if a slot was taken, else how long to wait before retrying."""
+        with self._lock:
+            if self.concurrency and self._active >= self.concurrency:
+                return _SLOT_POLL
+            if self.tokens_per_minute:
+                now = time.monotonic()
+                rate = self.tokens_per_minute / 60.0
+                self._tokens = min(float(self.tokens_per_minute),
+                                   self._tokens + (now - self._stamp) * rate)
+                self._stamp = now
+                need = min(estimate, self.tokens_per_minute)
+                if self._tokens < need:
+                    return (need - self._tokens) / rate
+                self._tokens -= estimate
+            self._active += 1
+            return 0.0
+
+    def release(self, estimate: int, used: Optional[int]) -> None:
+        with self._lock:
+            self._active -= 1
+            if self.tokens_per_minute and used is not None:
+                self._tokens -= used - estimate
+
+    def acquire(self, estimate: int) -> None:
+        while (delay := self._try_acquire(estimate)) > 0:
+            time.sleep(delay)
+
+    async def aacquire(self, estimate: int) -> None:
+        while (delay := self._try_acquire(estimate)) > 0:
+            await asyncio.sleep(delay)
+
+
+def limiter_for(cfg) -> Optional[EndpointLimiter]:
+    """The endpoint's limiter (the first run to ask sets its caps), or None
+    when cfg sets none."""
+    concurrency = cfg.llm_concurrency
+    tpm = cfg.llm_tokens_per_minute
+    if not concurrency and not tpm:
+        return None
+    with _lock:
+        limiter = _limiters.get(cfg.base_url)
+        if limiter is None:
+            limiter = _limiters[cfg.base_url] = EndpointLimiter(concurrency, tpm)
+        return limiter
+
+
+class Grant:
+    """A held slot; `used(resp)` records the completion's real token usage."""
+
+    def __init__(self, estimate: int):
+        self.estimate = estimate
+        self.tokens: Optional[int] = None
+
+    def used(self, resp: Any) -> None:
+        usage = getattr(resp, "usage", None)
+        self.tokens = getattr(usage, "total_tokens", None)
+
+    def received(self, completion_chars: int) -> None:
+        """Settle without server usage (a stream closed before its usage
+        chunk): the prompt estimate plus the completion read so far."""
+        self.tokens = self.estimate + completion_chars // _CHARS_PER_TOKEN
+
+
+def estimate_tokens(request: dict) -> int:
+    return len(json.dumps(request.get("messages", []))) // _CHARS_PER_TOKEN + \
+        len(json.dumps(request.get("tools", []))) // _CHARS_PER_TOKEN
+
+
+@contextmanager
+def limited(cfg, request: dict) -> Iterator[Grant]:
+    grant = Grant(estimate_tokens(request))
+    limiter = limiter_for(cfg)
+    if limiter is None:
+        yield grant
+        return
+    limiter.acquire(grant.estimate)
+    try:
+        yield grant
+    finally:
+        limiter.release(grant.estimate, grant.tokens)
+
+
+@asynccontextmanager
+async def alimited(cfg, request: dict) -> AsyncIterator[Grant]:
+    grant = Grant(estimate_tokens(request))
+    limiter = limiter_for(cfg)
+    if limiter is None:
+        yield grant
+        return
+    await limiter.aacquire(grant.estimate)
+    try:
+        yield grant
+    finally:
+        limiter.release(grant.estimate, grant.tokens)
@@ -0,0 +1,162 @@
+"""Streamed completions (`--llm-stream`).
+
+Without streaming a turn waits for the whole completion, including any
+prose a slow local model writes after its tool call. With cfg.llm_stream
+the OpenAI backends request `stream=True` and read chunks as they arrive:
+
+  ToolCallStream   (native tool calling) assembles each call's arguments
+                   from `delta.tool_calls` and hands the call to the
+                   harness's `on_tool_call` as soon as its arguments parse
+                   as a complete JSON object, so the tool runs while the
+                   model is still writing the rest of the turn.
+  feed -> True     (JSON mode) stops reading and closes the stream, which
+                   aborts generation on the server.
+
+`consume` / `aconsume` drive either over a sync or async openai stream
+and record token usage on the limiter Grant: the server's usage chunk if
+one arrives, else (the stream was closed early, or the server sends none)
+the prompt estimate plus the length of the completion read.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from . import BackendResponse, ToolCall
+from .pool import Grant
+
+Feed = Callable[[Any], bool]
+
+
+def stream_request(cfg, kwargs: dict[str, Any]) -> dict[str, Any]:
+    """`kwargs` for a streamed completion. Usage is asked for only under a
+    tokens-per-minute cap: some servers reject `stream_options`."""
+    kwargs = dict(kwargs, stream=True)
+    if cfg.llm_tokens_per_minute:
+        kwargs["stream_options"] = {"include_usage": True}
+    return kwargs
+
+
+def parse_arguments(raw: Optional[str]) -> dict[str, Any]:
+    """A tool call's `arguments` string as a dict; unparseable text is kept
+    under `__raw_arguments__` so the harness's validation nudge shows it."""
+    try:
+        return json.loads(raw or "{}")
+    except json.JSONDecodeError:
+        return {"__raw_arguments__": raw}
+
+
+def _complete_object(raw: str) -> Optional[dict]:
+    """`raw` as a dict once it is a whole JSON object, else None."""
+    if not raw.rstrip().endswith("}"):
+        return None
+    try:
+        obj = json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+@dataclass
+class _Pending:
+    id: str = ""
+    name: str = ""
+    arguments: str = ""
+    call: Optional[ToolCall] = None  # set once the arguments are complete
+
+
+class ToolCallStream:
+    """Chunks of a native tool-calling completion, assembled."""
+
+    def __init__(self, on_tool_call: Optional[Callable[[ToolCall], None]] = None):
+        self.on_tool_call = on_tool_call
+        self.text = ""
+        self.finish_reason = "stop"
+        self._pending: dict[int, _Pending] = {}
+
+    def feed(self, chunk: Any) -> bool:
+        for choice in chunk.choices[:1]:
+            delta = choice.delta
+            if delta is not None:
+                self.text += delta.content or ""
+                for part in delta.tool_calls or []:
+                    self._add(part)
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+        return False
+
+    def _add(self, part: Any) -> None:
+        p = self._pending.setdefault(part.index, _Pending())
+        p.id = part.id or p.id
+        if part.function is not None:
+            p.name += part.function.name or ""
+            p.arguments += part.function.arguments or ""
+        if p.call is None and p.name and (args := _complete_object(p.arguments)) is not None:
+            p.call = ToolCall(id=p.id, name=p.name, args=args)
+            if self.on_tool_call is not None:
+                self.on_tool_call(p.call)
+
+    def response(self) -> BackendResponse:
+        tool_calls = []
+        for _i, p in sorted(self._pending.items()):
+            tool_calls.append(p.call or ToolCall(id=p.id, name=p.name, args=parse_arguments(p.arguments)))
+        return BackendResponse(tool_calls=tool_calls, text=self.text,
+                               finish_reason=self.finish_reason, raw=None)
+
+
+def _chunk_chars(chunk: Any) -> int:
+    """Completion characters in a chunk: content plus tool-call text."""
+    n = 0
+    for choice in chunk.choices[:1]:
+        delta = choice.delta
+        if delta is None:
+            continue
+        n += len(delta.content or "")
+        for part in delta.tool_calls or []:
+            if part.function is not None:
+                n += len(part.function.name or "") + len(part.function.arguments or "")
+    return n
+
+
+class _Usage:
+    def __init__(self, grant: Grant):
+        self.grant = grant
+        self.chars = 0
+        self.reported = False
+
+    def add(self, chunk: Any) -> None:
+        if getattr(chunk, "usage", None) is not None:
+            self.grant.used(chunk)
+            self.reported = True
+        self.chars += _chunk_chars(chunk)
+
+    def settle(self) -> None:
+        if not self.reported:
+            self.grant.received(self.chars)
+
+
+def consume(stream: Any, feed: Feed, grant: Grant) -> None:
+    """Feed every chunk of `stream` until `feed` returns True, then close
+    it (ending generation if it was cut short)."""
+    usage = _Usage(grant)
+    try:
+        for chunk in stream:
+            usage.add(chunk)
+            if feed(chunk):
+                break
+    finally:
+        stream.close()
+        usage.settle()
+
+
+async def aconsume(stream: Any, feed: Feed, grant: Grant) -> None:
+    usage = _Usage(grant)
+    try:
+        async for chunk in stream:
+            usage.add(chunk)
+            if feed(chunk):
+                break
+    finally:
+        await stream.close()
+        usage.settle()
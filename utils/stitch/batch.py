@@ -0,0 +1,468 @@
+"""Corpus mode: shard -> plan -> apply over many firmware images.
+
+`fwstitch batch` replaces a shell loop around `fwstitch all`. It runs in one
+process, so Python startup and the fakeroot re-exec happen once per batch,
+not once per image. The stages have separate concurrency limits:
+
+  shard, apply   CPU/disk-bound; a process pool of `extract_workers`
+  plan           network-bound (LLM round trips); `plan_workers` threads
+
+An image moves to the next stage as soon as its previous stage finishes, so
+planning image A overlaps extracting image B.
+
+Progress goes to an append-only NDJSON journal, one record per finished
+stage and flushed + fsync'd before the next stage is scheduled:
+
+    {"t": ..., "firmware": "/abs/fw.bin", "id": "fw.bin", "stage": "shard",
+     "status": "ok", "elapsed_s": 12.3, "count": 4, "stop_reason": "completed"}
+
+Re-running the same batch replays the journal and resumes every image at its
+first unfinished stage. Images whose last record is an error are skipped
+unless `retry_failed` is set. The per-image summary (`batch.summary.ndjson`)
+is rebuilt from the journal at the end of every run.
+
+Per-image layout under the output root:
+
+    <root>/<id>/shards/                      shard tarballs, shards.json, stitch_plan.yaml
+    <root>/<id>/<id>.stitched.rootfs.tar.gz  apply output
+"""
+from __future__ import annotations
+
+import dataclasses
+import fcntl
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from multiprocessing.queues import SimpleQueue
+from pathlib import Path
+from typing import Optional
+
+from .archive import ArchiveSpec
+from .harness import HarnessConfig
+from .runcache import RunCache
+from .scratch import ScratchPolicy
+from .supervise import ExtractLimits, resolve_budget
+
+STAGES = ("shard", "plan", "apply")
+
+JOURNAL_NAME = "batch.journal.ndjson"
+SUMMARY_NAME = "batch.summary.ndjson"
+
+
+@dataclass
+class BatchOptions:
+    """Everything a stage needs, picklable so shard/apply can run in workers."""
+    extractor: str = "unblob"
+    min_score: int = 3
+    reextract: bool = True
+    jobs: int = 1
+    archive: ArchiveSpec = ArchiveSpec()
+    cache: Optional[RunCache] = None
+    stream: bool = False
+    extract_timeout: Optional[float] = None
+    extract_max_size: tuple[str, float] = ("none", 0)  # parse_budget() result
+    extract_max_inodes: Optional[int] = None
+    scratch: ScratchPolicy = ScratchPolicy()
+    harness: Optional[HarnessConfig] = None
+    shard_only: bool = False
+    no_apply: bool = False
+    force: bool = False
+    on_conflict: str = "overlay"
+    verbose: bool = False
+
+
+@dataclass
+class BatchImage:
+    firmware: Path     # resolved path; the journal key
+    id: str            # per-image output dir name
+
+    def shard_dir(self, root: Path) -> Path:
+        return root / self.id / "shards"
+
+    def out_path(self, root: Path) -> Path:
+        return root / self.id / f"{self.id}.stitched.rootfs.tar.gz"
+
+
+# --------------- inputs ---------------
+
+def collect_images(source: Path) -> list[Path]:
+    """Firmware paths from a directory (every regular file below it, sorted)
+    or a list file (one path per line; blank lines and #comments ignored,
+    relative paths are relative to the list file).
+    """
+    if source.is_dir():
+        out = []
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            for fn in sorted(filenames):
+                p = Path(dirpath) / fn
+                if p.is_file() and not p.is_symlink():
+                    out.append(p.resolve())
+        return out
+    if not source.is_file():
+        raise FileNotFoundError(f"batch input not found: {source}")
+    out = []
+    with open(source, "r") as f:
+        for raw in f:
+            line = raw.strip()
+            if not line or line.startswith("#"):
+                continue
+            p = Path(line)
+            if not p.is_absolute():
+                p = source.parent / p
+            out.append(p.resolve())
+    return out
+
+
+def _assign_ids(paths: list[Path], known: dict[str, str]) -> list[BatchImage]:
+    """Image ids are the file name, plus a path hash where two images share
+    a name. Ids already in the journal are kept so a resumed run finds its
+    output dirs even if the input list changed.
+    """
+    names: dict[str, int] = {}
+    for p in paths:
+        names[p.name] = names.get(p.name, 0) + 1
+    images, seen = [], set()
+    for p in paths:
+        key = str(p)
+        if key in seen:
+            continue
+        seen.add(key)
+        image_id = known.get(key)
+        if image_id is None:
+            image_id = p.name
+            if names[p.name] > 1:
+                image_id += "-" + hashlib.sha1(key.encode()).hexdigest()[:8]
+        images.append(BatchImage(firmware=p, id=image_id))
+    return images
+
+
+# --------------- journal ---------------
+
+class Journal:
+    """Append-only NDJSON log of finished stages, keyed by firmware path."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.records: dict[str, list[dict]] = {}
+        if path.is_file():
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from a killed run
+                    self.records.setdefault(rec["firmware"], []).append(rec)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(path, "a")
+        try:
+            fcntl.flock(self._f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._f.close()
+            raise RuntimeError(f"another batch is already writing {path}") from None
+
+    def known_ids(self) -> dict[str, str]:
+        return {fw: recs[-1]["id"] for fw, recs in self.records.items()}
+
+    def append(self, image: BatchImage, stage: str, status: str, **fields) -> dict:
+        rec = {"t": round(time.time(), 3), "firmware": str(image.firmware),
+               "id": image.id, "stage": stage, "status": status, **fields}
+        self._f.write(json.dumps(rec) + "\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self.records.setdefault(rec["firmware"], []).append(rec)
+        return rec
+
+    def latest(self, image: BatchImage) -> dict[str, dict]:
+        """Last record per stage. A re-run of an earlier stage drops the
+        later stages' records (they described the old shards).
+        """
+        out: dict[str, dict] = {}
+        for rec in self.records.get(str(image.firmware), []):
+            out[rec["stage"]] = rec
+            for later in STAGES[STAGES.index(rec["stage"]) + 1:]:
+                out.pop(later, None)
+        return out
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def next_stage(latest: dict[str, dict], opts: BatchOptions, retry_failed: bool) -> Optional[str]:
+    """The stage to run next for an image, or None if it's finished."""
+    for stage in STAGES:
+        rec = latest.get(stage)
+        if rec is None or (rec["status"] == "error" and retry_failed):
+            break
+        if rec["status"] == "error":
+            return None
+    else:
+        return None
+    if stage == "plan" and (opts.shard_only or latest["shard"].get("count", 0) == 0):
+        return None
+    if stage == "apply":
+        if opts.no_apply or (latest["plan"].get("confidence") == "low" and not opts.force):
+            return None
+    return stage
+
+
+def image_status(latest: dict[str, dict], opts: BatchOptions) -> str:
+    """One word for the summary row."""
+    if not latest:
+        return "pending"
+    last = latest[max(latest, key=STAGES.index)]
+    if last["status"] == "error":
+        return "failed"
+    if last["stage"] == "shard":
+        if last.get("count", 0) == 0:
+            return "no_shards"
+        return "sharded" if opts.shard_only else "pending"
+    if last["stage"] == "plan":
+        if opts.no_apply:
+            return "planned"
+        if last.get("confidence") == "low" and not opts.force:
+            return "low_confidence"
+        return "pending"
+    return "done"
+
+
+def summary_row(image: BatchImage, latest: dict[str, dict], opts: BatchOptions, root: Path) -> dict:
+    shard_rec = latest.get("shard", {})
+    plan_rec = latest.get("plan", {})
+    apply_rec = latest.get("apply", {})
+    errors = [r["error"] for r in latest.values() if r["status"] == "error"]
+    return {
+        "firmware": str(image.firmware),
+        "id": image.id,
+        "status": image_status(latest, opts),
+        "timings": {f"{s}_s": latest[s]["elapsed_s"] for s in STAGES if s in latest},
+        "shard_count": shard_rec.get("count"),
+        "stop_reason": shard_rec.get("stop_reason"),
+        "confidence": plan_rec.get("confidence"),
+        "out": apply_rec.get("out_path"),
+        "shard_dir": str(image.shard_dir(root)),
+        "error": errors[0] if errors else None,
+    }
+
+
+# --------------- stage jobs ---------------
+# Module-level so the process pool can pickle them. Each returns the extra
+# fields for the stage's journal record.
+
+def _shard_job(image: BatchImage, root: Path, opts: BatchOptions) -> dict:
+    from .shard import shard
+    shard_dir = image.shard_dir(root)
+    # A stage that was killed midway may have left tarballs behind.
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    limits = ExtractLimits(
+        timeout=opts.extract_timeout,
+        max_bytes=resolve_budget(opts.extract_max_size, image.firmware),
+        max_inodes=opts.extract_max_inodes,
+    )
+    summary = shard(
+        firmware=image.firmware, out_dir=shard_dir, extractor=opts.extractor,
+        min_score=opts.min_score, reextract=opts.reextract, verbose=opts.verbose,
+        jobs=opts.jobs, archive=opts.archive, cache=opts.cache, stream=opts.stream,
+        limits=limits, scratch=opts.scratch,
+    )
+    return {"count": summary["count"], "stop_reason": summary.get("stop_reason"),
+            "cache": summary.get("cache"), "timings": summary.get("timings")}
+
+
+def _plan_job(image: BatchImage, root: Path, opts: BatchOptions) -> dict:
+    from .harness import run
+    from .plan import dump_plan
+    shard_dir = image.shard_dir(root)
+    cfg = opts.harness
+    if cfg.debug_transcript is not None:
+        cfg = dataclasses.replace(cfg, debug_transcript=root / image.id / cfg.debug_transcript.name)
+    result = run(shard_dir, cfg)
+    dump_plan(result.plan, shard_dir / "stitch_plan.yaml")
+    return {"confidence": result.plan.confidence, "turns": result.turns,
+            "backend": result.backend_name}
+
+
+def _apply_job(image: BatchImage, root: Path, opts: BatchOptions) -> dict:
+    from .plan import apply_plan, load_plan
+    shard_dir = image.shard_dir(root)
+    plan = load_plan(shard_dir / "stitch_plan.yaml")
+    stats = apply_plan(plan, shard_dir, image.out_path(root),
+                       on_conflict=opts.on_conflict, verbose=opts.verbose)
+    return {"members_written": stats["members_written"], "conflicts": stats["conflicts"],
+            "out_path": str(stats["out_path"]), "timings": stats["timings"]}
+
+
+_JOBS = {"shard": _shard_job, "plan": _plan_job, "apply": _apply_job}
+
+
+def _describe(stage: str, rec: dict) -> str:
+    if rec["status"] == "error":
+        return rec["error"]
+    if stage == "shard":
+        extra = "" if rec.get("stop_reason") in (None, "completed") else f", stopped: {rec['stop_reason']}"
+        return f"{rec['count']} shards{extra}"
+    if stage == "plan":
+        return f"confidence={rec['confidence']} in {rec['turns']} turns"
+    return f"{rec['members_written']} members -> {rec['out_path']}"
+
+
+# --------------- scheduler ---------------
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _worker_init(started: SimpleQueue) -> None:
+    # Turn SIGTERM into an exception so run_supervised kills the extractor's
+    # process group on the way out instead of orphaning it.
+    signal.signal(signal.SIGTERM, _interrupt)
+    # Report our pid: the executor has no public way to reach its workers.
+    started.put(os.getpid())
+
+
+def _start_workers(n: int) -> tuple[ProcessPoolExecutor, SimpleQueue]:
+    """A pool of `n` spawned workers and the queue they report pids on."""
+    # spawn, not fork: the plan threads are already running when the pool
+    # starts a worker. The children inherit the environment, so a batch
+    # under fakeroot extracts under fakeroot.
+    ctx = multiprocessing.get_context("spawn")
+    started = ctx.SimpleQueue()
+    pool = ProcessPoolExecutor(max_workers=n, mp_context=ctx,
+                               initializer=_worker_init, initargs=(started,))
+    return pool, started
+
+
+def _stop_workers(pool: ProcessPoolExecutor, started: SimpleQueue) -> None:
+    """SIGTERM every worker that has reported in, then wait for the pool.
+    A worker interrupted mid-job kills its extractor and returns the error;
+    an idle one exits. Either way shutdown() can then join them."""
+    pids = set()
+    while not started.empty():
+        pids.add(started.get())
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    pool.shutdown(wait=True, cancel_futures=True)
+
+
+def run_batch(
+    source: Path,
+    root: Path,
+    opts: BatchOptions,
+    extract_workers: int = 1,
+    plan_workers: int = 1,
+    journal_path: Optional[Path] = None,
+    summary_path: Optional[Path] = None,
+    retry_failed: bool = False,
+) -> dict:
+    """Run every image in `source` to completion (or failure) and write the
+    summary. Returns counts per final status plus the summary path.
+    """
+    if not opts.shard_only and opts.harness is None:
+        raise ValueError("batch: planning needs a HarnessConfig (or shard_only)")
+    root.mkdir(parents=True, exist_ok=True)
+    journal = Journal(journal_path or root / JOURNAL_NAME)
+    out = root.resolve()
+    paths = [p for p in collect_images(source) if out not in p.parents]
+    images = _assign_ids(paths, journal.known_ids())
+    extract_workers = extract_workers or os.cpu_count() or 1
+
+    cpu, cpu_started = _start_workers(extract_workers)
+    net = ThreadPoolExecutor(max_workers=max(1, plan_workers), thread_name_prefix="plan")
+    pending: dict[Future, tuple[BatchImage, str, float]] = {}
+    # shard/apply jobs wait here rather than in the pool's own queue: only
+    # running jobs are lost if a worker dies, and the timings exclude queueing.
+    ready: deque[tuple[BatchImage, str]] = deque()
+    running_cpu = 0
+
+    def submit_cpu() -> None:
+        nonlocal cpu, cpu_started, running_cpu
+        while ready and running_cpu < extract_workers:
+            image, stage = ready.popleft()
+            try:
+                fut = cpu.submit(_JOBS[stage], image, root, opts)
+            except BrokenProcessPool:
+                # A worker died hard (OOM killer, segfault in a native
+                # decompressor). The jobs it took down are journaled as
+                # errors; the rest of the batch gets a fresh pool.
+                cpu.shutdown(wait=False)
+                cpu, cpu_started = _start_workers(extract_workers)
+                fut = cpu.submit(_JOBS[stage], image, root, opts)
+            pending[fut] = (image, stage, time.monotonic())
+            running_cpu += 1
+
+    def schedule(image: BatchImage) -> bool:
+        stage = next_stage(journal.latest(image), opts, retry_failed)
+        if stage is None:
+            return False
+        if stage == "plan":
+            pending[net.submit(_JOBS[stage], image, root, opts)] = (image, stage, time.monotonic())
+        elif stage == "apply":
+            ready.appendleft((image, stage))  # finish images before starting new ones
+        else:
+            ready.append((image, stage))
+        return True
+
+    # A killed batch (SIGTERM from a scheduler or `timeout`) takes its
+    # workers down with it; the journal already has every finished stage.
+    prev_term = signal.signal(signal.SIGTERM, _interrupt)
+    skipped = 0
+    try:
+        for image in images:
+            skipped += not schedule(image)
+        submit_cpu()
+        if skipped:
+            print(f"[batch] {skipped}/{len(images)} images already finished per the journal",
+                  file=sys.stderr)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                image, stage, start = pending.pop(fut)
+                elapsed = round(time.monotonic() - start, 3)
+                try:
+                    fields = fut.result()
+                    rec = journal.append(image, stage, "ok", elapsed_s=elapsed, **fields)
+                except BaseException as e:  # SystemExit from harness.run, worker crashes
+                    if isinstance(e, KeyboardInterrupt):
+                        raise
+                    msg = f"{type(e).__name__}: {e}"
+                    rec = journal.append(image, stage, "error", elapsed_s=elapsed, error=msg)
+                print(f"[batch] {image.id}: {stage} {rec['status']} ({elapsed:.1f}s) "
+                      f"{_describe(stage, rec)}")
+                if stage != "plan":
+                    running_cpu -= 1
+                schedule(image)
+            submit_cpu()
+    except BaseException:
+        _stop_workers(cpu, cpu_started)
+        net.shutdown(wait=False, cancel_futures=True)
+        journal.close()
+        raise
+    finally:
+        signal.signal(signal.SIGTERM, prev_term)
+    cpu.shutdown()
+    net.shutdown()
+
+    summary_path = summary_path or root / SUMMARY_NAME
+    counts: dict[str, int] = {}
+    tmp = summary_path.with_name(summary_path.name + ".part")
+    with open(tmp, "w") as f:
+        for image in images:
+            row = summary_row(image, journal.latest(image), opts, root)
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+            f.write(json.dumps(row) + "\n")
+    os.replace(tmp, summary_path)
+    journal.close()
+    return {"images": len(images), "statuses": counts, "summary_path": str(summary_path),
+            "journal_path": str(journal.path)}
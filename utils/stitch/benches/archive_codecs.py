@@ -0,0 +1,109 @@
+"""Wall-clock and size trade-off of shard archive specs.
+
+Builds a synthetic rootfs (init scripts and configs, ELF-ish binaries with
+repeated string tables, incompressible blobs, symlinks) and writes it with
+every available engine/codec combination, then times a full read-back the
+way `plan` does it (open + list every member).
+
+    cd fw2tar/utils && python -m stitch.benches.archive_codecs [--files 20000]
+
+Specs whose binaries are missing (pigz, zstd, bsdtar) are skipped.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from ..archive import ArchiveError, ArchiveSpec, open_tar, write_archive
+
+SPECS = [
+    ("tarfile", "none"),
+    ("tarfile", "gzip:1"),
+    ("tarfile", "gzip:6"),
+    ("tarfile", "gzip:9"),
+    ("tarfile", "pigz:6"),
+    ("tarfile", "zstd:3"),
+    ("bsdtar", "none"),
+    ("bsdtar", "pigz:6"),
+    ("bsdtar", "zstd:3"),
+    ("gnutar", "zstd:3"),
+]
+
+_SCRIPT = "#!/bin/sh\n[ -d /etc/config ] || mkdir -p /etc/config\nmount -t jffs2 /dev/mtdblock{n} /mnt/{n}\n"
+
+
+def build_rootfs(root: Path, n_files: int, seed: int = 0) -> int:
+    """Populate `root` with about `n_files` entries; returns total bytes."""
+    rng = random.Random(seed)
+    dirs = [root / d for d in ("bin", "sbin", "usr/bin", "usr/lib", "lib/modules",
+                               "etc/init.d", "etc/config", "www/cgi-bin", "usr/share/doc")]
+    for d in dirs:
+        d.mkdir(parents=True, exist_ok=True)
+    strtab = b"".join(f"/usr/lib/lib{i}.so\0/etc/config/opt{i}\0".encode() for i in range(200))
+    total = 0
+    for i in range(n_files):
+        d = dirs[i % len(dirs)]
+        kind = rng.random()
+        path = d / f"f{i:06d}"
+        if kind < 0.45:
+            data = (_SCRIPT.format(n=i) * rng.randint(1, 40)).encode()
+        elif kind < 0.85:
+            data = b"\x7fELF" + strtab[: rng.randint(256, len(strtab))] + rng.randbytes(rng.randint(64, 4096))
+        elif kind < 0.95:
+            data = rng.randbytes(rng.randint(1024, 64 * 1024))
+        else:
+            os.symlink(f"/usr/lib/f{i:06d}", path)
+            continue
+        path.write_bytes(data)
+        total += len(data)
+    return total
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--files", type=int, default=20000)
+    ap.add_argument("--keep", action="store_true", help="keep the temp directory")
+    args = ap.parse_args(argv)
+
+    work = Path(tempfile.mkdtemp(prefix="fwstitch_bench_"))
+    try:
+        src = work / "rootfs"
+        t0 = time.perf_counter()
+        raw = build_rootfs(src, args.files)
+        print(f"synthetic rootfs: {args.files} entries, {raw / 1e6:.1f} MB "
+              f"(built in {time.perf_counter() - t0:.1f}s)\n")
+        print(f"{'spec':<22}{'write s':>9}{'read s':>9}{'size MB':>10}{'ratio':>8}")
+        for engine, codec in SPECS:
+            spec = ArchiveSpec.parse(codec, engine)
+            try:
+                spec.check_tools()
+            except ArchiveError:
+                print(f"{spec.describe():<22}{'(skipped: missing tool)':>36}")
+                continue
+            dest = work / f"out{spec.suffix}"
+            t0 = time.perf_counter()
+            write_archive(src, dest, spec)
+            t_write = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            with open_tar(dest) as tf:
+                tf.getnames()
+            t_read = time.perf_counter() - t0
+            size = dest.stat().st_size
+            print(f"{spec.describe():<22}{t_write:>9.2f}{t_read:>9.2f}"
+                  f"{size / 1e6:>10.1f}{size / raw:>8.2f}")
+            dest.unlink()
+    finally:
+        if args.keep:
+            print(f"\nkept {work}")
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
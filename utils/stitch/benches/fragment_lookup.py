@@ -0,0 +1,156 @@
+"""Path lookup cost in FragmentCache on a many-member fragment.
+
+Writes one uncompressed shard with `--members` entries (default 100k,
+spread over a few hundred directories), then times what the tools do per
+call: exact and relaxed-spelling `resolve`, `list_paths` / `grep` globs with
+a literal prefix, a class-expanded prefix or none (and a repeat, which the
+table answers from its result cache), and the name checks behind
+`fs_summary` and `find_dangling_symlinks`, and `locate_path` over the
+cross-fragment path index. The first row is the one-time table build.
+
+For comparison it also times the lookup the tools did before the table
+existed: three `TarFile.getmember` spellings, then a normalising scan.
+
+    cd fw2tar/utils && python -m stitch.benches.fragment_lookup [--members 100000]
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import shutil
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+from ..archive import ArchiveSpec, archive_writer
+from ..tools import (FragmentArgs, FragmentCache, FragmentOnlyArgs, ListPathsArgs, LocatePathArgs,
+                     MemberTable, _normalize, tool_find_dangling_symlinks, tool_fs_summary,
+                     tool_list_paths, tool_locate_path)
+
+
+def build_shard(dest: Path, n_members: int, seed: int = 0) -> list[str]:
+    """Write `dest` with about `n_members` small members; returns the
+    normalised paths of the regular files."""
+    rng = random.Random(seed)
+    tops = ["bin", "sbin", "lib", "usr/lib", "usr/share", "etc", "www", "opt/app"]
+    dirs = [f"{rng.choice(tops)}/d{i:03d}" for i in range(n_members // 250 or 1)]
+    files = []
+    with archive_writer(dest, ArchiveSpec.parse("none")) as tf:
+        for d in sorted(set(dirs)):
+            ti = tarfile.TarInfo("./" + d)
+            ti.type = tarfile.DIRTYPE
+            tf.addfile(ti)
+        for i in range(n_members - len(dirs)):
+            path = f"{dirs[i % len(dirs)]}/f{i:06d}"
+            if i % 20 == 0:
+                ti = tarfile.TarInfo("./" + path)
+                ti.type = tarfile.SYMTYPE
+                ti.linkname = f"/usr/lib/missing{i}"
+                tf.addfile(ti)
+                continue
+            data = b"x" * (i % 64)
+            ti = tarfile.TarInfo("./" + path)
+            ti.size = len(data)
+            tf.addfile(ti, io.BytesIO(data))
+            files.append(path)
+    return files
+
+
+def _old_resolve(tf: tarfile.TarFile, path: str):
+    for c in (path, "./" + path.lstrip("/"), path.lstrip("/")):
+        try:
+            return tf.getmember(c)
+        except KeyError:
+            continue
+    norm = _normalize(path)
+    for m in tf.getmembers():
+        if _normalize(m.name) == norm:
+            return m
+    return None
+
+
+def _glob(table: MemberTable, pattern: str, limit: int) -> list[str]:
+    table._globs.clear()  # time the match, not the per-table result cache
+    return table.glob(pattern, limit)
+
+
+def _time(fn, calls: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--members", type=int, default=100_000)
+    ap.add_argument("--lookups", type=int, default=2000, help="resolve calls per row")
+    ap.add_argument("--old-lookups", type=int, default=20,
+                    help="resolve calls for the pre-table rows (they are slow)")
+    ap.add_argument("--keep", action="store_true", help="keep the temp directory")
+    args = ap.parse_args(argv)
+
+    work = Path(tempfile.mkdtemp(prefix="fwstitch_bench_"))
+    try:
+        dest = work / "bench.shard.00.root.tar"
+        t0 = time.perf_counter()
+        files = build_shard(dest, args.members)
+        print(f"synthetic shard: {args.members} members ({time.perf_counter() - t0:.1f}s to write)\n")
+        rng = random.Random(1)
+        sample = [rng.choice(files) for _ in range(args.lookups)]
+
+        cache = FragmentCache(work)
+        frag = cache.names()[0]
+        t0 = time.perf_counter()
+        table = cache.table(frag)
+        rows = [("table build (once)", time.perf_counter() - t0)]
+
+        it = iter(sample)
+        rows.append(("resolve 'a/b'", _time(lambda: table.resolve(next(it)), args.lookups)))
+        it = iter(["/" + p for p in sample])
+        rows.append(("resolve '/a/b'", _time(lambda: table.resolve(next(it)), args.lookups)))
+        it = iter(["./" + p for p in sample])
+        rows.append(("resolve './a/b'", _time(lambda: table.resolve(next(it)), args.lookups)))
+        it = iter(["//" + p for p in sample])
+        rows.append(("resolve '//a/b' (normalised)", _time(lambda: table.resolve(next(it)), args.lookups)))
+        rows.append(("glob 'etc/d0*/f0001*'", _time(lambda: _glob(table, "etc/d0*/f0001*", 500), 50)))
+        rows.append(("glob '[ew]*/d0*/f0001*'", _time(lambda: _glob(table, "[ew]*/d0*/f0001*", 500), 50)))
+        rows.append(("glob '**/f0001*'", _time(lambda: _glob(table, "**/f0001*", 500), 10)))
+        rows.append(("glob, cached result", _time(lambda: table.glob("**/f0001*", 500), 1000)))
+        rows.append(("list_paths 'etc/*' (repeat)", _time(
+            lambda: tool_list_paths(cache, ListPathsArgs(fragment=frag, pattern="etc/*")), 50)))
+        rows.append(("fs_summary", _time(
+            lambda: tool_fs_summary(cache, FragmentOnlyArgs(fragment=frag)), 10)))
+        rows.append(("find_dangling_symlinks", _time(
+            lambda: tool_find_dangling_symlinks(cache, FragmentArgs(fragment=frag, max=200)), 10)))
+        t0 = time.perf_counter()
+        cache.path_index()
+        rows.append(("path index build (once)", time.perf_counter() - t0))
+        tails = ["/".join(p.split("/")[-2:]) for p in sample]
+        it = iter(tails)
+        rows.append(("locate_path 'dir/file'", _time(
+            lambda: tool_locate_path(cache, LocatePathArgs(paths=[next(it)])), args.lookups)))
+
+        with tarfile.open(dest, "r:") as tf:
+            tf.getmembers()
+            it = iter(sample)
+            rows.append(("pre-table resolve 'a/b'", _time(lambda: _old_resolve(tf, next(it)), args.old_lookups)))
+            it = iter(["//" + p for p in sample])
+            rows.append(("pre-table resolve '//a/b'", _time(lambda: _old_resolve(tf, next(it)), args.old_lookups)))
+        cache.close()
+
+        print(f"{'operation':<32}{'per call':>14}")
+        for label, secs in rows:
+            print(f"{label:<32}{secs * 1e6:>11.1f} us")
+    finally:
+        if args.keep:
+            print(f"\nkept {work}")
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,220 @@
+"""Optional on-disk SQLite catalogue of a fragment dir (`plan --catalog`).
+
+FragmentCache's name lists and open TarFiles die with the process, and
+fw2tar's `<fw>.<extractor>.<N>.tar.gz` outputs have no member index sidecar,
+so every `plan` re-run re-reads them. With `--catalog`, each fragment is
+read once in a single streaming pass into `<frag_dir>/stitch_catalog.sqlite`:
+
+    fragments  id, name, size, mtime_ns, member_count, seek (JSON or NULL)
+    members    fragment, seq (archive order), name, path (normalised: no
+               leading "./" or "/"), type, mode, uid, gid, size, linkname,
+               hash (blake2b-128), text (UTF-8, no NUL), data_offset
+    contents   hash -> data, for every file grep can search (regular,
+               UTF-8, at most content_max bytes), stored once per hash
+    symlinks   view: members of type symlink / hardlink
+
+A fragment's rows are rebuilt when its file's size or mtime changes, and
+dropped when the file is gone. The tools then answer names, types, link
+targets and text contents from SQL and only open an archive for binaries
+(`strings_of`) or oversized files. The DB is plain SQLite and safe to
+query directly (see the README for the tools' questions as SQL).
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import tarfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+from .archive import open_tar
+from .memberindex import MemberIndex, MemberIndexBuilder, MemberRecord
+
+CATALOG_NAME = "stitch_catalog.sqlite"
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS fragments (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    member_count INTEGER NOT NULL,
+    seek TEXT
+);
+CREATE TABLE IF NOT EXISTS members (
+    fragment INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    type TEXT NOT NULL,
+    mode INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    gid INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    linkname TEXT NOT NULL,
+    hash TEXT,
+    text INTEGER,
+    data_offset INTEGER,
+    PRIMARY KEY (fragment, seq)
+);
+CREATE INDEX IF NOT EXISTS members_path ON members (fragment, path);
+CREATE INDEX IF NOT EXISTS members_hash ON members (hash);
+CREATE TABLE IF NOT EXISTS contents (hash TEXT PRIMARY KEY, data BLOB NOT NULL);
+CREATE VIEW IF NOT EXISTS symlinks AS
+    SELECT fragment, seq, name, path, type, linkname FROM members
+    WHERE type IN ('symlink', 'hardlink');
+"""
+
+_PLAIN_SEEK = {"codec": "none", "checkpoints": []}
+
+
+def _normalize(name: str) -> str:
+    # Same rule as tools._normalize, so `path` matches what the tools print.
+    return name.lstrip("./")
+
+
+def _open_stream(path: Path) -> tarfile.TarFile:
+    if str(path).endswith(".tar.zst"):
+        return open_tar(path)
+    return tarfile.open(path, "r|*")
+
+
+class Catalog:
+    def __init__(self, frag_dir: Path, content_max: int):
+        self.path = frag_dir / CATALOG_NAME
+        self.content_max = content_max
+        # plan may touch fragments from worker threads; one connection, one lock.
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._ensure_schema()
+
+    def _ensure_schema(self) -> None:
+        # Check and create under one write lock: plans opening the same
+        # fresh dir at once would otherwise both create (or drop) the tables.
+        # executescript() would commit the BEGIN, so statements go one by one.
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+            except sqlite3.OperationalError:
+                row = None
+            if row is not None and row[0] == str(SCHEMA_VERSION):
+                return
+            for kind, name in self._db.execute(
+                    "SELECT type, name FROM sqlite_master WHERE type IN ('table', 'view') "
+                    "AND name NOT LIKE 'sqlite_%'").fetchall():
+                self._db.execute(f'DROP {kind.upper()} IF EXISTS "{name}"')
+            for statement in _SCHEMA.split(";"):
+                if statement.strip():
+                    self._db.execute(statement)
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)",
+                             (str(SCHEMA_VERSION),))
+
+    def close(self) -> None:
+        self._db.close()
+
+    def prune(self, keep: set[str]) -> None:
+        """Drop fragments no longer in the dir, and contents nothing uses."""
+        with self._lock, self._db:
+            for fid, name in self._db.execute("SELECT id, name FROM fragments").fetchall():
+                if name not in keep:
+                    self._db.execute("DELETE FROM members WHERE fragment = ?", (fid,))
+                    self._db.execute("DELETE FROM fragments WHERE id = ?", (fid,))
+            self._gc()
+
+    def _gc(self) -> None:
+        self._db.execute("DELETE FROM contents WHERE hash NOT IN "
+                         "(SELECT hash FROM members WHERE hash IS NOT NULL)")
+
+    # --------------- population ---------------
+
+    def refresh(self, name: str, path: Path) -> tuple[int, Optional[dict]]:
+        """(fragment id, seek table) for `path`, scanning it first if the
+        catalogue has no rows for its current size and mtime."""
+        st = path.stat()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, size, mtime_ns, seek FROM fragments WHERE name = ?", (name,)).fetchone()
+            if row is not None and (row[1], row[2]) == (st.st_size, st.st_mtime_ns):
+                return row[0], json.loads(row[3]) if row[3] else None
+            rows, contents = self._scan(path)
+            seek = self._seek_table(path)
+            with self._db:
+                if row is not None:
+                    self._db.execute("DELETE FROM members WHERE fragment = ?", (row[0],))
+                    self._db.execute("DELETE FROM fragments WHERE id = ?", (row[0],))
+                fid = self._db.execute(
+                    "INSERT INTO fragments (name, size, mtime_ns, member_count, seek) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (name, st.st_size, st.st_mtime_ns, len(rows),
+                     json.dumps(seek) if seek else None)).lastrowid
+                self._db.executemany(
+                    "INSERT INTO members VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(fid, seq, r[0], _normalize(r[0]), *r[1:]) for seq, r in enumerate(rows)])
+                self._db.executemany("INSERT OR IGNORE INTO contents VALUES (?, ?)", contents.items())
+                self._gc()
+            return fid, seek
+
+    def _scan(self, path: Path) -> tuple[list[list], dict[str, bytes]]:
+        """One front-to-back pass: index rows plus grep-searchable contents."""
+        builder = MemberIndexBuilder()
+        contents: dict[str, bytes] = {}
+        with _open_stream(path) as tf:
+            for ti in tf:
+                f = tf.extractfile(ti) if ti.isreg() else None
+                tracked = builder.track(ti, f)
+                data = None
+                if tracked is not None:
+                    if ti.size <= self.content_max:
+                        data = tracked.read()
+                    else:
+                        while tracked.read(1 << 20):
+                            pass
+                builder.add(ti, tracked, ti.offset_data)
+                digest = builder.members[-1][7]
+                if data is not None and digest not in contents:
+                    try:
+                        data.decode("utf-8", errors="strict")
+                    except UnicodeDecodeError:
+                        continue
+                    contents[digest] = data
+        return builder.members, contents
+
+    @staticmethod
+    def _seek_table(path: Path) -> Optional[dict]:
+        if path.name.endswith(".tar"):
+            return _PLAIN_SEEK  # member offsets are file offsets
+        index = MemberIndex.load(path)
+        return index.seek if index is not None else None
+
+    # --------------- queries ---------------
+
+    def index(self, name: str, path: Path) -> MemberIndex:
+        """The fragment's members as a MemberIndex (same shape as a sidecar)."""
+        fid, seek = self.refresh(name, path)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, type, mode, uid, gid, size, linkname, hash, text, data_offset "
+                "FROM members WHERE fragment = ? ORDER BY seq", (fid,)).fetchall()
+        return MemberIndex([MemberRecord(*r[:8], None if r[8] is None else bool(r[8]), r[9])
+                            for r in rows], seek)
+
+    def content(self, digest: Optional[str]) -> Optional[bytes]:
+        if digest is None:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT data FROM contents WHERE hash = ?", (digest,)).fetchone()
+        return row[0] if row is not None else None
+
+    def texts(self, name: str, path: Path) -> list[tuple[str, bytes]]:
+        """(member name, data) for every grep-searchable file, archive order."""
+        fid, _seek = self.refresh(name, path)
+        with self._lock:
+            return self._db.execute(
+                "SELECT m.name, c.data FROM members m JOIN contents c ON c.hash = m.hash "
+                "WHERE m.fragment = ? AND m.type = 'file' ORDER BY m.seq", (fid,)).fetchall()
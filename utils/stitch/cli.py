@@ -5,6 +5,7 @@ Subcommands:
   plan   - drive an LLM to produce a stitch_plan.yaml from a shard directory
   apply  - apply a stitch_plan.yaml (LLM-produced or human-edited) to build the unified tar
   all    - shard -> plan -> apply, end-to-end
+  batch  - shard -> plan -> apply over a directory or list of blobs, resumable
 """
 from __future__ import annotations
 
@@ -14,7 +15,13 @@ import shutil
 import sys
 from pathlib import Path
 
+from .archive import ENGINES, ArchiveSpec, parse_codec
+from .batch import BatchOptions, run_batch
+from .evidence import EVIDENCE_CHARS
 from .harness import HarnessConfig, run
+from .runcache import RunCache, parse_size
+from .scratch import SCRATCH_MODES, ScratchPolicy
+from .supervise import ExtractLimits, parse_budget, resolve_budget
 from .plan import apply_plan, dump_plan, load_plan
 
 
@@ -74,7 +81,7 @@ def _peek_arg(argv: list[str], flag: str) -> str | None:
 # Commands that perform on-disk extraction and therefore need fakeroot so that
 # uid/gid metadata from the firmware survives into the shard tarballs. `plan`
 # and `apply` are read-only / tar-header-only and don't need it.
-_FAKEROOT_CMDS = {"shard", "all"}
+_FAKEROOT_CMDS = {"shard", "all", "batch"}
 
 
 def _under_fakeroot_or_root() -> bool:
@@ -119,6 +126,8 @@ def _resolve_llm_env(args) -> tuple[str | None, str, str]:
                or os.environ.get("LLM_KEY") or "dummy")
     model = args.model or os.environ.get("LLM_MODEL")
     if not model:
+        if getattr(args, "planner", "llm") == "rules":
+            return base_url, api_key, ""  # never talks to a model
         raise SystemExit("--model not given and LLM_MODEL not set")
     return base_url, api_key, model
 
@@ -129,6 +138,12 @@ def _resolve_insecure(args) -> bool:
     return os.environ.get("LLM_INSECURE", "").lower() in ("1", "true", "yes")
 
 
+def _resolve_catalog(args) -> bool:
+    if getattr(args, "catalog", False):
+        return True
+    return os.environ.get("FWSTITCH_CATALOG", "").lower() in ("1", "true", "yes")
+
+
 def _add_llm_args(p: argparse.ArgumentParser) -> None:
     p.add_argument("--model", default=None, help="LLM model name (else $LLM_MODEL)")
     p.add_argument("--base-url", default=None, help="OpenAI-compatible endpoint URL (else $LLM_BASE_URL)")
@@ -149,6 +164,131 @@ def _add_llm_args(p: argparse.ArgumentParser) -> None:
     p.add_argument("--debug-transcript", type=Path, default=None,
                    help="Append every system/user/assistant/tool turn to this file (for "
                         "diagnosing weak-model behavior).")
+    p.add_argument("--catalog", action="store_true",
+                   help="Keep a SQLite catalogue of every fragment's members and text "
+                        "contents in <shard_dir>/stitch_catalog.sqlite and answer tool calls "
+                        "from it; reused across runs until a fragment changes. Also honored "
+                        "via env: FWSTITCH_CATALOG=1.")
+    p.add_argument("--warm-jobs", type=int, default=0,
+                   help="Processes listing and summarising fragments while the LLM endpoint "
+                        "is checked (default 0 = one per CPU; 1 = a single background thread). "
+                        "Small fragment sets always use the thread.")
+    p.add_argument("--planner", default="llm", choices=["llm", "rules", "hybrid"],
+                   help="Who writes the plan. 'llm' (default): the model, with tools. "
+                        "'rules': a deterministic planner reading fstab, mount commands and "
+                        "dangling symlinks; no model needed. 'hybrid': rules first, the model "
+                        "only when they lack a clear winner (seeded with their candidates).")
+    p.add_argument("--evidence-chars", type=int, default=EVIDENCE_CHARS,
+                   help="Size budget of the mount evidence (fstab rows, mount commands, "
+                        "dangling-symlink targets) put in the initial prompt "
+                        f"(default {EVIDENCE_CHARS}; 0 leaves it out).")
+    p.add_argument("--tool-jobs", type=int, default=4,
+                   help="Threads running the tool calls of one model turn concurrently "
+                        "(default 4; 1 runs them one after another).")
+    p.add_argument("--llm-concurrency", type=int, default=0,
+                   help="Most completions in flight to one endpoint from this process, "
+                        "across all plans (batch workers share it; default 0 = no cap).")
+    p.add_argument("--llm-tpm", type=int, default=0,
+                   help="Tokens per minute allowed to one endpoint from this process, "
+                        "across all plans (default 0 = no cap).")
+    p.add_argument("--llm-stream", action="store_true",
+                   help="Stream completions: start each tool as soon as its call is complete, "
+                        "and in JSON mode stop generating once the reply holds a whole call.")
+
+
+def _add_jobs_arg(p: argparse.ArgumentParser) -> None:
+    p.add_argument("-j", "--jobs", type=int, default=1,
+                   help="Re-extract and tar up to N shards concurrently (default 1; "
+                        "0 = one worker per CPU). Shard order and names don't change.")
+
+
+def _add_archive_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--shard-codec", type=parse_codec, default="gzip",
+                   help="Shard compression as CODEC[:LEVEL]: none (.tar), gzip (.tar.gz, "
+                        "default level 6), pigz (.tar.gz, multi-threaded), zstd (.tar.zst).")
+    p.add_argument("--tar-engine", choices=list(ENGINES), default="tarfile",
+                   help="What writes the tar stream: Python's tarfile (default) or an "
+                        "external bsdtar / GNU tar piped into the codec.")
+
+
+def _add_stream_arg(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--stream", action="store_true",
+                   help="Tar filesystem shards while unblob is still running and publish "
+                        "a partial shards.json (\"complete\": false) as each one lands.")
+
+
+def _add_cache_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--cache-dir", type=Path, default=os.environ.get("FWSTITCH_CACHE_DIR") or None,
+                   help="Reuse shard runs keyed by firmware SHA-256 + extractor version + "
+                        "options (else $FWSTITCH_CACHE_DIR; default: no cache).")
+    p.add_argument("--cache-max-size", type=parse_size, default="20G",
+                   help="LRU-evict cache entries beyond this many bytes (default 20G).")
+    p.add_argument("--cache-copy", action="store_true",
+                   help="Copy shards out of the cache instead of hard-linking them.")
+
+
+def _add_extract_limit_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--extract-timeout", type=float, default=3600,
+                   help="Stop the extractor after this many seconds and shard whatever it "
+                        "produced (default 3600; 0 = no limit).")
+    p.add_argument("--extract-max-size", type=parse_budget, default="100x",
+                   help="Stop the extractor once its output exceeds this size: bytes (50G) "
+                        "or a multiple of the firmware size (100x, floored at 1G). "
+                        "Default 100x; 'none' disables.")
+    p.add_argument("--extract-max-inodes", type=int, default=2_000_000,
+                   help="Stop the extractor once its output holds this many files and "
+                        "dirs (default 2000000; 0 = no limit).")
+
+
+def _add_scratch_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--scratch-dir", type=Path, default=None,
+                   help="Parent dir for the extraction scratch tree (default: the system "
+                        "temp dir). With --scratch-mode ram it must be a tmpfs.")
+    p.add_argument("--scratch-mode", choices=list(SCRATCH_MODES), default="disk",
+                   help="ram: extract on tmpfs; disk: on --scratch-dir; auto: tmpfs when "
+                        "the blob's estimated expansion fits in RAM, spilling to disk if "
+                        "it outgrows it (default disk).")
+
+
+def _add_profile_arg(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--profile", type=Path, default=None, metavar="DIR",
+                   help="Run each stage under cProfile and write DIR/<stage>.pstats "
+                        "(per-shard worker stages as <stage>.<index>.pstats).")
+
+
+def _extract_limits(args) -> ExtractLimits:
+    firmware = getattr(args, "firmware", None)
+    return ExtractLimits(
+        timeout=args.extract_timeout or None,
+        max_bytes=resolve_budget(args.extract_max_size, firmware),
+        max_inodes=args.extract_max_inodes or None,
+    )
+
+
+def _print_timings(timings: dict | None, prefix: str) -> None:
+    if not timings:
+        return
+    parts = [f"{name} {st['wall_s']:.1f}s" for name, st in timings.items()]
+    print(f"[{prefix}] timings: {', '.join(parts)}")
+
+
+def _print_stop_reason(summary: dict, prefix: str) -> None:
+    if summary.get("stop_reason") not in (None, "completed"):
+        ex = summary["extraction"]
+        print(f"[{prefix}] extractor stopped early ({ex['stop_reason']}, "
+              f"{ex['peak_bytes']} bytes / {ex['peak_inodes']} inodes after "
+              f"{ex['elapsed_s']:.0f}s); shards are from partial output", file=sys.stderr)
+
+
+def _run_cache(args) -> RunCache | None:
+    if args.cache_dir is None:
+        return None
+    return RunCache(Path(args.cache_dir), args.cache_max_size, link=not args.cache_copy)
+
+
+def _archive_spec(args) -> ArchiveSpec:
+    codec, level = args.shard_codec  # argparse runs parse_codec on the default too
+    return ArchiveSpec(engine=args.tar_engine, codec=codec, level=level)
 
 
 def _add_apply_args(p: argparse.ArgumentParser) -> None:
@@ -172,6 +312,7 @@ def _print_plan_summary(plan) -> None:
 def _print_apply_summary(stats: dict) -> None:
     print(f"[stitch] applied: {stats['members_written']} members, "
           f"{stats['conflicts']} conflicts -> {stats['out_path']}")
+    _print_timings(stats.get("timings"), "stitch")
     if stats["conflict_samples"]:
         print("[stitch] sample conflicts (path, kept_from, replaced_by):")
         for path, kept, repl in stats["conflict_samples"]:
@@ -194,17 +335,37 @@ def cmd_shard(args) -> int:
         min_score=args.min_score,
         reextract=not args.no_reextract,
         verbose=args.verbose,
+        jobs=args.jobs,
+        archive=_archive_spec(args),
+        cache=_run_cache(args),
+        stream=args.stream,
+        limits=_extract_limits(args),
+        scratch=ScratchPolicy(mode=args.scratch_mode, dir=args.scratch_dir),
+        profile=args.profile,
     )
     print(f"[shard] wrote {summary['count']} shards to {summary['shard_dir']}")
+    _print_stop_reason(summary, "shard")
+    _print_timings(summary.get("timings"), "shard")
+    if summary.get("scratch"):
+        sc = summary["scratch"]
+        spill = ", spilled from tmpfs" if sc["spilled"] else ""
+        print(f"[shard] scratch: {sc['mode']} ({sc['dir']}{spill}), peak "
+              f"{sc['peak_bytes'] / 1e6:.1f} MB / {sc['peak_inodes']} inodes")
+    if summary.get("cache") == "hit":
+        print("[shard] restored from run cache (extractor not run)")
     if summary.get("reextracted_count"):
         print(f"[shard] re-extracted {summary['reextracted_count']} shard(s) with "
               f"native tools (perms preserved)")
+    if summary.get("deduplicated_count"):
+        print(f"[shard] skipped {summary['deduplicated_count']} byte-identical "
+              f"duplicate shard(s) (recorded as aliases)")
     print(f"[shard] manifest: {summary['manifest']}")
     if args.verbose:
         for s in summary["shards"]:
             rx = f"  reextracted_with={s['reextracted_with']}" if s.get('reextracted_with') else ""
+            dup = f"  aliases={s['aliases']}" if s.get('aliases') else ""
             print(f"  {s['name']}  score={s['score']}  fs_type={s['fs_type_guess']}  "
-                  f"root_path={s['root_path']}{rx}")
+                  f"root_path={s['root_path']}{rx}{dup}")
     if summary["count"] == 0:
         print("[shard] no shards found. Try lowering --min-score or pre-extracting "
               "and pointing with --from-extracted.", file=sys.stderr)
@@ -224,6 +385,10 @@ def cmd_plan(args) -> int:
         base_url=base_url, api_key=api_key, model=model,
         max_turns=args.max_turns, backend=_resolve_backend(args),
         insecure=_resolve_insecure(args), verbose=args.verbose,
+        catalog=_resolve_catalog(args), warm_jobs=args.warm_jobs, planner=args.planner,
+        evidence_chars=args.evidence_chars, tool_jobs=args.tool_jobs,
+        llm_concurrency=args.llm_concurrency, llm_tokens_per_minute=args.llm_tpm,
+        llm_stream=args.llm_stream,
         debug_transcript=args.debug_transcript,
     )
     result = run(args.shard_dir, cfg)
@@ -243,7 +408,7 @@ def cmd_apply(args) -> int:
     on_conflict = "error" if args.strict else args.on_conflict
     out_path = args.out or _default_out(args.shard_dir)
     stats = apply_plan(plan, args.shard_dir, out_path,
-                       on_conflict=on_conflict, verbose=args.verbose)
+                       on_conflict=on_conflict, verbose=args.verbose, profile=args.profile)
     _print_apply_summary(stats)
     return 0
 
@@ -258,8 +423,18 @@ def cmd_all(args) -> int:
         min_score=args.min_score,
         reextract=not args.no_reextract,
         verbose=args.verbose,
+        jobs=args.jobs,
+        archive=_archive_spec(args),
+        cache=_run_cache(args),
+        stream=args.stream,
+        limits=_extract_limits(args),
+        scratch=ScratchPolicy(mode=args.scratch_mode, dir=args.scratch_dir),
+        profile=args.profile,
     )
-    print(f"[all] {summary['count']} shards extracted")
+    cached = " (from run cache)" if summary.get("cache") == "hit" else ""
+    print(f"[all] {summary['count']} shards extracted{cached}")
+    _print_stop_reason(summary, "all")
+    _print_timings(summary.get("timings"), "all")
     if summary["count"] == 0:
         return 2
 
@@ -268,6 +443,10 @@ def cmd_all(args) -> int:
         base_url=base_url, api_key=api_key, model=model,
         max_turns=args.max_turns, backend=_resolve_backend(args),
         insecure=_resolve_insecure(args), verbose=args.verbose,
+        catalog=_resolve_catalog(args), warm_jobs=args.warm_jobs, planner=args.planner,
+        evidence_chars=args.evidence_chars, tool_jobs=args.tool_jobs,
+        llm_concurrency=args.llm_concurrency, llm_tokens_per_minute=args.llm_tpm,
+        llm_stream=args.llm_stream,
         debug_transcript=args.debug_transcript,
     )
     result = run(args.shard_dir, cfg)
@@ -283,11 +462,57 @@ def cmd_all(args) -> int:
         on_conflict = "error" if args.strict else args.on_conflict
         out_path = args.out or _default_out(args.shard_dir)
         stats = apply_plan(result.plan, args.shard_dir, out_path,
-                           on_conflict=on_conflict, verbose=args.verbose)
+                           on_conflict=on_conflict, verbose=args.verbose, profile=args.profile)
         _print_apply_summary(stats)
     return 0
 
 
+def cmd_batch(args) -> int:
+    cfg = None
+    if not args.shard_only:
+        base_url, api_key, model = _resolve_llm_env(args)
+        cfg = HarnessConfig(
+            base_url=base_url, api_key=api_key, model=model,
+            max_turns=args.max_turns, backend=_resolve_backend(args),
+            insecure=_resolve_insecure(args), verbose=args.verbose,
+            catalog=_resolve_catalog(args), warm_jobs=args.warm_jobs, planner=args.planner,
+            evidence_chars=args.evidence_chars, tool_jobs=args.tool_jobs,
+            llm_concurrency=args.llm_concurrency, llm_tokens_per_minute=args.llm_tpm,
+            llm_stream=args.llm_stream,
+            debug_transcript=args.debug_transcript,
+        )
+    opts = BatchOptions(
+        extractor=args.extractor,
+        min_score=args.min_score,
+        reextract=not args.no_reextract,
+        jobs=args.jobs,
+        archive=_archive_spec(args),
+        cache=_run_cache(args),
+        stream=args.stream,
+        extract_timeout=args.extract_timeout or None,
+        extract_max_size=args.extract_max_size,
+        extract_max_inodes=args.extract_max_inodes or None,
+        scratch=ScratchPolicy(mode=args.scratch_mode, dir=args.scratch_dir),
+        harness=cfg,
+        shard_only=args.shard_only,
+        no_apply=args.no_apply,
+        force=args.force,
+        on_conflict="error" if args.strict else args.on_conflict,
+        verbose=args.verbose,
+    )
+    result = run_batch(
+        args.source, args.out_root, opts,
+        extract_workers=args.extract_workers,
+        plan_workers=args.plan_workers,
+        journal_path=args.journal,
+        summary_path=args.summary,
+        retry_failed=args.retry_failed,
+    )
+    statuses = ", ".join(f"{n} {s}" for s, n in sorted(result["statuses"].items()))
+    print(f"[batch] {result['images']} images: {statuses or 'none'} -> {result['summary_path']}")
+    return 1 if result["statuses"].get("failed") else 0
+
+
 # --------------- top-level parser ---------------
 
 def build_parser() -> argparse.ArgumentParser:
@@ -322,6 +547,13 @@ def build_parser() -> argparse.ArgumentParser:
     sp.add_argument("--no-fakeroot", action="store_true",
                     help="Don't re-exec under fakeroot. Without fakeroot, firmware uid/gid "
                          "ownership (e.g. files owned by root) is lost in the shard tarballs.")
+    _add_jobs_arg(sp)
+    _add_archive_args(sp)
+    _add_cache_args(sp)
+    _add_stream_arg(sp)
+    _add_extract_limit_args(sp)
+    _add_scratch_args(sp)
+    _add_profile_arg(sp)
     sp.set_defaults(func=cmd_shard)
 
     # plan
@@ -339,6 +571,7 @@ def build_parser() -> argparse.ArgumentParser:
     sp.add_argument("--out", type=Path, default=None,
                     help="output .tar.gz (default: <shard_dir>/<name>.stitched.rootfs.tar.gz)")
     _add_apply_args(sp)
+    _add_profile_arg(sp)
     sp.set_defaults(func=cmd_apply)
 
     # all
@@ -351,10 +584,52 @@ def build_parser() -> argparse.ArgumentParser:
     sp.add_argument("--no-reextract", action="store_true")
     sp.add_argument("--no-fakeroot", action="store_true")
     sp.add_argument("--no-apply", action="store_true", help="stop after plan, don't build stitched tar")
+    _add_jobs_arg(sp)
+    _add_archive_args(sp)
+    _add_cache_args(sp)
+    _add_stream_arg(sp)
+    _add_extract_limit_args(sp)
+    _add_scratch_args(sp)
     _add_llm_args(sp)
     _add_apply_args(sp)
+    _add_profile_arg(sp)
     sp.set_defaults(func=cmd_all)
 
+    # batch
+    sp = sub.add_parser("batch", help="shard -> plan -> apply over many blobs, resumable")
+    sp.add_argument("source", type=Path,
+                    help="directory of firmware blobs, or a file listing one path per line")
+    sp.add_argument("-o", "--out-root", type=Path, required=True,
+                    help="per-image output dirs, journal and summary go here")
+    sp.add_argument("--extract-workers", type=int, default=2,
+                    help="images sharded (and applied) concurrently, one process each "
+                         "(default 2; 0 = one per CPU)")
+    sp.add_argument("--plan-workers", type=int, default=4,
+                    help="images planned concurrently; LLM calls are network-bound "
+                         "(default 4)")
+    sp.add_argument("--journal", type=Path, default=None,
+                    help="append-only progress journal (default: <out-root>/batch.journal.ndjson). "
+                         "Re-running with the same journal resumes the batch.")
+    sp.add_argument("--summary", type=Path, default=None,
+                    help="per-image NDJSON result rows (default: <out-root>/batch.summary.ndjson)")
+    sp.add_argument("--retry-failed", action="store_true",
+                    help="re-run images whose last journal record is an error, from the failed stage")
+    sp.add_argument("--shard-only", action="store_true", help="stop after shard; no LLM needed")
+    sp.add_argument("--extractor", choices=["unblob", "binwalk"], default="unblob")
+    sp.add_argument("--min-score", type=int, default=3)
+    sp.add_argument("--no-reextract", action="store_true")
+    sp.add_argument("--no-fakeroot", action="store_true")
+    sp.add_argument("--no-apply", action="store_true", help="stop after plan, don't build stitched tars")
+    _add_jobs_arg(sp)
+    _add_archive_args(sp)
+    _add_cache_args(sp)
+    _add_stream_arg(sp)
+    _add_extract_limit_args(sp)
+    _add_scratch_args(sp)
+    _add_llm_args(sp)
+    _add_apply_args(sp)
+    sp.set_defaults(func=cmd_batch)
+
     return parser
 
 
@@ -379,6 +654,9 @@ def main(argv: list[str] | None = None) -> int:
     if args.cmd == "shard":
         if args.firmware is None and args.from_extracted is None:
             parser.error("shard: provide either FIRMWARE or --from-extracted")
+    if getattr(args, "stream", False):
+        if args.extractor != "unblob" or getattr(args, "from_extracted", None) is not None:
+            parser.error(f"{args.cmd}: --stream needs a firmware blob and --extractor unblob")
 
     return args.func(args)
 
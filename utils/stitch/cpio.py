@@ -0,0 +1,380 @@
+"""Streaming cpio -> tar transcoder.
+
+`reextract_cpio` in shard.py unpacks a cpio blob with `cpio -idmu` into a
+scratch tree, and the shard archive is then built by walking that tree. That
+reads and writes every byte twice, and ownership only survives under
+fakeroot. Here the cpio headers are parsed in Python straight off the
+(optionally decompressed) blob, and each entry becomes a tar member in the
+shard archive. Modes, uid/gid, setuid/setgid/sticky bits, mtimes, symlink
+targets, device numbers and hard links all come from the cpio header, so
+there is no scratch tree and no fakeroot.
+
+Formats: newc (`070701`), newc+crc (`070702`), odc (`070707`) and old binary
+in either byte order. Concatenated archives (an early-microcode cpio in front
+of the real initramfs, NUL padding between them) are read through to the
+end. Wrappers: gzip, bzip2 and xz via the stdlib, lz4 via the `lz4` CLI.
+
+Member names follow `write_archive`'s layout (`.` then `./etc/passwd`, ...)
+so FragmentCache and apply_plan see no difference. Names that would escape
+the root (`..` components) are dropped, like `cpio --no-absolute-filenames`
+with traversal rejected. Sockets have no tar representation and are skipped.
+"""
+from __future__ import annotations
+
+import bz2
+import contextlib
+import gzip
+import lzma
+import posixpath
+import shutil
+import stat
+import subprocess
+import sys
+import tarfile
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+from .archive import ArchiveError, ArchiveSpec, archive_writer
+
+
+class CpioError(ValueError):
+    pass
+
+
+_TRAILER = "TRAILER!!!"
+
+_ASCII_MAGICS = (b"070701", b"070702", b"070707")
+_BINARY_MAGICS = (b"\xc7\x71", b"\x71\xc7")   # little-, big-endian 070707
+
+_NEWC_LEN = 110
+_ODC_LEN = 76
+_BIN_LEN = 26
+
+
+@dataclass
+class CpioEntry:
+    name: str            # as stored, undecoded path separators intact
+    mode: int            # full st_mode (type + permission bits)
+    uid: int
+    gid: int
+    nlink: int
+    mtime: int
+    size: int
+    dev: tuple[int, int]
+    ino: int
+    rdev: tuple[int, int]
+
+
+class _Stream:
+    """Exact reads over a decompressed byte stream, with one-level pushback
+    so the reader can peek past the NUL padding between archives.
+    """
+
+    def __init__(self, f: BinaryIO):
+        self._f = f
+        self._pushback = b""
+
+    def read(self, n: int) -> bytes:
+        if self._pushback:
+            head, self._pushback = self._pushback[:n], self._pushback[n:]
+            n -= len(head)
+            if n == 0:
+                return head
+            return head + self._f.read(n)
+        return self._f.read(n)
+
+    def read_exact(self, n: int) -> bytes:
+        buf = self.read(n)
+        while len(buf) < n:
+            more = self.read(n - len(buf))
+            if not more:
+                raise CpioError(f"truncated archive: wanted {n} bytes, got {len(buf)}")
+            buf += more
+        return buf
+
+    def skip(self, n: int) -> None:
+        while n > 0:
+            got = len(self.read(min(n, 1 << 16)))
+            if got == 0:
+                raise CpioError("truncated archive while skipping")
+            n -= got
+
+    def unread(self, data: bytes) -> None:
+        self._pushback = data + self._pushback
+
+
+class _Bounded:
+    """File-like view of the next `size` bytes of a _Stream, for
+    TarFile.addfile (which reads exactly ti.size bytes).
+    """
+
+    def __init__(self, stream: _Stream, size: int):
+        self._stream = stream
+        self._left = size
+
+    def read(self, n: int = -1) -> bytes:
+        if n < 0 or n > self._left:
+            n = self._left
+        if n == 0:
+            return b""
+        buf = self._stream.read_exact(n)
+        self._left -= len(buf)
+        return buf
+
+
+def _hex(field: bytes) -> int:
+    try:
+        return int(field, 16)
+    except ValueError as e:
+        raise CpioError(f"bad newc header field {field!r}") from e
+
+
+def _oct(field: bytes) -> int:
+    try:
+        return int(field, 8)
+    except ValueError as e:
+        raise CpioError(f"bad odc header field {field!r}") from e
+
+
+def _pad(n: int, align: int) -> int:
+    return (align - n % align) % align
+
+
+def _read_header(stream: _Stream, magic: bytes) -> tuple[CpioEntry, int, int]:
+    """Parse one header (magic already consumed) and the name after it.
+    Returns (entry, name padding, data alignment).
+    """
+    if magic in _ASCII_MAGICS[:2]:
+        raw = stream.read_exact(_NEWC_LEN - 6)
+        f = [_hex(raw[i:i + 8]) for i in range(0, 104, 8)]
+        (ino, mode, uid, gid, nlink, mtime, size,
+         devmaj, devmin, rdevmaj, rdevmin, namesize, _check) = f
+        name = stream.read_exact(namesize)
+        entry = CpioEntry(_decode(name), mode, uid, gid, nlink, mtime, size,
+                          (devmaj, devmin), ino, (rdevmaj, rdevmin))
+        return entry, _pad(_NEWC_LEN + namesize, 4), 4
+    if magic == b"070707":
+        raw = stream.read_exact(_ODC_LEN - 6)
+        dev, ino, mode, uid, gid, nlink, rdev = (_oct(raw[i:i + 6]) for i in range(0, 42, 6))
+        mtime = _oct(raw[42:53])
+        namesize = _oct(raw[53:59])
+        size = _oct(raw[59:70])
+        name = stream.read_exact(namesize)
+        entry = CpioEntry(_decode(name), mode, uid, gid, nlink, mtime, size,
+                          (dev, 0), ino, (rdev >> 8, rdev & 0xFF))
+        return entry, 0, 1
+    if magic in _BINARY_MAGICS:
+        order = "little" if magic == b"\xc7\x71" else "big"
+        raw = stream.read_exact(_BIN_LEN - 2)
+        h = [int.from_bytes(raw[i:i + 2], order) for i in range(0, 24, 2)]
+        dev, ino, mode, uid, gid, nlink, rdev, mt_hi, mt_lo, namesize, sz_hi, sz_lo = h
+        name = stream.read_exact(namesize)
+        entry = CpioEntry(_decode(name), mode, uid, gid, nlink, (mt_hi << 16) | mt_lo,
+                          (sz_hi << 16) | sz_lo, (dev, 0), ino, (rdev >> 8, rdev & 0xFF))
+        return entry, _pad(_BIN_LEN + namesize, 2), 2
+    raise CpioError(f"not a cpio header: {magic!r}")
+
+
+def _decode(name: bytes) -> str:
+    return name.rstrip(b"\x00").decode("utf-8", "surrogateescape")
+
+
+def _read_magic(stream: _Stream) -> Optional[bytes]:
+    """Magic of the next header, or None if the next bytes aren't one (end
+    of input, or trailing junk after the last archive).
+    """
+    head = stream.read(6)
+    if head[:2] in _BINARY_MAGICS:
+        stream.unread(head[2:])
+        return head[:2]
+    if head in _ASCII_MAGICS:
+        return head
+    stream.unread(head)
+    return None
+
+
+def _skip_nul_padding(stream: _Stream) -> None:
+    while True:
+        chunk = stream.read(512)
+        if not chunk:
+            return
+        rest = chunk.lstrip(b"\x00")
+        if rest:
+            stream.unread(rest)
+            return
+
+
+def iter_cpio(f: BinaryIO) -> Iterator[tuple[CpioEntry, _Bounded]]:
+    """Yield (entry, data reader) for every entry of the (possibly
+    concatenated) cpio stream `f`, trailers excluded. The data reader may be
+    read or left alone; whatever is left is skipped before the next header.
+    """
+    stream = _Stream(f)
+    magic = _read_magic(stream)
+    if magic is None:
+        raise CpioError("no cpio header at start of input")
+    while magic is not None:
+        entry, name_pad, align = _read_header(stream, magic)
+        stream.skip(name_pad)
+        if entry.name == _TRAILER:
+            stream.skip(_pad(entry.size, align))
+            _skip_nul_padding(stream)
+        else:
+            data = _Bounded(stream, entry.size)
+            yield entry, data
+            stream.skip(data._left + _pad(entry.size, align))
+        magic = _read_magic(stream)
+
+
+# --------------- Decompression ---------------
+
+@contextlib.contextmanager
+def _open_decompressed(blob: Path) -> Iterator[BinaryIO]:
+    with open(blob, "rb") as f:
+        magic = f.read(8)
+    if magic.startswith(b"\x1f\x8b\x08"):
+        with gzip.open(blob, "rb") as f:
+            yield f
+    elif magic.startswith(b"BZh"):
+        with bz2.open(blob, "rb") as f:
+            yield f
+    elif magic.startswith(b"\xfd7zXZ\x00"):
+        with lzma.open(blob, "rb") as f:
+            yield f
+    elif magic.startswith(b"\x04\x22\x4d\x18"):
+        if shutil.which("lz4") is None:
+            raise CpioError("lz4-wrapped cpio needs lz4 on PATH")
+        with open(blob, "rb") as src:
+            proc = subprocess.Popen(["lz4", "-d", "-c"], stdin=src, stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL)
+        try:
+            yield proc.stdout
+        finally:
+            proc.stdout.close()
+            proc.kill()
+            proc.wait()
+    else:
+        with open(blob, "rb") as f:
+            yield f
+
+
+# --------------- Transcoding ---------------
+
+def _member_name(raw: str) -> Optional[str]:
+    """cpio path -> tar member name in write_archive's `./...` layout. None
+    for paths that would escape the root.
+    """
+    if ".." in raw.split("/"):
+        return None
+    norm = posixpath.normpath("/" + raw.lstrip("/"))
+    return "." if norm == "/" else "." + norm
+
+
+def _tarinfo(entry: CpioEntry, name: str) -> Optional[tarfile.TarInfo]:
+    ti = tarfile.TarInfo(name)
+    ti.mode = stat.S_IMODE(entry.mode)
+    ti.uid, ti.gid = entry.uid, entry.gid
+    ti.uname = ti.gname = ""
+    ti.mtime = entry.mtime
+    fmt = stat.S_IFMT(entry.mode)
+    if fmt == stat.S_IFREG:
+        ti.type, ti.size = tarfile.REGTYPE, entry.size
+    elif fmt == stat.S_IFDIR:
+        ti.type = tarfile.DIRTYPE
+    elif fmt == stat.S_IFLNK:
+        ti.type = tarfile.SYMTYPE
+    elif fmt in (stat.S_IFCHR, stat.S_IFBLK):
+        ti.type = tarfile.CHRTYPE if fmt == stat.S_IFCHR else tarfile.BLKTYPE
+        ti.devmajor, ti.devminor = entry.rdev
+    elif fmt == stat.S_IFIFO:
+        ti.type = tarfile.FIFOTYPE
+    else:
+        return None  # sockets, unknown types
+    return ti
+
+
+def transcode_cpio_stream(f: BinaryIO, tf: tarfile.TarFile) -> int:
+    """Copy every entry of cpio stream `f` into `tf`. Returns the number of
+    members written, the root excluded.
+
+    Hard links: newc stores the data once, on the last link of a group, so
+    earlier zero-size links are held back until the data-carrying one is
+    written and then emitted as tar hard links to it. Groups whose data never
+    shows up become empty regular files.
+    """
+    written = 0
+    root_done = False
+    emitted: dict[tuple, str] = {}            # (dev, ino) -> first member name
+    deferred: dict[tuple, list[tarfile.TarInfo]] = {}
+
+    def add(ti: tarfile.TarInfo, data=None) -> None:
+        nonlocal written, root_done
+        if not root_done and ti.name != ".":
+            root = tarfile.TarInfo(".")
+            root.type, root.mode = tarfile.DIRTYPE, 0o755
+            tf.addfile(root)
+        root_done = True
+        tf.addfile(ti, data)
+        if ti.name != ".":
+            written += 1
+
+    for entry, data in iter_cpio(f):
+        name = _member_name(entry.name)
+        if name is None or (name == "." and root_done):
+            continue
+        ti = _tarinfo(entry, name)
+        if ti is None:
+            continue
+        if ti.type == tarfile.SYMTYPE:
+            ti.linkname = data.read().decode("utf-8", "surrogateescape")
+            add(ti)
+            continue
+        if ti.type != tarfile.REGTYPE or entry.nlink <= 1:
+            add(ti, data if ti.type == tarfile.REGTYPE else None)
+            continue
+        key = (entry.dev, entry.ino)
+        if key in emitted and emitted[key] == name:
+            # The same path listed twice: a tar link to itself can't be
+            # extracted, so keep the member as it is unless this copy
+            # carries data.
+            if entry.size:
+                add(ti, data)
+        elif key in emitted:
+            ti.type, ti.size, ti.linkname = tarfile.LNKTYPE, 0, emitted[key]
+            add(ti)
+        elif entry.size == 0:
+            deferred.setdefault(key, []).append(ti)
+        else:
+            add(ti, data)
+            emitted[key] = name
+            for link in deferred.pop(key, []):
+                if link.name != name:
+                    link.type, link.size, link.linkname = tarfile.LNKTYPE, 0, name
+                    add(link)
+    for links in deferred.values():
+        head, *rest = links
+        add(head, None)
+        for link in rest:
+            if link.name != head.name:
+                link.type, link.size, link.linkname = tarfile.LNKTYPE, 0, head.name
+                add(link)
+    return written
+
+
+def transcode_cpio(blob: Path, dest: Path, archive: ArchiveSpec, verbose: bool = False) -> bool:
+    """Re-extractor entry point: write cpio `blob` (raw or wrapped) as the
+    shard archive `dest`. Returns False, leaving no `dest`, if the blob isn't
+    a readable cpio or holds nothing.
+    """
+    try:
+        with _open_decompressed(blob) as f, archive_writer(dest, archive) as tf:
+            if transcode_cpio_stream(f, tf) == 0:
+                raise CpioError("empty archive")
+    except (CpioError, ArchiveError, OSError, EOFError, zlib.error,
+            lzma.LZMAError, tarfile.TarError) as e:
+        if verbose:
+            print(f"[reextract] cpio transcode failed for {blob}: {e}", file=sys.stderr)
+        return False
+    return True
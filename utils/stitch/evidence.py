@@ -0,0 +1,232 @@
+"""Mount evidence read deterministically out of a fragment.
+
+The same three signals the system prompt points the model at, computed
+without it: `/etc/fstab` rows, `mount` commands in init scripts, and
+absolute symlinks whose target the fragment doesn't have. Everything goes
+through FragmentCache, so it costs name lookups plus a few small text
+reads per fragment.
+
+`collect` runs during the harness warm-up; `evidence_block` renders the
+result into the initial prompt within a character budget, so the model
+starts with what its first read_file / grep / find_dangling_symlinks
+calls would have told it. rules.py votes on the same records.
+"""
+from __future__ import annotations
+
+import posixpath
+import re
+import shlex
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .tools import _GREP_MAX_BYTES, FragmentCache, _normalize
+
+# Mounts that never correspond to an extracted fragment.
+PSEUDO_FS = frozenset({
+    "proc", "sysfs", "tmpfs", "ramfs", "devpts", "devtmpfs", "debugfs", "usbfs",
+    "securityfs", "configfs", "cgroup", "cgroup2", "pstore", "tracefs", "mqueue",
+    "hugetlbfs", "bpf", "fusectl", "binfmt_misc", "nfs", "cifs", "swap", "none",
+})
+
+INIT_SCRIPT_GLOBS = ("etc/inittab", "etc/rc.local", "etc/rcS", "etc/init.d/*", "etc/rc.d/**")
+
+_MOUNT_RE = re.compile(r"(?:^|[\s;&|(`])(?:/s?bin/)?mount\s+([^;&|#>\n]*)")
+_SCRIPT_LIMIT = 200  # init scripts read per fragment
+
+# Default size of the prompt's evidence section, in characters.
+EVIDENCE_CHARS = 6000
+# (rows per list, symlink clusters) per fragment, tried in order until the
+# section fits the budget.
+_DETAIL_LEVELS = ((8, 6), (4, 3), (2, 2), (1, 1))
+
+
+@dataclass
+class MountEntry:
+    source: str  # device or spec ("" when the command named only a directory)
+    mount_point: str
+    fs_type: Optional[str]
+    origin: str  # "<path>:<line>" it came from
+
+    def describe(self) -> str:
+        kind = f" ({self.fs_type})" if self.fs_type else ""
+        src = f"{self.source} " if self.source else ""
+        return f"{src}-> {self.mount_point}{kind} [{self.origin}]"
+
+
+def fs_family(fs_type: Optional[str]) -> Optional[str]:
+    """Fold mount/fstab type names onto shard.py's fs_type_guess names."""
+    if not fs_type:
+        return None
+    t = fs_type.lower()
+    if re.fullmatch(r"ext[234]?", t):
+        return "ext"
+    if t in ("vfat", "msdos", "fat"):
+        return "fat"
+    if t.startswith("yaffs"):
+        return "yaffs"
+    if t in ("ubi", "ubifs"):
+        return "ubifs"
+    return t
+
+
+def read_text(cache: FragmentCache, fragment: str, path: str) -> Optional[str]:
+    """A small UTF-8 file's contents, or None (missing, not a file, too big
+    for grep, or binary)."""
+    m = cache.resolve(fragment, path)
+    if m is None or not m.isreg() or m.size > _GREP_MAX_BYTES:
+        return None
+    try:
+        return cache.read_member(fragment, m, _GREP_MAX_BYTES).decode("utf-8", errors="strict")
+    except UnicodeDecodeError:
+        return None
+
+
+def _mount_point(path: str) -> Optional[str]:
+    if not path.startswith("/") or "$" in path or "`" in path:
+        return None
+    return posixpath.normpath(path)
+
+
+def fstab_entries(cache: FragmentCache, fragment: str) -> list[MountEntry]:
+    text = read_text(cache, fragment, "etc/fstab")
+    out: list[MountEntry] = []
+    for i, line in enumerate((text or "").splitlines(), 1):
+        fields = line.split("#", 1)[0].split()
+        if len(fields) < 2:
+            continue
+        mp = _mount_point(fields[1])
+        if mp is None:
+            continue
+        out.append(MountEntry(fields[0], mp, fields[2] if len(fields) > 2 else None, f"etc/fstab:{i}"))
+    return out
+
+
+def _parse_mount_args(args: str) -> Optional[tuple[str, str, Optional[str]]]:
+    try:
+        toks = shlex.split(args)
+    except ValueError:
+        toks = args.split()
+    fs_type = None
+    pos: list[str] = []
+    i = 0
+    while i < len(toks):
+        t = toks[i]
+        if t in ("-t", "-o", "-O") and i + 1 < len(toks):
+            if t == "-t":
+                fs_type = toks[i + 1]
+            elif any(o in toks[i + 1].split(",") for o in ("bind", "rbind", "move", "remount")):
+                return None
+            i += 2
+            continue
+        if t in ("--bind", "--rbind", "--move", "-a"):
+            return None
+        if not t.startswith("-"):
+            pos.append(t)
+        i += 1
+    if not pos:
+        return None
+    mp = _mount_point(pos[-1]) if len(pos) <= 2 else None
+    if mp is None:
+        return None
+    return (pos[0] if len(pos) == 2 else "", mp, fs_type)
+
+
+def mount_commands(cache: FragmentCache, fragment: str) -> list[MountEntry]:
+    """`mount` invocations in the fragment's init scripts, in script order."""
+    table = cache.table(fragment)
+    scripts: list[str] = []
+    for g in INIT_SCRIPT_GLOBS:
+        for p in table.glob(g, _SCRIPT_LIMIT):
+            if p not in scripts:
+                scripts.append(p)
+    out: list[MountEntry] = []
+    for path in scripts[:_SCRIPT_LIMIT]:
+        text = read_text(cache, fragment, path)
+        for i, line in enumerate((text or "").splitlines(), 1):
+            if line.lstrip().startswith("#"):
+                continue
+            for m in _MOUNT_RE.finditer(line):
+                parsed = _parse_mount_args(m.group(1))
+                if parsed is not None:
+                    out.append(MountEntry(*parsed, origin=f"{path}:{i}"))
+    return out
+
+
+def _real(entries: list[MountEntry]) -> list[MountEntry]:
+    return [e for e in entries if fs_family(e.fs_type) not in PSEUDO_FS]
+
+
+def dangling_targets(cache: FragmentCache, fragment: str) -> list[tuple[str, str]]:
+    """(link, absolute target) for every symlink or hardlink whose absolute
+    target is missing from the fragment (find_dangling_symlinks, uncapped)."""
+    table = cache.table(fragment)
+    out = []
+    for m in table.members:
+        if (m.issym() or m.islnk()) and m.linkname.startswith("/"):
+            if m.linkname.lstrip("/") not in table:
+                out.append((_normalize(m.name), m.linkname))
+    return out
+
+
+@dataclass
+class FragmentEvidence:
+    """One fragment's mount evidence; pickled back from warm-up workers."""
+    fstab: list[MountEntry] = field(default_factory=list)  # pseudo filesystems dropped
+    mounts: list[MountEntry] = field(default_factory=list)  # likewise
+    dangling: list[tuple[str, str]] = field(default_factory=list)
+
+    def mount_entries(self) -> list[MountEntry]:
+        """fstab rows then mount commands, without "/"."""
+        return [e for e in self.fstab + self.mounts if e.mount_point != "/"]
+
+    def clusters(self) -> list[tuple[str, int, str]]:
+        """Dangling targets grouped by directory: (dir, count, one example
+        "link -> target"), most common first."""
+        counts: Counter[str] = Counter()
+        examples: dict[str, str] = {}
+        for link, target in self.dangling:
+            d = posixpath.dirname(posixpath.normpath(target))
+            counts[d] += 1
+            examples.setdefault(d, f"{link} -> {target}")
+        return [(d, n, examples[d]) for d, n in sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))]
+
+
+def collect(cache: FragmentCache, fragment: str) -> FragmentEvidence:
+    return FragmentEvidence(_real(fstab_entries(cache, fragment)),
+                            _real(mount_commands(cache, fragment)),
+                            dangling_targets(cache, fragment))
+
+
+def _rows(label: str, entries: list[MountEntry], limit: int) -> list[str]:
+    lines = [f"    {label}: {e.describe()}" for e in entries[:limit]]
+    if len(entries) > limit:
+        lines.append(f"    ... {len(entries) - limit} more {label} row(s)")
+    return lines
+
+
+def _fragment_lines(name: str, ev: FragmentEvidence, rows: int, clusters: int) -> list[str]:
+    if not (ev.fstab or ev.mounts or ev.dangling):
+        return [f"- {name}: no fstab rows, mount commands or dangling absolute symlinks"]
+    lines = [f"- {name}"]
+    lines += _rows("fstab", ev.fstab, rows)
+    lines += _rows("mount", ev.mounts, rows)
+    if ev.dangling:
+        groups = ev.clusters()
+        shown = ", ".join(f"{d} ({n}, e.g. {ex})" for d, n, ex in groups[:clusters])
+        more = f", and {len(groups) - clusters} more dir(s)" if len(groups) > clusters else ""
+        lines.append(f"    dangling symlinks: {len(ev.dangling)}, targets under {shown}{more}")
+    return lines
+
+
+def evidence_block(evidence: dict[str, FragmentEvidence], budget: int = EVIDENCE_CHARS) -> str:
+    """Every fragment's evidence as prompt text of at most `budget`
+    characters, dropping detail (then, at worst, the tail) to fit."""
+    text = ""
+    for rows, clusters in _DETAIL_LEVELS:
+        text = "\n".join(line for name, ev in evidence.items()
+                         for line in _fragment_lines(name, ev, rows, clusters))
+        if len(text) <= budget:
+            return text
+    cut = "\n... (evidence truncated)"
+    return text[:max(0, budget - len(cut))].rsplit("\n", 1)[0] + cut
@@ -3,31 +3,45 @@
 Backend-agnostic — talks to whatever `Backend` instance you pass in (see
 `backends/`). The loop's job is:
   * build the system prompt + initial user message from the fragment cache
-  * call the backend each turn, dispatch tool calls, validate, append history
+  * call the backend each turn, dispatch tool calls (a turn's calls run
+    concurrently on a thread pool; results go back in call order), validate,
+    append history
   * detect pathological states (stuck-on-same-tool, narrating without calling)
   * force `submit_plan` on the final turn
   * return the validated StitchPlan
 """
 from __future__ import annotations
 
+import asyncio
 import json
+import multiprocessing
+import os
 import sys
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Generator, NamedTuple
 
 from pydantic import ValidationError
 
 from .backends import Backend, BackendResponse, ToolCall, get_backend_class
 from .backends.openai_json import set_valid_tool_names
+from .evidence import EVIDENCE_CHARS, FragmentEvidence, evidence_block
+from .evidence import collect as collect_evidence
+from .memberindex import MemberIndex
 from .plan import StitchPlan
 from .prompts import (
     INITIAL_USER_PROMPT,
+    MOUNT_EVIDENCE_PROMPT,
     NUDGE_FORCE_SUBMIT,
     NUDGE_NO_TOOL,
     NUDGE_VALIDATION,
+    RULE_CANDIDATES_PROMPT,
     SYSTEM_PROMPT,
 )
+from .rules import RuleResult, plan_fragments
 from .tools import (
     TOOLS,
     TOOLS_BY_NAME,
@@ -49,6 +63,14 @@ class HarnessConfig:
     verbose: bool = False
     insecure: bool = False
     debug_transcript: Path | None = None
+    catalog: bool = False  # back FragmentCache with <frag_dir>/stitch_catalog.sqlite
+    warm_jobs: int = 0  # fragment warm-up processes; 0 = one per CPU, 1 = in-process
+    planner: str = "llm"  # "llm", "rules" (no model), or "hybrid" (model only when rules are unsure)
+    evidence_chars: int = EVIDENCE_CHARS  # initial-prompt mount evidence budget; 0 = leave it out
+    tool_jobs: int = 4  # threads running one turn's tool calls; 1 = one after another
+    llm_concurrency: int = 0  # max in-flight completions per endpoint, process-wide; 0 = no cap
+    llm_tokens_per_minute: int = 0  # token budget per endpoint, process-wide; 0 = no cap
+    llm_stream: bool = False  # stream completions; start tools before the reply ends
 
 
 @dataclass
@@ -66,13 +88,107 @@ class RunResult:
     transcript: list[TurnLog] = field(default_factory=list)
 
 
-def _fragment_summary_block(cache: FragmentCache) -> str:
+# Below this much compressed fragment data, starting worker processes costs
+# more than listing the fragments in-process.
+_WARM_POOL_MIN_BYTES = 8 << 20
+
+
+def _warm_one(cache: FragmentCache, name: str, evidence: bool) -> tuple[dict, FragmentEvidence | None]:
+    summary = tool_fs_summary(cache, FragmentOnlyArgs(fragment=name))
+    return summary, collect_evidence(cache, name) if evidence else None
+
+
+def _warm_fragment(frag_dir: Path, name: str, catalog: bool,
+                   evidence: bool) -> tuple[str, MemberIndex, dict, FragmentEvidence | None]:
+    """Warm-up worker: one fragment's member list, fs_summary and (if asked)
+    mount evidence."""
+    cache = FragmentCache(frag_dir, catalog=catalog)
+    try:
+        return (name, cache.snapshot(name), *_warm_one(cache, name, evidence))
+    finally:
+        cache.close()
+
+
+def _warm_serial(cache: FragmentCache, evidence: bool,
+                 stop: threading.Event) -> dict[str, tuple[dict, FragmentEvidence | None]]:
+    out = {}
+    for name in cache.names():
+        if stop.is_set():
+            break
+        out[name] = _warm_one(cache, name, evidence)
+    return out
+
+
+class _WarmUp:
+    """Lists every fragment and computes its fs_summary (and mount evidence,
+    when the prompt or the rules need it) in the background, so the work
+    overlaps backend setup and the reachability ping.
+
+    Many or large fragments go to a process pool (inflating a .tar.gz is
+    CPU-bound); the member lists come back as snapshots the cache adopts.
+    Otherwise a single thread fills the cache directly.
+    """
+
+    def __init__(self, cache: FragmentCache, cfg: HarnessConfig):
+        self.cache = cache
+        self.t0 = time.monotonic()
+        want_evidence = cfg.evidence_chars > 0 or cfg.planner != "llm"
+        self.evidence: dict[str, FragmentEvidence] = {}
+        names = cache.names()
+        jobs = min(cfg.warm_jobs or os.cpu_count() or 1, len(names))
+        total = sum(cache.info(n).size for n in names)
+        self.workers = jobs if jobs > 1 and total >= _WARM_POOL_MIN_BYTES else 1
+        self._pool: Executor
+        self._stop = threading.Event()
+        if self.workers > 1:
+            # spawn, not fork: batch runs plans from threads.
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+            self._futures = [self._pool.submit(_warm_fragment, cache.frag_dir, n, cfg.catalog,
+                                               want_evidence)
+                             for n in names]
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm")
+            self._futures = [self._pool.submit(_warm_serial, cache, want_evidence, self._stop)]
+
+    def summaries(self) -> dict[str, dict]:
+        """fs_summary per fragment; fills `evidence` as a side effect."""
+        try:
+            if self.workers == 1:
+                results = self._futures[0].result()
+            else:
+                results = {}
+                for f in self._futures:
+                    name, index, summary, ev = f.result()
+                    self.cache.adopt(name, index)
+                    results[name] = (summary, ev)
+            out = {}
+            for name, (summary, ev) in results.items():
+                out[name] = summary
+                if ev is not None:
+                    self.evidence[name] = ev
+            return out
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stop the warm-up and wait for it: the in-process thread reads
+        through the shared cache, which the caller closes next."""
+        self._stop.set()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _fragment_summary_block(cache: FragmentCache, summaries: dict[str, dict] | None = None) -> str:
     """Build the precomputed fs_summary block injected into the initial user
     message. Saves the LLM from spending its first N turns calling fs_summary.
+    `summaries` are ones already computed (see _WarmUp).
     """
     chunks = []
     for name in cache.names():
-        s = tool_fs_summary(cache, FragmentOnlyArgs(fragment=name))
+        if summaries is not None and name in summaries:
+            s = summaries[name]
+        else:
+            s = tool_fs_summary(cache, FragmentOnlyArgs(fragment=name))
         provenance_parts = []
         if "fs_type_guess" in s:
             provenance_parts.append(f"fs_type_guess={s['fs_type_guess']}")
@@ -80,6 +196,11 @@ def _fragment_summary_block(cache: FragmentCache) -> str:
             provenance_parts.append(f"unblob_path={s['root_path']!r}")
         if "shard_score" in s:
             provenance_parts.append(f"score={s['shard_score']}")
+        if "identical_copies" in s:
+            provenance_parts.append(
+                f"{s['identical_copies']} identical copies "
+                f"(also at {', '.join(repr(a) for a in s['alias_root_paths'])})"
+            )
         provenance = ("\n    " + ", ".join(provenance_parts)) if provenance_parts else ""
         chunks.append(
             f"- {name}\n"
@@ -117,6 +238,33 @@ def _minimal_repair_example(args_model_cls) -> str:
     return json.dumps(example)
 
 
+def _start_tool(pool: Executor, cache: FragmentCache, tc: ToolCall) -> Future | None:
+    """Submit `tc` if it names a tool and validates."""
+    tool = TOOLS_BY_NAME.get(tc.name)
+    if tool is None:
+        return None
+    try:
+        args_obj = tool.args_model.model_validate(tc.args)
+    except ValidationError:
+        return None
+    return pool.submit(tool.fn, cache, args_obj)
+
+
+def _start_tools(pool: Executor, cache: FragmentCache, calls: list[ToolCall],
+                 started: dict[int, Future]) -> dict[int, Future]:
+    """Submit every call in the turn that names a tool and validates, keyed
+    by position; calls already started while the reply streamed (`started`,
+    keyed by id() of the ToolCall) are reused. The dispatch loop below still
+    walks the calls in order (stuck detection, errors, submit_plan) and
+    picks results up from here, so the model sees them in call order."""
+    futures: dict[int, Future] = {}
+    for i, tc in enumerate(calls):
+        f = started.get(id(tc)) or _start_tool(pool, cache, tc)
+        if f is not None:
+            futures[i] = f
+    return futures
+
+
 def _tool_call_fingerprint(tc: ToolCall) -> str:
     """Stable string key for stuck-detection."""
     try:
@@ -136,8 +284,36 @@ def _write_debug(path: Path, role: str, content: str, tool_name: str | None = No
         f.write("\n")
 
 
-def run(frag_dir: Path, cfg: HarnessConfig) -> RunResult:
-    cache = FragmentCache(frag_dir)
+class _ModelCall(NamedTuple):
+    """What the conversation asks its driver for: one backend call."""
+    system: str
+    messages: list[dict]
+    tools: list[dict]
+    force_tool: str | None
+    on_tool_call: Callable[[ToolCall], None] | None
+
+
+@dataclass
+class _Session:
+    """A prepared conversation: everything the loop needs past the warm-up."""
+    cfg: HarnessConfig
+    cache: FragmentCache
+    backend: Backend
+    tool_schemas: list[dict]
+    messages: list[dict]
+    transcript: list[TurnLog]
+    tool_pool: ThreadPoolExecutor
+
+    def close(self) -> None:
+        self.tool_pool.shutdown(wait=True, cancel_futures=True)
+        self.cache.close()
+
+
+def _prepare(frag_dir: Path, cfg: HarnessConfig) -> RunResult | _Session:
+    """Everything before the first model turn: fragment warm-up, backend
+    setup and ping, the rule-based planner, the initial prompt. Returns the
+    result outright when the rules settle the plan."""
+    cache = FragmentCache(frag_dir, catalog=cfg.catalog)
     if not cache.names():
         raise SystemExit(
             f"no fragment .tar.gz files found in {frag_dir}. "
@@ -154,18 +330,68 @@ def run(frag_dir: Path, cfg: HarnessConfig) -> RunResult:
     # Tell the JSON backend what tool names exist so it can fuzzy-match.
     set_valid_tool_names({t.name for t in TOOLS} | {"submit_plan"})
 
-    backend_cls = get_backend_class(cfg.backend)
-    backend: Backend = backend_cls(cfg)
-    backend.reachability_check()
-
-    plan_schema = StitchPlan.model_json_schema()
-    tool_schemas = to_openai_schemas(plan_schema)
+    # Fragment listing runs in the background while the backend connects;
+    # only the initial prompt needs the summaries.
+    warm = _WarmUp(cache, cfg)
+    rules: RuleResult | None = None
+    unreachable: SystemExit | None = None  # hybrid: only fatal if the rules are unsure
+    try:
+        if cfg.planner != "rules":
+            backend_cls = get_backend_class(cfg.backend)
+            backend: Backend = backend_cls(cfg)
+            try:
+                backend.reachability_check()
+            except SystemExit as e:
+                if cfg.planner != "hybrid":
+                    raise
+                unreachable = e
+
+            plan_schema = StitchPlan.model_json_schema()
+            tool_schemas = to_openai_schemas(plan_schema)
+        summaries = warm.summaries()
+        if cfg.planner != "llm":
+            rules = plan_fragments(cache, summaries, warm.evidence)
+    except BaseException:
+        warm.close()
+        cache.close()
+        raise
+    if cfg.verbose:
+        print(f"[harness] warmed {len(summaries)} fragment(s) in "
+              f"{time.monotonic() - warm.t0:.1f}s ({warm.workers} worker(s))", file=sys.stderr)
+
+    if rules is not None:
+        if cfg.verbose:
+            verdict = "decided" if rules.decided else "undecided"
+            print(f"[harness] rules {verdict}:\n{rules.describe()}", file=sys.stderr)
+        if rules.best is None and cfg.planner == "rules":
+            cache.close()
+            raise SystemExit(
+                f"rules planner: no valid candidate layout for {frag_dir}. "
+                "Try --planner hybrid or llm."
+            )
+        if rules.best is not None and (cfg.planner == "rules" or rules.decided):
+            cache.close()
+            return RunResult(
+                plan=rules.best.plan,
+                backend_name="rules",
+                turns=0,
+                transcript=[TurnLog(role="rules", content=rules.describe())],
+            )
+        if unreachable is not None:
+            cache.close()
+            raise unreachable
 
     # Build the conversation. We keep just `messages` (post-system); the
     # backend injects the system prompt at call time.
     initial_user = INITIAL_USER_PROMPT.format(
-        fragment_summaries=_fragment_summary_block(cache),
+        fragment_summaries=_fragment_summary_block(cache, summaries),
     )
+    if cfg.evidence_chars > 0:
+        initial_user += MOUNT_EVIDENCE_PROMPT.format(
+            mount_evidence=evidence_block(warm.evidence, cfg.evidence_chars),
+        )
+    if rules is not None and rules.candidates:
+        initial_user += RULE_CANDIDATES_PROMPT.format(candidates=rules.describe())
     messages: list[dict] = [{"role": "user", "content": initial_user}]
     transcript: list[TurnLog] = [
         TurnLog(role="system", content=SYSTEM_PROMPT),
@@ -176,6 +402,17 @@ def run(frag_dir: Path, cfg: HarnessConfig) -> RunResult:
         _write_debug(cfg.debug_transcript, "system", SYSTEM_PROMPT)
         _write_debug(cfg.debug_transcript, "user", initial_user)
 
+    tool_pool = ThreadPoolExecutor(max_workers=max(1, cfg.tool_jobs), thread_name_prefix="tool")
+    return _Session(cfg, cache, backend, tool_schemas, messages, transcript, tool_pool)
+
+
+def _conversation(s: _Session) -> Generator[_ModelCall | list[Future], Any, RunResult]:
+    """The tool-use loop. Yields a _ModelCall for each backend round trip
+    (the driver sends back the BackendResponse) and each turn's running
+    tool futures (so an async driver can await them without blocking its
+    loop), and returns the validated plan."""
+    cfg, cache, backend = s.cfg, s.cache, s.backend
+    messages, transcript = s.messages, s.transcript
     recent_calls: list[str] = []
     consecutive_no_tool = 0
     same_tool_fail: dict[str, int] = {}
@@ -187,169 +424,229 @@ def run(frag_dir: Path, cfg: HarnessConfig) -> RunResult:
     turn = 0
     max_turns = cfg.max_turns
 
-    try:
-        while turn < max_turns:
-            is_last = (turn == max_turns - 1)
-            force = "submit_plan" if is_last else None
-
-            # Soft warning when we're nearing the limit without any submit attempt.
-            if (not warning_emitted and not submission_attempted
-                    and turn >= max(0, cfg.max_turns - 3) and not is_last):
-                print(
-                    f"WARNING: turn {turn+1}/{cfg.max_turns}, the model hasn't tried "
-                    "submit_plan yet. If the final forced submission is low-confidence, "
-                    f"rerun with --max-turns {cfg.max_turns + 10}.",
-                    file=sys.stderr,
+    while turn < max_turns:
+        is_last = (turn == max_turns - 1)
+        force = "submit_plan" if is_last else None
+
+        # Soft warning when we're nearing the limit without any submit attempt.
+        if (not warning_emitted and not submission_attempted
+                and turn >= max(0, cfg.max_turns - 3) and not is_last):
+            print(
+                f"WARNING: turn {turn+1}/{cfg.max_turns}, the model hasn't tried "
+                "submit_plan yet. If the final forced submission is low-confidence, "
+                f"rerun with --max-turns {cfg.max_turns + 10}.",
+                file=sys.stderr,
+            )
+            warning_emitted = True
+
+        if is_last:
+            messages.append({"role": "user", "content": NUDGE_FORCE_SUBMIT})
+            transcript.append(TurnLog(role="user", content=NUDGE_FORCE_SUBMIT))
+            if cfg.debug_transcript:
+                _write_debug(cfg.debug_transcript, "user (nudge)", NUDGE_FORCE_SUBMIT)
+
+        if cfg.verbose:
+            print(f"[harness] turn {turn+1}/{cfg.max_turns} ({backend.name})", file=sys.stderr)
+
+        started: dict[int, Future] = {}
+
+        def start_early(tc: ToolCall) -> None:
+            f = _start_tool(s.tool_pool, cache, tc)
+            if f is not None:
+                started[id(tc)] = f
+
+        resp: BackendResponse = yield _ModelCall(SYSTEM_PROMPT, messages, s.tool_schemas, force,
+                                                 start_early if cfg.llm_stream else None)
+        messages.append(backend.assistant_turn(resp))
+        transcript.append(TurnLog(role="assistant", content=resp.text or _summarize_tool_calls(resp)))
+        if cfg.debug_transcript:
+            _write_debug(cfg.debug_transcript, "assistant", resp.text or _summarize_tool_calls(resp))
+
+        if not resp.tool_calls:
+            consecutive_no_tool += 1
+            if consecutive_no_tool >= 2 and not is_last:
+                raise SystemExit(
+                    "harness: model emitted two consecutive responses with no tool call. "
+                    "Try a more capable model, or use --backend openai-json to force "
+                    "the JSON-emission protocol."
                 )
-                warning_emitted = True
-
-            if is_last:
-                messages.append({"role": "user", "content": NUDGE_FORCE_SUBMIT})
-                transcript.append(TurnLog(role="user", content=NUDGE_FORCE_SUBMIT))
-                if cfg.debug_transcript:
-                    _write_debug(cfg.debug_transcript, "user (nudge)", NUDGE_FORCE_SUBMIT)
-
-            if cfg.verbose:
-                print(f"[harness] turn {turn+1}/{cfg.max_turns} ({backend.name})", file=sys.stderr)
-
-            resp: BackendResponse = backend.call(SYSTEM_PROMPT, messages, tool_schemas, force_tool=force)
-            messages.append(backend.assistant_turn(resp))
-            transcript.append(TurnLog(role="assistant", content=resp.text or _summarize_tool_calls(resp)))
+            nudge = NUDGE_NO_TOOL
+            messages.append({"role": "user", "content": nudge})
+            transcript.append(TurnLog(role="user", content=nudge))
             if cfg.debug_transcript:
-                _write_debug(cfg.debug_transcript, "assistant", resp.text or _summarize_tool_calls(resp))
-
-            if not resp.tool_calls:
-                consecutive_no_tool += 1
-                if consecutive_no_tool >= 2 and not is_last:
-                    raise SystemExit(
-                        "harness: model emitted two consecutive responses with no tool call. "
-                        "Try a more capable model, or use --backend openai-json to force "
-                        "the JSON-emission protocol."
-                    )
-                nudge = NUDGE_NO_TOOL
+                _write_debug(cfg.debug_transcript, "user (nudge)", nudge)
+            continue
+        consecutive_no_tool = 0
+
+        terminated: StitchPlan | None = None
+        futures = _start_tools(s.tool_pool, cache, resp.tool_calls, started)
+        if cfg.verbose and len(futures) > 1:
+            print(f"[harness] running {len(futures)} tool calls concurrently", file=sys.stderr)
+        if cfg.verbose and started:
+            print(f"[harness] {len(started)} tool call(s) started while the reply streamed",
+                  file=sys.stderr)
+        if futures:
+            yield list(futures.values())
+        for i, tc in enumerate(resp.tool_calls):
+            # Stuck detection.
+            fp = _tool_call_fingerprint(tc)
+            recent_calls.append(fp)
+            if len(recent_calls) > 3:
+                recent_calls.pop(0)
+            if len(recent_calls) == 3 and len(set(recent_calls)) == 1:
+                nudge = (
+                    f"You have called {tc.name!r} with identical arguments three times. "
+                    "Use a DIFFERENT tool or call submit_plan now with your best plan."
+                )
                 messages.append({"role": "user", "content": nudge})
                 transcript.append(TurnLog(role="user", content=nudge))
                 if cfg.debug_transcript:
-                    _write_debug(cfg.debug_transcript, "user (nudge)", nudge)
+                    _write_debug(cfg.debug_transcript, "user (stuck)", nudge)
+                recent_calls.clear()
                 continue
-            consecutive_no_tool = 0
-
-            terminated: StitchPlan | None = None
-            for tc in resp.tool_calls:
-                # Stuck detection.
-                fp = _tool_call_fingerprint(tc)
-                recent_calls.append(fp)
-                if len(recent_calls) > 3:
-                    recent_calls.pop(0)
-                if len(recent_calls) == 3 and len(set(recent_calls)) == 1:
-                    nudge = (
-                        f"You have called {tc.name!r} with identical arguments three times. "
-                        "Use a DIFFERENT tool or call submit_plan now with your best plan."
-                    )
-                    messages.append({"role": "user", "content": nudge})
-                    transcript.append(TurnLog(role="user", content=nudge))
-                    if cfg.debug_transcript:
-                        _write_debug(cfg.debug_transcript, "user (stuck)", nudge)
-                    recent_calls.clear()
-                    continue
-
-                if tc.name == "submit_plan":
-                    submission_attempted = True
-                    try:
-                        terminated = StitchPlan.model_validate(tc.args)
-                        msgs = backend.tool_result_turns(tc, json.dumps({"ok": True}))
-                        messages.extend(msgs)
-                        for m in msgs:
-                            if cfg.debug_transcript:
-                                _write_debug(cfg.debug_transcript, "tool_result", json.dumps(m))
-                    except ValidationError as e:
-                        err = json.dumps({
-                            "error": "plan failed validation",
-                            "details": [
-                                {"loc": list(d["loc"]), "msg": d["msg"]} for d in e.errors()[:5]
-                            ],
-                            "hint": "Send submit_plan again with the corrections.",
-                        })
-                        msgs = backend.tool_result_turns(tc, err)
-                        messages.extend(msgs)
-                        for m in msgs:
-                            transcript.append(TurnLog(role="tool", content=err, tool_name=tc.name))
-                            if cfg.debug_transcript:
-                                _write_debug(cfg.debug_transcript, "tool_result (validation)", err)
-                        # Bonus turn: if the model's plan failed validation on
-                        # the FORCED final turn, give it one extra shot rather
-                        # than discarding everything.
-                        if is_last and not bonus_turn_used:
-                            bonus_turn_used = True
-                            max_turns += 1
-                            if cfg.verbose:
-                                print(f"[harness] granting 1 bonus turn to repair validation error",
-                                      file=sys.stderr)
-                    continue
-
-                tool = TOOLS_BY_NAME.get(tc.name)
-                if tool is None:
-                    err = json.dumps({
-                        "error": f"unknown tool: {tc.name}",
-                        "available_tools": sorted([t.name for t in TOOLS] + ["submit_plan"]),
-                    })
-                    msgs = backend.tool_result_turns(tc, err)
-                    messages.extend(msgs)
-                    transcript.append(TurnLog(role="tool", content=err, tool_name=tc.name))
-                    if cfg.debug_transcript:
-                        _write_debug(cfg.debug_transcript, "tool_result (unknown)", err)
-                    continue
 
+            if tc.name == "submit_plan":
+                submission_attempted = True
                 try:
-                    args_obj = tool.args_model.model_validate(tc.args)
+                    terminated = StitchPlan.model_validate(tc.args)
+                    msgs = backend.tool_result_turns(tc, json.dumps({"ok": True}))
+                    messages.extend(msgs)
+                    for m in msgs:
+                        if cfg.debug_transcript:
+                            _write_debug(cfg.debug_transcript, "tool_result", json.dumps(m))
                 except ValidationError as e:
-                    same_tool_fail[tc.name] = same_tool_fail.get(tc.name, 0) + 1
-                    if same_tool_fail[tc.name] > 2:
-                        err = json.dumps({
-                            "error": f"too many validation failures for {tc.name!r}, stop using it",
-                        })
-                    else:
-                        err = NUDGE_VALIDATION.format(
-                            error=str(e.errors()[:3]),
-                            schema=_minimal_repair_example(tool.args_model),
-                        )
+                    err = json.dumps({
+                        "error": "plan failed validation",
+                        "details": [
+                            {"loc": list(d["loc"]), "msg": d["msg"]} for d in e.errors()[:5]
+                        ],
+                        "hint": "Send submit_plan again with the corrections.",
+                    })
                     msgs = backend.tool_result_turns(tc, err)
                     messages.extend(msgs)
-                    transcript.append(TurnLog(role="tool", content=err, tool_name=tc.name))
-                    if cfg.debug_transcript:
-                        _write_debug(cfg.debug_transcript, "tool_result (validation)", err)
-                    continue
+                    for m in msgs:
+                        transcript.append(TurnLog(role="tool", content=err, tool_name=tc.name))
+                        if cfg.debug_transcript:
+                            _write_debug(cfg.debug_transcript, "tool_result (validation)", err)
+                    # Bonus turn: if the model's plan failed validation on
+                    # the FORCED final turn, give it one extra shot rather
+                    # than discarding everything.
+                    if is_last and not bonus_turn_used:
+                        bonus_turn_used = True
+                        max_turns += 1
+                        if cfg.verbose:
+                            print(f"[harness] granting 1 bonus turn to repair validation error",
+                                  file=sys.stderr)
+                continue
 
-                try:
-                    result = tool.fn(cache, args_obj)
-                except Exception as e:
-                    result = {"error": f"tool raised: {e}"}
-                result_json = json.dumps(result)
-                # Cap content fed back to the model.
-                result_json_for_model = result_json[:8000]
-                msgs = backend.tool_result_turns(tc, result_json_for_model)
+            tool = TOOLS_BY_NAME.get(tc.name)
+            if tool is None:
+                err = json.dumps({
+                    "error": f"unknown tool: {tc.name}",
+                    "available_tools": sorted([t.name for t in TOOLS] + ["submit_plan"]),
+                })
+                msgs = backend.tool_result_turns(tc, err)
                 messages.extend(msgs)
-                transcript.append(TurnLog(role="tool", content=result_json[:1000], tool_name=tc.name))
+                transcript.append(TurnLog(role="tool", content=err, tool_name=tc.name))
                 if cfg.debug_transcript:
-                    _write_debug(cfg.debug_transcript, "tool_result", result_json_for_model)
-
-            if terminated is not None:
-                return RunResult(
-                    plan=terminated,
-                    backend_name=backend.name,
-                    turns=turn + 1,
-                    transcript=transcript,
-                )
+                    _write_debug(cfg.debug_transcript, "tool_result (unknown)", err)
+                continue
 
-            turn += 1
+            try:
+                tool.args_model.model_validate(tc.args)
+            except ValidationError as e:
+                same_tool_fail[tc.name] = same_tool_fail.get(tc.name, 0) + 1
+                if same_tool_fail[tc.name] > 2:
+                    err = json.dumps({
+                        "error": f"too many validation failures for {tc.name!r}, stop using it",
+                    })
+                else:
+                    err = NUDGE_VALIDATION.format(
+                        error=str(e.errors()[:3]),
+                        schema=_minimal_repair_example(tool.args_model),
+                    )
+                msgs = backend.tool_result_turns(tc, err)
+                messages.extend(msgs)
+                transcript.append(TurnLog(role="tool", content=err, tool_name=tc.name))
+                if cfg.debug_transcript:
+                    _write_debug(cfg.debug_transcript, "tool_result (validation)", err)
+                continue
 
-        raise SystemExit(
-            f"loop terminated without a valid plan after {turn} turn(s). "
-            f"Rerun with --max-turns {cfg.max_turns + 10} for more budget, "
-            "or inspect --debug-transcript output to see what the model was doing."
-        )
+            try:
+                result = futures[i].result()
+            except Exception as e:
+                result = {"error": f"tool raised: {e}"}
+            result_json = json.dumps(result)
+            # Cap content fed back to the model.
+            result_json_for_model = result_json[:8000]
+            msgs = backend.tool_result_turns(tc, result_json_for_model)
+            messages.extend(msgs)
+            transcript.append(TurnLog(role="tool", content=result_json[:1000], tool_name=tc.name))
+            if cfg.debug_transcript:
+                _write_debug(cfg.debug_transcript, "tool_result", result_json_for_model)
+
+        if terminated is not None:
+            return RunResult(
+                plan=terminated,
+                backend_name=backend.name,
+                turns=turn + 1,
+                transcript=transcript,
+            )
+
+        turn += 1
+
+    raise SystemExit(
+        f"loop terminated without a valid plan after {turn} turn(s). "
+        f"Rerun with --max-turns {cfg.max_turns + 10} for more budget, "
+        "or inspect --debug-transcript output to see what the model was doing."
+    )
+
+
+def run(frag_dir: Path, cfg: HarnessConfig) -> RunResult:
+    session = _prepare(frag_dir, cfg)
+    if isinstance(session, RunResult):
+        return session
+    loop = _conversation(session)
+    try:
+        step = next(loop)
+        while True:
+            # Tool futures need no waiting here: the loop collects them in order.
+            reply = session.backend.call(*step) if isinstance(step, _ModelCall) else None
+            step = loop.send(reply)
+    except StopIteration as done:
+        return done.value
     finally:
-        cache.close()
+        loop.close()
+        session.close()
+
+
+async def arun(frag_dir: Path, cfg: HarnessConfig) -> RunResult:
+    """run() for asyncio: many plans can share one event loop and, through
+    backends/pool.py, one connection pool and limiter per endpoint. The
+    warm-up (disk and CPU) runs in a worker thread; model turns use the
+    backend's `acall` when it has one."""
+    session = await asyncio.to_thread(_prepare, frag_dir, cfg)
+    if isinstance(session, RunResult):
+        return session
+    backend = session.backend
+    loop = _conversation(session)
+    try:
+        step = next(loop)
+        while True:
+            if isinstance(step, _ModelCall):
+                if hasattr(backend, "acall"):
+                    reply = await backend.acall(*step)
+                else:
+                    reply = await asyncio.to_thread(backend.call, *step)
+            else:
+                await asyncio.wait([asyncio.wrap_future(f) for f in step])
+                reply = None
+            step = loop.send(reply)
+    except StopIteration as done:
+        return done.value
+    finally:
+        loop.close()
+        await asyncio.to_thread(session.close)
 
 
 def _summarize_tool_calls(resp: BackendResponse) -> str:
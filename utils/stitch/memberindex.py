@@ -0,0 +1,270 @@
+"""Per-shard member index, written beside each shard archive at shard time.
+
+`plan` tools mostly ask about names, types and link targets, which used to
+mean decompressing the whole shard (`getnames()`) on first touch. The shard
+step already streams every member through the tar writer, so it records one
+row per member in `<archive>.members.json.gz`:
+
+    {"version": 2, "archive_size": ..., "archive_tail": "<hash of last 4 KiB>",
+     "hash": "blake2b-128",
+     "fields": ["name", "type", "mode", "uid", "gid", "size", "linkname", "hash", "text", "offset"],
+     "members": [["./etc/passwd", "file", 420, 0, 0, 612, "", "9f0c...", true, 1536], ...],
+     "seek": {"codec": "gzip", "checkpoints": [[0, 10], [1048576, 201733], ...]}}
+
+`type` is one of file/hardlink/symlink/dir/chr/blk/fifo. `hash`, `text`
+(valid UTF-8 with no NUL bytes) and `offset` (where the member's data starts
+in the uncompressed tar stream) are null for anything but regular files.
+`seek` is the checkpoint table from seekable.py, or null when the archive
+was compressed by an external program and can't be entered part-way.
+
+FragmentCache loads the index instead of opening the tar where it can. The
+archive's size and a hash of its last 4 KiB identify the archive the index
+was built for; if either differs (the shard was rewritten) the index is
+ignored and callers fall back to reading the tar. The fingerprint survives
+copies and hard links, unlike mtimes.
+"""
+from __future__ import annotations
+
+import codecs
+import gzip
+import hashlib
+import json
+import os
+import tarfile
+from pathlib import Path
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+
+INDEX_SUFFIX = ".members.json.gz"
+INDEX_VERSION = 2
+
+_FIELDS = ("name", "type", "mode", "uid", "gid", "size", "linkname", "hash", "text", "offset")
+_TAIL_BYTES = 4096
+
+_TYPE_NAMES = {
+    tarfile.REGTYPE: "file",
+    tarfile.AREGTYPE: "file",
+    tarfile.CONTTYPE: "file",
+    tarfile.LNKTYPE: "hardlink",
+    tarfile.SYMTYPE: "symlink",
+    tarfile.DIRTYPE: "dir",
+    tarfile.CHRTYPE: "chr",
+    tarfile.BLKTYPE: "blk",
+    tarfile.FIFOTYPE: "fifo",
+}
+
+
+class MemberRecord(NamedTuple):
+    name: str
+    type: str
+    mode: int
+    uid: int
+    gid: int
+    size: int
+    linkname: str
+    hash: Optional[str]
+    text: Optional[bool]
+    offset: Optional[int]
+
+    def isreg(self) -> bool:
+        return self.type == "file"
+
+    def issym(self) -> bool:
+        return self.type == "symlink"
+
+    def islnk(self) -> bool:
+        return self.type == "hardlink"
+
+    def isdir(self) -> bool:
+        return self.type == "dir"
+
+    @classmethod
+    def from_tarinfo(cls, ti: tarfile.TarInfo) -> "MemberRecord":
+        """A record for a member listed by tarfile, without hashing its data."""
+        return cls(ti.name, type_name(ti), ti.mode, ti.uid, ti.gid,
+                   ti.size if ti.isreg() else 0, ti.linkname or "", None, None,
+                   ti.offset_data if ti.isreg() else None)
+
+
+def type_name(ti: tarfile.TarInfo) -> str:
+    """The index's name for a TarInfo's type (file/symlink/dir/...)."""
+    return _TYPE_NAMES.get(ti.type, "file")
+
+
+def index_path(archive: Path) -> Path:
+    return archive.with_name(archive.name + INDEX_SUFFIX)
+
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=16)
+
+
+def archive_fingerprint(archive: Path) -> tuple[int, str]:
+    """(size, hash of the last 4 KiB): identifies the archive bytes a
+    sidecar was built from."""
+    size = archive.stat().st_size
+    with open(archive, "rb") as f:
+        f.seek(max(0, size - _TAIL_BYTES))
+        tail = f.read()
+    h = _new_hash()
+    h.update(tail)
+    return size, h.hexdigest()
+
+
+class _Tee:
+    """File-like wrapper that hashes and text-checks what tarfile reads."""
+
+    def __init__(self, fileobj: BinaryIO):
+        self._f = fileobj
+        self._hash = _new_hash()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = True
+
+    def read(self, n: int = -1) -> bytes:
+        data = self._f.read(n)
+        self._feed(data)
+        return data
+
+    def _feed(self, data: bytes) -> None:
+        self._hash.update(data)
+        if self.text and data:
+            if b"\0" in data:
+                self.text = False
+            else:
+                try:
+                    self._decoder.decode(data)
+                except UnicodeDecodeError:
+                    self.text = False
+
+    def finish(self) -> tuple[str, bool]:
+        if self.text:
+            try:
+                self._decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                self.text = False
+        return self._hash.hexdigest(), self.text
+
+
+class MemberIndexBuilder:
+    """Collects one record per tar member as the archive is written."""
+
+    def __init__(self):
+        self.members: list[list] = []
+        # Set by the writer when it can provide one (see seekable.py).
+        self.seek: Optional[dict] = None
+
+    def track(self, ti: tarfile.TarInfo, fileobj: Optional[BinaryIO]) -> Optional[BinaryIO]:
+        """Call before TarFile.addfile; returns the fileobj to pass on."""
+        if fileobj is None or not ti.isreg():
+            return fileobj
+        return _Tee(fileobj)
+
+    def add(self, ti: tarfile.TarInfo, tracked: Optional[BinaryIO] = None,
+            offset: Optional[int] = None) -> None:
+        """Call after TarFile.addfile with what track() returned and the
+        offset its data landed at."""
+        digest, text = None, None
+        if ti.isreg():
+            if isinstance(tracked, _Tee):
+                digest, text = tracked.finish()
+            else:  # empty regular file written without a fileobj
+                digest, text = _new_hash().hexdigest(), True
+        self.members.append([
+            # Only permission bits reach the header; gettarinfo() keeps the
+            # file-type bits in .mode too.
+            ti.name, type_name(ti), ti.mode & 0o7777, ti.uid, ti.gid,
+            ti.size if ti.isreg() else 0, ti.linkname or "", digest, text,
+            offset if ti.isreg() else None,
+        ])
+
+    def add_stream(self, ti: tarfile.TarInfo, fileobj: Optional[BinaryIO]) -> None:
+        """Record a member read back from an existing archive."""
+        tracked = self.track(ti, fileobj)
+        if isinstance(tracked, _Tee):
+            while tracked.read(1 << 20):
+                pass
+        self.add(ti, tracked, ti.offset_data)
+
+    def write(self, archive: Path) -> Path:
+        """Write the sidecar for the finished `archive` (write-then-rename)."""
+        size, tail = archive_fingerprint(archive)
+        payload = {
+            "version": INDEX_VERSION,
+            "archive_size": size,
+            "archive_tail": tail,
+            "hash": "blake2b-128",
+            "fields": list(_FIELDS),
+            "members": self.members,
+            "seek": self.seek,
+        }
+        dest = index_path(archive)
+        part = dest.with_name(dest.name + ".part")
+        with gzip.open(part, "wt", compresslevel=6) as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(part, dest)
+        return dest
+
+
+class IndexingTarFile(tarfile.TarFile):
+    """TarFile that feeds every added member to `member_index`, if set.
+    Open it with `IndexingTarFile.open(...)` like tarfile.open.
+    """
+    member_index: Optional[MemberIndexBuilder] = None
+
+    def addfile(self, tarinfo, fileobj=None):
+        if self.member_index is None:
+            return super().addfile(tarinfo, fileobj)
+        tracked = self.member_index.track(tarinfo, fileobj)
+        super().addfile(tarinfo, tracked)
+        # addfile leaves self.offset past the data and its block padding.
+        blocks = -(-tarinfo.size // tarfile.BLOCKSIZE) if tarinfo.isreg() else 0
+        self.member_index.add(tarinfo, tracked, self.offset - blocks * tarfile.BLOCKSIZE)
+
+
+def index_existing(archive: Path, open_stream, seek: Optional[dict] = None) -> Path:
+    """Build the sidecar by reading `archive` back once, for writers that
+    don't go through tarfile (bsdtar / GNU tar). `open_stream(archive)`
+    returns a TarFile to iterate.
+    """
+    builder = MemberIndexBuilder()
+    builder.seek = seek
+    with open_stream(archive) as tf:
+        for ti in tf:
+            builder.add_stream(ti, tf.extractfile(ti) if ti.isreg() else None)
+    return builder.write(archive)
+
+
+class MemberIndex:
+    """A loaded sidecar: records in archive order, a name lookup, and the
+    seek table (None if the archive has none)."""
+
+    def __init__(self, records: list[MemberRecord], seek: Optional[dict] = None):
+        self.records = records
+        self.seek = seek
+        self.names = [r.name for r in records]
+        self._by_name = {r.name: r for r in records}
+
+    def get(self, name: str) -> Optional[MemberRecord]:
+        return self._by_name.get(name)
+
+    def __iter__(self) -> Iterator[MemberRecord]:
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @classmethod
+    def load(cls, archive: Path) -> Optional["MemberIndex"]:
+        """The sidecar for `archive`, or None if missing, unreadable, from
+        another version, or built for different archive bytes.
+        """
+        p = index_path(archive)
+        try:
+            with gzip.open(p, "rt") as f:
+                payload = json.load(f)
+            if payload.get("version") != INDEX_VERSION or tuple(payload["fields"]) != _FIELDS:
+                return None
+            if (payload["archive_size"], payload["archive_tail"]) != archive_fingerprint(archive):
+                return None
+            return cls([MemberRecord(*row) for row in payload["members"]], payload.get("seek"))
+        except (OSError, EOFError, ValueError, KeyError, TypeError):
+            return None
@@ -0,0 +1,203 @@
+"""Glob patterns over normalised member paths, compiled once and cached.
+
+The tools accept two dialects:
+
+  plain   fnmatch: `*` and `?` also match "/", `[...]` is a class.
+  `**`    any pattern containing `**`: `**` matches anything, `*` stays
+          within one path component, `?` is any character, `[...]` a class.
+
+Both match as they did before this module, except for `[...]` inside a
+`**` pattern. That used to be literal text (`x[1]/**` matched `x[1]/b`) and
+is now a class, as in the plain dialect, so both dialects read brackets
+the same way.
+
+Matching is a regex fullmatch. What makes it cheap is `prefixes`: the
+literal strings every match must start with. They are read off the pattern
+up to its first `*` or `?`, expanding leading character classes
+(`[de]*/*` -> "d", "e"; `lib/ld[-.]*` -> "lib/ld-", "lib/ld."), so
+MemberTable only regex-tests the sorted range under each prefix:
+`etc/init.d/*` never looks outside `etc/init.d/`.
+
+`**` patterns usually lead with `**/` and have no path prefix, but when
+nothing in their last component can match "/" (no `?`, `**` or a class
+that admits it), that component is a basename glob. `base_prefixes` are its
+literal prefixes, looked up in a sorted basename view: `**/init*` only tests
+names whose last component starts with "init".
+"""
+from __future__ import annotations
+
+import fnmatch
+import re
+from functools import lru_cache
+from typing import Optional
+
+# Past this many literal prefixes, stop expanding classes and use the
+# (shorter) prefixes reached so far.
+_MAX_PREFIXES = 32
+_CACHE_SIZE = 256
+
+
+def _class_end(pattern: str, i: int) -> int:
+    """Index just past the `]` closing the class opened at pattern[i], or
+    -1 if it is not closed (then `[` is literal, as in fnmatch)."""
+    j = i + 1
+    if j < len(pattern) and pattern[j] == "!":
+        j += 1
+    if j < len(pattern) and pattern[j] == "]":
+        j += 1
+    j = pattern.find("]", j)
+    return -1 if j < 0 else j + 1
+
+
+def _class_chars(body: str) -> Optional[set[str]]:
+    """The characters a class body (between the brackets) matches, or None
+    for a negated class or one too wide to enumerate."""
+    if body.startswith("!"):
+        return None
+    chars: set[str] = set()
+    i = 0
+    while i < len(body):
+        if i + 2 < len(body) and body[i + 1] == "-":
+            lo, hi = ord(body[i]), ord(body[i + 2])
+            if hi - lo >= _MAX_PREFIXES:
+                return None
+            chars.update(chr(c) for c in range(lo, hi + 1))
+            i += 3
+        else:
+            chars.add(body[i])
+            i += 1
+    return chars
+
+
+def _class_regex(body: str) -> str:
+    """The regex for the class `[body]`, built as fnmatch.translate builds
+    one: empty or reversed ranges are dropped, `\\` and the set-operation
+    characters are escaped, and a class with nothing left never matches.
+
+    >>> compile_glob("**/[z-a]").match("d/z")
+    False
+    >>> compile_glob("**/[[]x").match("d/[x")
+    True
+    """
+    if "-" not in body:
+        stuff = body.replace("\\", r"\\")
+    else:
+        chunks = []
+        i = 0
+        k = 2 if body.startswith("!") else 1
+        while (k := body.find("-", k)) >= 0:
+            chunks.append(body[i:k])
+            i = k + 1
+            k += 3
+        if body[i:]:
+            chunks.append(body[i:])
+        else:
+            chunks[-1] += "-"
+        # Merge away empty (reversed) ranges; re rejects them.
+        for k in range(len(chunks) - 1, 0, -1):
+            if chunks[k - 1][-1] > chunks[k][0]:
+                chunks[k - 1] = chunks[k - 1][:-1] + chunks[k][1:]
+                del chunks[k]
+        stuff = "-".join(c.replace("\\", r"\\").replace("-", r"\-") for c in chunks)
+    stuff = re.sub(r"([&~|])", r"\\\1", stuff)
+    if not stuff:
+        return "(?!)"
+    if stuff == "!":
+        return "."
+    if stuff[0] == "!":
+        stuff = "^" + stuff[1:]
+    elif stuff[0] in ("^", "["):
+        stuff = "\\" + stuff
+    return f"[{stuff}]"
+
+
+def _translate_globstar(pattern: str) -> str:
+    out: list[str] = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append(".")
+            i += 1
+        elif c == "[" and (end := _class_end(pattern, i)) > 0:
+            out.append(_class_regex(pattern[i + 1: end - 1]))
+            i = end
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "(?s:" + "".join(out) + r")\Z"
+
+
+def _last_component(pattern: str) -> Optional[str]:
+    """What follows the pattern's last "/" outside a class, if any."""
+    last = None
+    i = 0
+    while i < len(pattern):
+        if pattern[i] == "[" and (end := _class_end(pattern, i)) > 0:
+            i = end
+            continue
+        if pattern[i] == "/":
+            last = i
+        i += 1
+    return None if last is None else pattern[last + 1:]
+
+
+def _one_component(glob: str) -> bool:
+    """Whether `glob` (globstar dialect) can only match strings without "/"."""
+    if "?" in glob or "**" in glob or "/" in glob:
+        return False
+    i = 0
+    while (i := glob.find("[", i)) >= 0:
+        end = _class_end(glob, i)
+        if end < 0:
+            break
+        if glob[i + 1] == "!" or "/" in glob[i + 1: end - 1]:
+            return False
+        i = end
+    return True
+
+
+def _prefixes(pattern: str) -> list[str]:
+    prefixes = [""]
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c in "*?":
+            break
+        if c == "[" and (end := _class_end(pattern, i)) > 0:
+            chars = _class_chars(pattern[i + 1: end - 1])
+            if not chars or len(prefixes) * len(chars) > _MAX_PREFIXES:
+                break
+            prefixes = [p + ch for p in prefixes for ch in sorted(chars)]
+            i = end
+            continue
+        prefixes = [p + c for p in prefixes]
+        i += 1
+    return prefixes
+
+
+class GlobPattern:
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.globstar = "**" in pattern
+        self.regex = re.compile(_translate_globstar(pattern) if self.globstar
+                                else fnmatch.translate(pattern))
+        self.prefixes = _prefixes(pattern)
+        self.base_prefixes: Optional[list[str]] = None
+        last = _last_component(pattern) if self.globstar else None
+        if last is not None and _one_component(last) and _prefixes(last) != [""]:
+            self.base_prefixes = _prefixes(last)
+
+    def match(self, path: str) -> bool:
+        return self.regex.match(path) is not None
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def compile_glob(pattern: str) -> GlobPattern:
+    return GlobPattern(pattern)
@@ -0,0 +1,108 @@
+"""Every fragment's paths in one index, for `locate_path`.
+
+Mount-point inference keeps asking "which fragment has a path ending in X,
+and under what prefix": a base's dangling `/usr/lib/libfoo.so` symlink is
+explained by an overlay holding `lib/libfoo.so` at its root (mount it at
+/usr), or by one holding `usr/lib/libfoo.so` (mount it at /).
+
+PathIndex answers both directions without touching any archive:
+`suffix(X)` finds members ending in X, and `mount_points(X)` finds members
+that are a tail of X, i.e. fragments that would provide X if mounted at
+the components in front of that tail.
+
+  exact    normalised path -> [(fragment, member position), ...], for
+           mount_points' tail lookups
+  suffix   every path with its components reversed ("usr/lib/libfoo.so" ->
+           "libfoo.so/lib/usr"), sorted. Paths ending in the components
+           of a query are then one contiguous range, found by bisection:
+           a reversed-component trie flattened into a sorted array, like
+           MemberTable's prefix ranges.
+
+Positions index the fragment's MemberTable, so callers get types and link
+targets from there.
+"""
+from __future__ import annotations
+
+import bisect
+import posixpath
+from array import array
+from typing import NamedTuple
+
+
+class PathHit(NamedTuple):
+    fragment: str
+    pos: int
+    path: str
+    prefix: str  # components before the matched suffix ("" = at the root)
+
+
+def _reverse(path: str) -> str:
+    return "/".join(reversed(path.split("/")))
+
+
+def query_path(path: str) -> str:
+    """The normalised form a query is matched in (`//` and `.` components
+    collapsed, as link targets often have them)."""
+    p = path.strip().lstrip("./").rstrip("/")
+    if not p:
+        return ""
+    p = posixpath.normpath(p)
+    return "" if p == "." else p
+
+
+class PathIndex:
+    def __init__(self, fragments: list[tuple[str, list[str]]]):
+        """`fragments`: (name, normalised member names in archive order)."""
+        self.fragments = [name for name, _names in fragments]
+        self._paths: list[list[str]] = []
+        self._exact: dict[str, list[tuple[int, int]]] = {}
+        keyed: list[tuple[str, int, int]] = []
+        for fi, (_name, names) in enumerate(fragments):
+            paths = [n.rstrip("/") for n in names]
+            self._paths.append(paths)
+            for pos, p in enumerate(paths):
+                if not p:
+                    continue
+                self._exact.setdefault(p, []).append((fi, pos))
+                keyed.append((_reverse(p), fi, pos))
+        keyed.sort()
+        self._rkeys = [k for k, _fi, _pos in keyed]
+        self._rfrag = array("I", (fi for _k, fi, _pos in keyed))
+        self._rpos = array("I", (pos for _k, _fi, pos in keyed))
+
+    def __len__(self) -> int:
+        return len(self._rkeys)
+
+    def mount_points(self, path: str) -> list[PathHit]:
+        """Members equal to a proper tail of `path`; `prefix` is where their
+        fragment would have to be mounted. Deepest mount point first."""
+        parts = query_path(path).split("/")
+        hits = []
+        for k in range(len(parts) - 1, 0, -1):
+            tail = "/".join(parts[k:])
+            for fi, pos in self._exact.get(tail, ()):
+                hits.append(PathHit(self.fragments[fi], pos, tail, "/".join(parts[:k])))
+        return hits
+
+    def suffix(self, path: str) -> list[PathHit]:
+        """Members whose path ends in the components of `path`: exact hits
+        first, then by prefix depth, then fragment order."""
+        q = query_path(path)
+        if not q:
+            return []
+        rq = _reverse(q)
+        keys = self._rkeys
+        # Equal keys, then keys continuing with "/" (more leading components).
+        lo = bisect.bisect_left(keys, rq)
+        hi = bisect.bisect_right(keys, rq, lo)
+        slo = bisect.bisect_left(keys, rq + "/", hi)
+        shi = bisect.bisect_left(keys, rq + "0", slo)  # "0" follows "/"
+        ranked = []
+        depth = q.count("/") + 1
+        for i in (*range(lo, hi), *range(slo, shi)):
+            fi, pos = self._rfrag[i], self._rpos[i]
+            p = self._paths[fi][pos]
+            prefix = p.rsplit("/", depth)[0] if p.count("/") >= depth else ""
+            ranked.append((p.count("/") - depth + 1, fi, pos, PathHit(self.fragments[fi], pos, p, prefix)))
+        ranked.sort(key=lambda r: r[:3])
+        return [r[3] for r in ranked]
@@ -18,11 +18,14 @@ import struct
 import sys
 import tarfile
 from pathlib import Path
-from typing import Literal
+from typing import Literal, Optional
 
 import yaml
 from pydantic import BaseModel, Field, model_validator
 
+from .archive import open_tar
+from .timing import StageTimer
+
 
 class Fragment(BaseModel):
     source: str
@@ -101,15 +104,19 @@ def apply_plan(
     out_path: Path,
     on_conflict: Literal["base", "overlay", "error"] = "overlay",
     verbose: bool = False,
+    profile: Optional[Path] = None,
 ) -> dict:
     """Produce a single stitched .tar.gz from the plan.
 
-    Returns a stats dict with conflict counts, members written, and the plan
-    hash. on_conflict controls which side wins when two fragments place a
-    member at the same path: "base" keeps the first occurrence (base is
-    processed first), "overlay" keeps the last (matches union-mount intuition),
-    "error" raises.
+    Returns a stats dict with conflict counts, members written, the plan
+    hash, and per-stage `timings` (merge, trailer; see timing.py). The merge
+    timings also go in the output's manifest trailer. on_conflict controls
+    which side wins when two fragments place a member at the same path:
+    "base" keeps the first occurrence (base is processed first), "overlay"
+    keeps the last (matches union-mount intuition), "error" raises.
+    `profile` dumps cProfile stats per stage into that directory.
     """
+    timer = StageTimer(profile)
     ordered = sorted(plan.fragments, key=lambda f: 0 if f.role == "base" else 1)
 
     seen: dict[str, str] = {}
@@ -119,15 +126,16 @@ def apply_plan(
     out_path.parent.mkdir(parents=True, exist_ok=True)
     tmp_path = out_path.with_suffix(out_path.suffix + ".tmp")
 
-    with tarfile.open(tmp_path, "w:gz") as out_tar:
+    with timer.stage("merge") as merge_stats, tarfile.open(tmp_path, "w:gz") as out_tar:
         for frag in ordered:
             src = frag_dir / frag.source
             if not src.exists():
                 raise FileNotFoundError(f"fragment not found: {src}")
             if verbose:
                 print(f"[apply] {frag.source} ({frag.role}) -> {frag.mount_point}", file=sys.stderr)
-            with tarfile.open(src, "r:*") as in_tar:
+            with open_tar(src) as in_tar:
                 for ti in in_tar:
+                    merge_stats.files += 1
                     new_name = _rewrite_path(frag.mount_point, ti.name)
                     if not new_name:
                         continue
@@ -174,18 +182,21 @@ def apply_plan(
         # stitch-specific extras (readers ignore unknown keys):
         "stitched_from": [f.source for f in plan.fragments],
         "stitch_plan_confidence": plan.confidence,
+        "stitch_timings": timer.to_json(),
     }
-    manifest_json = json.dumps(manifest).encode()
-    trailer = (
-        manifest_json
-        + struct.pack("<I", len(manifest_json))
-        + struct.pack("<H", 1)
-        + b"made with fw2tar"
-    )
-    with open(tmp_path, "ab") as f, gzip.GzipFile(fileobj=f, mode="wb") as g:
-        g.write(trailer)
+    with timer.stage("trailer"):
+        manifest_json = json.dumps(manifest).encode()
+        trailer = (
+            manifest_json
+            + struct.pack("<I", len(manifest_json))
+            + struct.pack("<H", 1)
+            + b"made with fw2tar"
+        )
+        with open(tmp_path, "ab") as f, gzip.GzipFile(fileobj=f, mode="wb") as g:
+            g.write(trailer)
 
     tmp_path.rename(out_path)
+    timer.dump_profiles()
 
     return {
         "members_written": members_written,
@@ -193,4 +204,5 @@ def apply_plan(
         "conflict_samples": conflicts[:10],
         "plan_hash": plan_hash(plan),
         "out_path": str(out_path),
+        "timings": timer.to_json(),
     }
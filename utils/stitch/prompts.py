@@ -16,14 +16,20 @@ To decide the layout, gather evidence by calling tools. Useful signals:
   * fs_type_guess from the manifest (squashfs / ubifs / jffs2 / cpio / ...) —
     type and unblob's extraction path are strong hints for the role of a
     fragment (e.g. ubifs partitions are often app/data overlays).
+  * "N identical copies" — byte-identical images (A/B banks) were merged
+    into one fragment; plan it once, the copies are not separate overlays.
   * /etc/fstab entries (mount points and device names)
   * mount commands in /etc/init.d/rcS, /etc/inittab, /etc/rc.local
   * dangling absolute symlinks (link target missing inside this fragment ==>
-    that path lives in another fragment)
+    that path lives in another fragment; locate_path finds which one and
+    where it would have to be mounted)
   * hardcoded paths in /sbin/init or /bin/busybox via strings_of
 
 Constraints:
-  * Call tools one at a time. Be terse.
+  * Batch independent lookups: several tool calls in one turn run
+    concurrently (e.g. read_file etc/fstab in every fragment, or
+    find_dangling_symlinks on each candidate base, all at once). Call
+    in sequence only when one result decides the next question. Be terse.
   * Do not ask the user questions; act on the evidence.
   * When you have enough evidence (or after a few rounds), call submit_plan
     with your StitchPlan. The harness validates it against a schema.
@@ -43,8 +49,29 @@ Fragments in this run:
 {fragment_summaries}
 """
 
+# Appended to the initial message unless `--evidence-chars 0`.
+MOUNT_EVIDENCE_PROMPT = """
+Mount evidence already read out of every fragment: its /etc/fstab rows,
+`mount` commands in its init scripts, and where its dangling absolute
+symlinks point, grouped by target directory. Don't spend turns re-reading
+these; use the tools for what is missing or truncated.
+
+{mount_evidence}
+"""
+
+# Appended to the initial message by `--planner hybrid` when the rule-based
+# planner (rules.py) could not decide on its own.
+RULE_CANDIDATES_PROMPT = """
+A rule-based pass over the same fragments (fstab rows, mount commands in
+init scripts, dangling absolute symlinks) ranked these layouts, best first.
+It was not confident enough to decide. Check its evidence with the tools
+before adopting or rejecting a layout:
+
+{candidates}
+"""
+
 NUDGE_NO_TOOL = (
-    "You did not call a tool. You must call exactly one tool per turn. "
+    "You did not call a tool. You must call at least one tool per turn. "
     "Either gather more evidence with a tool, or finalize with submit_plan."
 )
 
@@ -62,7 +89,8 @@ NUDGE_FORCE_SUBMIT = (
 FALLBACK_SYSTEM_PROMPT = SYSTEM_PROMPT + """
 
 Your server does not support native tool calling. Instead, on each turn,
-respond with a SINGLE JSON object and nothing else, in one of these forms:
+respond with a SINGLE JSON object and nothing else (so one tool call per
+turn in this mode), in one of these forms:
 
   Tool call:   {"tool": "<tool_name>", "args": { ... }}
   Final plan:  {"final": { ...StitchPlan... }}
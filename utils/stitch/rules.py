@@ -0,0 +1,244 @@
+"""Rule-based stitch planning (`plan --planner rules|hybrid`).
+
+Most images have one obvious base and overlays whose mount points follow
+from the base's own files, so the planner:
+
+1. ranks base candidates by fs_summary (`sbin/init`, `etc/passwd`, ...);
+2. for each, collects votes for (fragment, mount point) pairs:
+     * each dangling absolute symlink in the base that another fragment
+       would satisfy if mounted at some sub-path (PathIndex.mount_points),
+     * each fstab row / `mount` command in the base whose filesystem type
+       matches a fragment's fs_type_guess (weaker when either is unknown),
+     * a bonus when the mount point exists as a path in the base;
+3. places overlays greedily by vote weight (one fragment per mount point),
+   counts paths the overlays would shadow in the base, and scores the plan;
+4. adds variants that move one overlay to its runner-up mount point.
+
+`decided` is set when the top plan places every fragment with solid
+support and beats the runner-up by a clear margin; the harness then skips
+the model. Otherwise the ranked candidates are handed to it as evidence.
+"""
+from __future__ import annotations
+
+import posixpath
+from dataclasses import dataclass, field
+from typing import Optional
+
+from pydantic import ValidationError
+
+from .evidence import FragmentEvidence, collect, fs_family
+from .plan import Fragment, StitchPlan
+from .tools import FragmentCache, FragmentOnlyArgs, tool_fs_summary
+
+BASE_WEIGHTS = {
+    "has_sbin_init": 4, "has_etc_passwd": 3, "has_bin_sh": 2, "has_lib_ld": 2,
+    "has_etc_inittab": 1, "has_etc_init_d_rcS": 1, "has_etc_fstab": 1,
+}
+_STANDARD_TOP_DIRS = frozenset({"bin", "sbin", "etc", "lib", "usr", "dev", "proc", "sys", "var", "tmp"})
+
+MAX_BASES = 3
+MAX_CANDIDATES = 5
+# A base needs at least this score to be decided on without the model
+# (sbin/init + etc/passwd is 7).
+MIN_BASE_SCORE = 5.0
+# Every overlay in a decided plan needs this much vote weight, e.g. two
+# resolved symlinks or one type-matched fstab row.
+MIN_OVERLAY_SUPPORT = 2.0
+# ... and the plan must beat the runner-up by max(CLEAR_MARGIN,
+# CLEAR_RATIO * its score).
+CLEAR_MARGIN = 3.0
+CLEAR_RATIO = 0.25
+
+_MIN_VOTE = 1.0  # below this a pair is noise, not a placement
+_CONFLICT_WEIGHT = 0.2
+_MAX_CONFLICT_PENALTY = 10.0
+_UNPLACED_PENALTY = 1.0
+_DANGLING_LIMIT = 5000
+
+
+@dataclass
+class _Support:
+    weight: float = 0.0
+    symlinks: int = 0
+    example: str = ""
+    reasons: list[str] = field(default_factory=list)
+
+    def describe(self) -> str:
+        parts = []
+        if self.symlinks:
+            parts.append(f"resolves {self.symlinks} dangling symlink(s), e.g. {self.example}")
+        parts.extend(self.reasons)
+        return "; ".join(parts)
+
+
+@dataclass
+class Candidate:
+    plan: StitchPlan
+    score: float
+    evidence: list[str]
+    unplaced: list[str]
+    conflicts: int
+    weakest: float  # smallest vote weight among placed overlays (inf if none)
+
+
+@dataclass
+class RuleResult:
+    candidates: list[Candidate]  # best first
+    decided: bool
+
+    @property
+    def best(self) -> Optional[Candidate]:
+        return self.candidates[0] if self.candidates else None
+
+    def describe(self, limit: int = MAX_CANDIDATES) -> str:
+        """The ranked candidates as prompt text."""
+        lines = []
+        for i, c in enumerate(self.candidates[:limit], 1):
+            layout = ", ".join(f"{f.source} at {f.mount_point}" for f in c.plan.fragments)
+            lines.append(f"{i}. score {c.score:.1f}: {layout}")
+            lines.extend(f"     - {e}" for e in c.evidence)
+            if c.conflicts:
+                lines.append(f"     - {c.conflicts} path(s) would shadow files in the base")
+            if c.unplaced:
+                lines.append(f"     - no mount evidence for: {', '.join(c.unplaced)}")
+        return "\n".join(lines)
+
+
+def base_score(summary: dict) -> float:
+    score = float(sum(w for k, w in BASE_WEIGHTS.items() if summary.get(k)))
+    tops = {d["name"] for d in summary.get("top_dirs", [])}
+    return score + 0.5 * len(tops & _STANDARD_TOP_DIRS)
+
+
+def _votes(cache: FragmentCache, base: str, ev: FragmentEvidence) -> dict[tuple[str, str], _Support]:
+    votes: dict[tuple[str, str], _Support] = {}
+    others = [n for n in cache.names() if n != base]
+    index = cache.path_index()
+    for link, target in ev.dangling[:_DANGLING_LIMIT]:
+        for hit in index.mount_points(target):
+            if hit.fragment == base:
+                continue
+            s = votes.setdefault((hit.fragment, posixpath.normpath("/" + hit.prefix)), _Support())
+            s.weight += 1.0
+            s.symlinks += 1
+            s.example = s.example or f"/{link} -> {target}"
+    for entry in ev.mount_entries():
+        family = fs_family(entry.fs_type)
+        for f in others:
+            guess = fs_family(cache.info(f).fs_type_guess)
+            if family and guess and family == guess:
+                weight = 2.0
+            elif family is None or guess is None:
+                weight = 0.5
+            else:
+                continue
+            s = votes.setdefault((f, entry.mount_point), _Support())
+            s.weight += weight
+            s.reasons.append(f"{entry.origin} mounts {entry.fs_type or 'a filesystem'} at {entry.mount_point}")
+    table = cache.table(base)
+    for (f, mp), s in votes.items():
+        if mp.lstrip("/") in table:
+            s.weight += 0.5
+            s.reasons.append(f"{mp} exists in the base")
+    return votes
+
+
+def _conflicts(cache: FragmentCache, base: str, placed: dict[str, str]) -> int:
+    """Non-directory paths an overlay would put on top of one in the base."""
+    table = cache.table(base)
+    n = 0
+    for f, mp in placed.items():
+        prefix = mp.lstrip("/")
+        ftable = cache.table(f)
+        for m, name in zip(ftable.members, ftable.norm_names):
+            if not name or m.isdir():
+                continue
+            hit = table.resolve(posixpath.join(prefix, name).rstrip("/"))
+            if hit is not None and not hit.isdir():
+                n += 1
+    return n
+
+
+def _candidate(cache: FragmentCache, base: str, base_pts: float,
+               placed: dict[str, tuple[str, _Support]]) -> Optional[Candidate]:
+    """The scored plan for `placed`, or None if it isn't a valid StitchPlan."""
+    others = [n for n in cache.names() if n != base]
+    unplaced = [f for f in others if f not in placed]
+    conflicts = _conflicts(cache, base, {f: mp for f, (mp, _s) in placed.items()})
+    support = sum(s.weight for _mp, s in placed.values())
+    score = (base_pts + support - min(_MAX_CONFLICT_PENALTY, _CONFLICT_WEIGHT * conflicts)
+             - _UNPLACED_PENALTY * len(unplaced))
+    info = cache.info(base)
+    fragments = [Fragment(source=base, mount_point="/", role="base", fs_type=info.fs_type_guess)]
+    evidence = [f"{base} as base: rootfs score {base_pts:.1f}"]
+    for f, (mp, s) in sorted(placed.items(), key=lambda kv: (kv[1][0].count("/"), kv[1][0])):
+        fragments.append(Fragment(source=f, mount_point=mp, role="overlay",
+                                  fs_type=cache.info(f).fs_type_guess))
+        evidence.append(f"{f} at {mp}: {s.describe()}")
+    weakest = min((s.weight for _mp, s in placed.values()), default=float("inf"))
+    try:
+        plan = StitchPlan(
+            fragments=fragments,
+            reasoning="Rule-based plan. " + " | ".join(evidence),
+            confidence="low",
+            open_questions=[f"no mount evidence for {f}; left out of the plan" for f in unplaced],
+        )
+    except ValidationError:
+        return None
+    return Candidate(plan, score, evidence, unplaced, conflicts, weakest)
+
+
+def _assign(votes: dict[tuple[str, str], _Support],
+            fixed: Optional[tuple[str, str]] = None) -> dict[str, tuple[str, _Support]]:
+    placed: dict[str, tuple[str, _Support]] = {}
+    used: set[str] = set()
+    order = sorted(votes.items(), key=lambda kv: (-kv[1].weight, kv[0]))
+    if fixed is not None:
+        order = [(fixed, votes[fixed])] + order
+    for (f, mp), s in order:
+        if s.weight < _MIN_VOTE or f in placed or mp in used or mp == "/":
+            continue
+        placed[f] = (mp, s)
+        used.add(mp)
+    return placed
+
+
+def plan_fragments(cache: FragmentCache, summaries: Optional[dict[str, dict]] = None,
+                   evidence: Optional[dict[str, FragmentEvidence]] = None) -> RuleResult:
+    """Ranked candidate plans for the cache's fragments. `summaries` and
+    `evidence` (per fragment) are computed here when not given."""
+    names = cache.names()
+    if summaries is None:
+        summaries = {n: tool_fs_summary(cache, FragmentOnlyArgs(fragment=n)) for n in names}
+    evidence = evidence or {}
+    bases = sorted(names, key=lambda n: -base_score(summaries[n]))[:MAX_BASES]
+    candidates: list[Optional[Candidate]] = []
+    for base in bases:
+        pts = base_score(summaries[base])
+        votes = _votes(cache, base, evidence.get(base) or collect(cache, base))
+        placed = _assign(votes)
+        candidates.append(_candidate(cache, base, pts, placed))
+        # Variants: one overlay moved to its runner-up mount point.
+        for f, (mp, _s) in list(placed.items()):
+            alts = sorted(((m, s) for (g, m), s in votes.items() if g == f and m != mp),
+                          key=lambda ms: -ms[1].weight)
+            if alts and alts[0][1].weight >= _MIN_VOTE:
+                candidates.append(_candidate(cache, base, pts, _assign(votes, (f, alts[0][0]))))
+    unique: dict[str, Candidate] = {}
+    for c in sorted(filter(None, candidates), key=lambda c: -c.score):
+        key = repr(sorted((f.source, f.mount_point) for f in c.plan.fragments))
+        unique.setdefault(key, c)
+    ranked = list(unique.values())[:MAX_CANDIDATES]
+    decided = False
+    if ranked:
+        top = ranked[0]
+        margin = top.score - ranked[1].score if len(ranked) > 1 else float("inf")
+        top_base = base_score(summaries[top.plan.fragments[0].source])
+        decided = (not top.unplaced and top.weakest >= MIN_OVERLAY_SUPPORT
+                   and top_base >= MIN_BASE_SCORE
+                   and margin >= max(CLEAR_MARGIN, CLEAR_RATIO * top.score))
+        if decided:
+            top.plan.confidence = "high"
+        elif not top.unplaced and margin > 0:
+            top.plan.confidence = "medium"
+    return RuleResult(ranked, decided)
@@ -0,0 +1,200 @@
+"""Content-addressed cache of `shard` runs.
+
+Re-running `fwstitch shard`/`all` on the same blob (say, after changing the
+model or `--max-turns`) shouldn't pay for another unblob extraction. Entries
+are keyed by the firmware's SHA-256, the extractor and its version, and
+every option that changes the shard output (stem, min_score, reextract,
+archive spec). A hit hard-links (or copies, across filesystems) the cached
+tarballs and `shards.json` into the output dir without running anything.
+
+Layout under the cache root:
+
+    <root>/.lock                  global lock, held while storing / evicting
+    <root>/locks/<key>.lock       per-key lock, held across lookup+compute+store
+    <root>/entries/<key>/         shard tarballs + shards.json + meta.json
+
+The per-key lock means parallel workers handed the same blob extract it once;
+the second one blocks and then gets a hit. Eviction is LRU by meta.json mtime
+(touched on every hit), bounded by total stored bytes, and never removes an
+entry whose key lock is currently held.
+"""
+from __future__ import annotations
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+import uuid
+from pathlib import Path
+from typing import Iterator, Optional
+
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+_META = "meta.json"
+
+
+def parse_size(value: str) -> int:
+    """Parse a byte count like `500M`, `20G`, `1.5GiB`, or plain `1048576`."""
+    m = _SIZE_RE.match(value)
+    if not m:
+        raise ValueError(f"bad size: {value!r}")
+    return int(float(m.group(1)) * _SIZE_UNITS[m.group(2).lower()])
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_VERSION_CACHE: dict[str, str] = {}
+
+
+def extractor_version(extractor: str) -> str:
+    """`<extractor> --version`, first line, or "unknown". Memoized per process."""
+    if extractor not in _VERSION_CACHE:
+        try:
+            r = subprocess.run([extractor, "--version"], capture_output=True, text=True,
+                               timeout=30, check=False)
+            out = (r.stdout or r.stderr).strip().splitlines()
+            _VERSION_CACHE[extractor] = out[0] if out else "unknown"
+        except (OSError, subprocess.TimeoutExpired):
+            _VERSION_CACHE[extractor] = "unknown"
+    return _VERSION_CACHE[extractor]
+
+
+def _place(src: Path, dest: Path, link: bool) -> None:
+    """Hard-link src to dest (copy if linking isn't possible), replacing dest."""
+    if dest.exists() or dest.is_symlink():
+        dest.unlink()
+    if link:
+        try:
+            os.link(src, dest)
+            return
+        except OSError:
+            pass
+    shutil.copy2(src, dest)
+
+
+@contextlib.contextmanager
+def _flock(path: Path, blocking: bool = True) -> Iterator[bool]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        flags = fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(f, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class RunCache:
+    def __init__(self, root: Path, max_bytes: int, link: bool = True):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.link = link
+        (root / "entries").mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(firmware: Path, extractor: str, options: dict) -> str:
+        ident = {
+            "firmware_sha256": file_sha256(firmware),
+            "extractor": extractor,
+            "extractor_version": extractor_version(extractor),
+            "options": options,
+        }
+        return hashlib.sha256(json.dumps(ident, sort_keys=True).encode()).hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.root / "entries" / key
+
+    @contextlib.contextmanager
+    def locked(self, key: str) -> Iterator[None]:
+        """Hold the per-key lock across lookup, compute and store."""
+        with _flock(self.root / "locks" / f"{key}.lock"):
+            yield
+
+    def restore(self, key: str, out_dir: Path) -> Optional[dict]:
+        """On a hit, materialize the entry into out_dir and return the cached
+        manifest. Returns None on a miss. Caller holds `locked(key)`.
+        """
+        entry = self._entry(key)
+        meta_path = entry / _META
+        if not meta_path.is_file():
+            return None
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for name in meta["files"]:
+            _place(entry / name, out_dir / name, self.link)
+        os.utime(meta_path)  # LRU touch
+        with open(out_dir / "shards.json", "r") as f:
+            return json.load(f)
+
+    def store(self, key: str, out_dir: Path, shard_names: list[str], ident: dict) -> None:
+        """Copy this run's shards (and their member index sidecars) + manifest
+        into the cache, then evict down to max_bytes. Caller holds `locked(key)`.
+        """
+        files = [*shard_names, "shards.json"]
+        size = sum((out_dir / n).stat().st_size for n in files)
+        if size > self.max_bytes:
+            return  # would evict itself immediately
+        staging = self.root / "entries" / f".tmp-{uuid.uuid4().hex}"
+        staging.mkdir()
+        try:
+            for name in files:
+                _place(out_dir / name, staging / name, self.link)
+            with open(staging / _META, "w") as f:
+                json.dump({"key": key, "files": files, "size": size,
+                           "created": time.time(), **ident}, f, indent=2)
+            with _flock(self.root / ".lock"):
+                entry = self._entry(key)
+                if entry.exists():
+                    shutil.rmtree(entry)
+                staging.rename(entry)
+                self._evict(keep=key)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _evict(self, keep: str) -> None:
+        """Drop least-recently-used entries until under max_bytes. Caller holds
+        the global lock.
+        """
+        entries = []
+        total = 0
+        for entry in (self.root / "entries").iterdir():
+            meta_path = entry / _META
+            try:
+                with open(meta_path, "r") as f:
+                    size = int(json.load(f)["size"])
+                mtime = meta_path.stat().st_mtime
+            except (OSError, ValueError, KeyError, json.JSONDecodeError):
+                continue
+            total += size
+            entries.append((mtime, entry, size))
+        entries.sort()
+        for _mtime, entry, size in entries:
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            with _flock(self.root / "locks" / f"{entry.name}.lock", blocking=False) as got:
+                if not got:
+                    continue  # someone is restoring from it right now
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
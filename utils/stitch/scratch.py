@@ -0,0 +1,133 @@
+"""Where the shard step's scratch tree lives.
+
+Extraction is dominated by small-file metadata writes (unblob creates one
+file per carved chunk and every file of every filesystem), which run much
+faster on tmpfs than on a journaling disk filesystem. `ScratchPolicy`
+picks the scratch parent:
+
+  disk   `--scratch-dir` if given, else the default temp dir
+  ram    a tmpfs mount (`/dev/shm`, `$XDG_RUNTIME_DIR`, or `--scratch-dir`
+         if it is itself tmpfs); an error if none is writable
+  auto   ram when the firmware's estimated expansion fits the tmpfs free
+         space and half of MemAvailable, else disk
+
+In auto mode the RAM placement is a guess, so the extractor's byte budget
+on tmpfs is capped at the headroom that was measured. If the run hits that
+cap, shard() discards it and re-runs on disk ("spills") instead of
+harvesting a partial tree.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+SCRATCH_MODES = ("auto", "ram", "disk")
+
+_RAM_FS_TYPES = frozenset({"tmpfs", "ramfs"})
+
+# Extraction output per input byte, for sizing. unblob keeps carved chunks
+# next to their extracted trees, and squashfs/xz rootfs images commonly
+# unpack 3-4x, so 8x leaves some margin.
+EXPANSION_ESTIMATE = 8
+
+# Fraction of MemAvailable a RAM scratch may take.
+_MEM_SHARE = 0.5
+
+
+@dataclass(frozen=True)
+class ScratchPolicy:
+    mode: str = "disk"
+    dir: Optional[Path] = None
+
+
+@dataclass
+class ScratchPlacement:
+    root: Path                 # the mkdtemp'd scratch dir (caller removes it)
+    mode: str                  # "ram" or "disk", as resolved
+    headroom: Optional[int]    # bytes the run may use before spilling (auto+ram only)
+
+
+def _mount_fs_type(path: Path) -> Optional[str]:
+    """Filesystem type of the mount containing `path`, from /proc/mounts."""
+    try:
+        target = os.path.realpath(path)
+        best, fstype = "", None
+        with open("/proc/mounts", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mnt = parts[1].replace("\\040", " ")
+                if (target == mnt or target.startswith(mnt.rstrip("/") + "/")) and len(mnt) >= len(best):
+                    best, fstype = mnt, parts[2]
+        return fstype
+    except OSError:
+        return None
+
+
+def _mem_available() -> Optional[int]:
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _ram_dir(policy: ScratchPolicy) -> Optional[Path]:
+    candidates = [policy.dir] if policy.dir is not None else []
+    candidates += [Path("/dev/shm")]
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        candidates.append(Path(os.environ["XDG_RUNTIME_DIR"]))
+    for c in candidates:
+        if c.is_dir() and os.access(c, os.W_OK) and _mount_fs_type(c) in _RAM_FS_TYPES:
+            return c
+    return None
+
+
+def _ram_headroom(ram_dir: Path) -> int:
+    st = os.statvfs(ram_dir)
+    free = st.f_bavail * st.f_frsize
+    mem = _mem_available()
+    if mem is not None:
+        free = min(free, int(mem * _MEM_SHARE))
+    return free
+
+
+def place_scratch(
+    policy: ScratchPolicy,
+    firmware: Optional[Path],
+    verbose: bool = False,
+) -> ScratchPlacement:
+    """Create the scratch dir according to `policy`. Raises ValueError for
+    `ram` when no writable tmpfs is available.
+    """
+    if policy.mode not in SCRATCH_MODES:
+        raise ValueError(f"unknown scratch mode {policy.mode!r} (known: {', '.join(SCRATCH_MODES)})")
+    mode, parent, headroom = "disk", policy.dir, None
+    if policy.mode == "ram":
+        ram = _ram_dir(policy)
+        if ram is None:
+            raise ValueError("--scratch-mode ram: no writable tmpfs found "
+                             "(tried --scratch-dir, /dev/shm, $XDG_RUNTIME_DIR)")
+        mode, parent = "ram", ram
+    elif policy.mode == "auto":
+        ram = _ram_dir(ScratchPolicy())  # --scratch-dir is the disk location in auto
+        if ram is not None and firmware is not None and firmware.is_file():
+            need = firmware.stat().st_size * EXPANSION_ESTIMATE
+            room = _ram_headroom(ram)
+            if need <= room:
+                mode, parent, headroom = "ram", ram, room
+            if verbose:
+                print(f"[shard] scratch auto: need ~{need >> 20} MiB, tmpfs headroom "
+                      f"{room >> 20} MiB at {ram} -> {mode}", file=sys.stderr)
+    if parent is not None:
+        parent.mkdir(parents=True, exist_ok=True)
+    root = Path(tempfile.mkdtemp(prefix="fw2shard_", dir=parent))
+    return ScratchPlacement(root=root, mode=mode, headroom=headroom)
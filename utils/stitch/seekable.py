@@ -0,0 +1,243 @@
+"""Random access into compressed shards via persisted checkpoints.
+
+`tarfile.open(path, "r:*")` on a .tar.gz can only move forward: every
+`extractfile` behind the current position rewinds the gzip stream and
+re-inflates from byte 0. The stdlib-engine shard writers therefore emit
+streams that can be entered part-way:
+
+  gzip   one ordinary gzip member, but the deflate stream is full-flushed
+         every CHECKPOINT_SPAN bytes of tar. A full flush byte-aligns the
+         output and drops the history window, so a raw inflater started at
+         a checkpoint's compressed offset needs no saved window (zran has to
+         snapshot 32 KiB per point because it can't choose where blocks end).
+  zstd   independent frames of ZSTD_FRAME_SIZE bytes of tar each, written
+         when the `zstandard` module is importable. Concatenated frames are
+         a valid .zst for every decoder.
+
+The checkpoint table (uncompressed offset -> compressed offset) is stored in
+the member index sidecar together with each member's data offset, so
+`SeekableReader.read(offset, size)` inflates at most one span of leading
+bytes before reaching a member. Uncompressed tarballs need no table.
+
+Shards compressed by an external program (pigz, the zstd CLI, the bsdtar /
+GNU tar engines) have no table; FragmentCache falls back to tarfile for them.
+"""
+from __future__ import annotations
+
+import bisect
+import struct
+import subprocess
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+CHECKPOINT_SPAN = 1 << 20
+ZSTD_FRAME_SIZE = 4 << 20
+
+_READ_CHUNK = 1 << 16
+# Decompressed zstd frames kept per reader; tool calls tend to hit nearby
+# members, and without `zstandard` each frame costs a zstd process.
+_FRAME_CACHE = 4
+
+
+def _zstandard():
+    try:
+        import zstandard  # type: ignore
+    except ImportError:
+        return None
+    return zstandard
+
+
+def can_write_zstd_frames() -> bool:
+    return _zstandard() is not None
+
+
+class CheckpointGzipWriter:
+    """Write-only file object producing a gzip stream with a full flush
+    every `span` input bytes. Wraps `raw`; does not close it.
+    """
+
+    def __init__(self, raw: BinaryIO, level: int = 6, span: int = CHECKPOINT_SPAN):
+        self._raw = raw
+        self._span = span
+        self._comp = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._crc = 0
+        self._usize = 0
+        self._since = 0
+        xfl = 2 if level == 9 else 4 if level == 1 else 0
+        # magic, CM=deflate, FLG=0, MTIME=0, XFL, OS=unix: what `gzip -n` emits.
+        header = b"\x1f\x8b\x08\x00\x00\x00\x00\x00" + bytes([xfl, 3])
+        raw.write(header)
+        self._csize = len(header)
+        self.checkpoints: list[tuple[int, int]] = [(0, self._csize)]
+
+    def _emit(self, data: bytes) -> None:
+        if data:
+            self._raw.write(data)
+            self._csize += len(data)
+
+    def write(self, data) -> int:
+        mv = memoryview(data)
+        n = len(mv)
+        while len(mv):
+            piece = mv[: self._span - self._since]
+            self._crc = zlib.crc32(piece, self._crc)
+            self._emit(self._comp.compress(piece))
+            self._usize += len(piece)
+            self._since += len(piece)
+            mv = mv[len(piece):]
+            if self._since >= self._span:
+                self._emit(self._comp.flush(zlib.Z_FULL_FLUSH))
+                self.checkpoints.append((self._usize, self._csize))
+                self._since = 0
+        return n
+
+    def tell(self) -> int:
+        return self._usize
+
+    def close(self) -> None:
+        self._emit(self._comp.flush())
+        self._emit(struct.pack("<II", self._crc, self._usize & 0xFFFFFFFF))
+
+    def seek_table(self) -> dict:
+        return {"codec": "gzip", "checkpoints": [list(c) for c in self.checkpoints]}
+
+
+def _zstd_compress(data: bytes, level: int) -> bytes:
+    zstandard = _zstandard()
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return subprocess.run(["zstd", f"-{level}", "-q", "-c"], input=data,
+                          stdout=subprocess.PIPE, check=True).stdout
+
+
+def _zstd_decompress(frame: bytes) -> bytes:
+    zstandard = _zstandard()
+    if zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(frame)
+    return subprocess.run(["zstd", "-dc", "-q"], input=frame,
+                          stdout=subprocess.PIPE, check=True).stdout
+
+
+class FramedZstdWriter:
+    """Write-only file object producing one zstd frame per `frame_size`
+    input bytes. Wraps `raw`; does not close it.
+    """
+
+    def __init__(self, raw: BinaryIO, level: int = 3, frame_size: int = ZSTD_FRAME_SIZE):
+        self._raw = raw
+        self._level = level
+        self._frame_size = frame_size
+        self._buf = bytearray()
+        self._ustart = 0  # uncompressed offset of the next frame
+        self._csize = 0
+        self.checkpoints: list[tuple[int, int]] = []
+
+    def _frame(self, chunk: bytes) -> None:
+        frame = _zstd_compress(chunk, self._level)
+        self.checkpoints.append((self._ustart, self._csize))
+        self._raw.write(frame)
+        self._ustart += len(chunk)
+        self._csize += len(frame)
+
+    def write(self, data) -> int:
+        self._buf += data
+        while len(self._buf) >= self._frame_size:
+            self._frame(bytes(self._buf[: self._frame_size]))
+            del self._buf[: self._frame_size]
+        return len(data)
+
+    def tell(self) -> int:
+        return self._ustart + len(self._buf)
+
+    def close(self) -> None:
+        if self._buf or not self.checkpoints:
+            self._frame(bytes(self._buf))
+            self._buf.clear()
+
+    def seek_table(self) -> dict:
+        return {"codec": "zstd", "checkpoints": [list(c) for c in self.checkpoints]}
+
+
+class SeekableReader:
+    """Reads byte ranges of the uncompressed tar stream of `path` using the
+    seek table from its member index.
+    """
+
+    def __init__(self, path: Path, table: dict):
+        self.codec = table["codec"]
+        self._checkpoints = [tuple(c) for c in table.get("checkpoints") or []]
+        self._starts = [u for u, _c in self._checkpoints]
+        self._f = open(path, "rb")
+        self._size = path.stat().st_size
+        self._frames: dict[int, bytes] = {}
+
+    def close(self) -> None:
+        self._f.close()
+
+    def read(self, offset: int, size: int) -> bytes:
+        if size <= 0:
+            return b""
+        if self.codec == "none":
+            self._f.seek(offset)
+            return self._f.read(size)
+        i = max(0, bisect.bisect_right(self._starts, offset) - 1)
+        if self.codec == "gzip":
+            return self._read_gzip(i, offset, size)
+        if self.codec == "zstd":
+            return self._read_zstd(i, offset, size)
+        raise ValueError(f"unknown seek table codec {self.codec!r}")
+
+    @staticmethod
+    def _take(data: bytes, pos: int, offset: int, want: int, out: bytearray) -> int:
+        end = pos + len(data)
+        if end > offset:
+            lo = max(0, offset - pos)
+            out += data[lo: lo + want - len(out)]
+        return end
+
+    def _read_gzip(self, i: int, offset: int, size: int) -> bytes:
+        pos, comp_off = self._checkpoints[i]
+        self._f.seek(comp_off)
+        d = zlib.decompressobj(-zlib.MAX_WBITS)
+        out = bytearray()
+        while len(out) < size and not d.eof:
+            chunk = self._f.read(_READ_CHUNK)
+            if not chunk:
+                break
+            while chunk and len(out) < size:
+                # Bound each step so a run of zeros can't balloon in memory.
+                data = d.decompress(chunk, 4 * _READ_CHUNK)
+                chunk = d.unconsumed_tail
+                pos = self._take(data, pos, offset, size, out)
+                if d.eof:
+                    break
+        return bytes(out)
+
+    def _frame(self, i: int) -> bytes:
+        data = self._frames.pop(i, None)
+        if data is None:
+            comp_off = self._checkpoints[i][1]
+            end = self._checkpoints[i + 1][1] if i + 1 < len(self._checkpoints) else self._size
+            self._f.seek(comp_off)
+            data = _zstd_decompress(self._f.read(end - comp_off))
+            if len(self._frames) >= _FRAME_CACHE:
+                del self._frames[next(iter(self._frames))]
+        self._frames[i] = data  # re-insert: most recently used last
+        return data
+
+    def _read_zstd(self, i: int, offset: int, size: int) -> bytes:
+        out = bytearray()
+        while len(out) < size and i < len(self._checkpoints):
+            self._take(self._frame(i), self._checkpoints[i][0], offset, size, out)
+            i += 1
+        return bytes(out)
+
+
+def open_reader(path: Path, table: Optional[dict]) -> Optional[SeekableReader]:
+    """A reader for `path`, or None when it has no usable seek table."""
+    if not table or table.get("codec") not in ("none", "gzip", "zstd"):
+        return None
+    if table["codec"] != "none" and not table.get("checkpoints"):
+        return None
+    return SeekableReader(path, table)
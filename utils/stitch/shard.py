@@ -21,18 +21,30 @@ already installed there.
 """
 from __future__ import annotations
 
+import dataclasses
+import hashlib
 import json
 import os
 import re
 import shutil
+import stat
 import subprocess
 import sys
-import tarfile
-import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from typing import Optional
 
+from .archive import ArchiveSpec, write_archive
+from .memberindex import index_path
+from .trigram import trigram_path
+from .cpio import transcode_cpio
+from .runcache import RunCache
+from .scratch import ScratchPlacement, ScratchPolicy, place_scratch
+from .supervise import ExtractLimits, ExtractOutcome, dir_usage, run_supervised
+from .timing import StageStats, StageTimer
+from .unblob_report import ChunkRecord, UnblobReport
+
 
 # Top-level dir names that, when present, scream "Linux rootfs."
 ROOT_DIRS = frozenset([
@@ -50,9 +62,10 @@ ROOTFS_FILES = (
 # Filesystem types whose default extractor in unblob/binwalk (7z) is known to
 # corrupt permissions, ownership, or setuid bits. For these, we locate the
 # original blob next to the *_extract dir and re-extract with the native tool.
-# Maps fs_type_guess -> reextractor name (key into REEXTRACTORS below).
-REEXTRACTOR_FOR_TYPE: dict[str, str] = {
-    "cpio": "cpio",
+# Maps fs_type_guess -> reextractor names (keys into REEXTRACTORS below),
+# tried in order until one succeeds.
+REEXTRACTOR_FOR_TYPE: dict[str, tuple[str, ...]] = {
+    "cpio": ("cpio-stream", "cpio"),
 }
 
 
@@ -91,15 +104,34 @@ class ShardInfo:
     matched_root_dirs: list[str] = field(default_factory=list)
     matched_rootfs_files: list[str] = field(default_factory=list)
     file_count: int = 0
+    total_bytes: int = 0      # sum of regular-file sizes in the extracted tree
     reextracted_with: Optional[str] = None  # native tool used to re-extract, if any
     source_blob: Optional[str] = None       # path of the original blob (relative)
-
-
-def _guess_fs_type(path: Path, extraction_root: Path) -> Optional[str]:
-    """Best-effort fs type guess from unblob's directory naming. Walk up the
-    ancestors until we hit a known `*_extract` suffix.
+    # From unblob's --report, when available.
+    chunk_handler: Optional[str] = None     # e.g. squashfs_v4_le, cpio_portable_ascii
+    chunk_offset: Optional[int] = None      # start offset within the containing file
+    chunk_size: Optional[int] = None
+    # Byte-identical copies (A/B banks) are tarred once; the others are
+    # listed here by root_path. tree_hash is set whenever aliases are.
+    aliases: list[str] = field(default_factory=list)
+    tree_hash: Optional[str] = None
+
+
+def _guess_fs_type(
+    path: Path,
+    extraction_root: Path,
+    report: Optional[UnblobReport] = None,
+) -> Optional[str]:
+    """Best-effort fs type guess. With an unblob report, the handler of the
+    nearest reported `*_extract` ancestor wins. Otherwise fall back to
+    unblob's directory naming: walk up the ancestors until we hit a known
+    `*_extract` suffix.
     """
     rel = path.relative_to(extraction_root)
+    if report is not None:
+        hit = report.nearest(rel.parts)
+        if hit is not None:
+            return hit[1].fs_type
     for part in reversed(rel.parts):
         for suffix, ty in EXTRACT_SUFFIX_TYPES:
             if part.endswith(suffix):
@@ -107,71 +139,152 @@ def _guess_fs_type(path: Path, extraction_root: Path) -> Optional[str]:
     return None
 
 
-def _count_files(path: Path, cap: int = 5000) -> int:
-    """Cheap file count, capped to avoid pathological cost."""
-    n = 0
-    for _, _, filenames in os.walk(path):
-        n += len(filenames)
-        if n >= cap:
-            return n
-    return n
+@dataclass
+class DirNode:
+    """One directory of a `TreeIndex`. `dirs`/`files` mirror what `os.walk`
+    would report for the directory (symlinks to directories count as dirs);
+    the aggregates cover the whole subtree below it.
+    """
+    rel: tuple[str, ...]                       # path parts relative to the index root
+    dirs: list[str] = field(default_factory=list)
+    files: list[str] = field(default_factory=list)
+    children: dict[str, "DirNode"] = field(default_factory=dict)  # real (non-symlink) subdirs
+    entries: set[str] = field(default_factory=set)  # every child name, for O(1) lookups
+    file_count: int = 0        # non-directory entries anywhere beneath
+    dir_count: int = 0         # real directories anywhere beneath
+    total_bytes: int = 0       # sum of regular-file sizes beneath
+    extract_below: bool = False  # some `*_extract` directory strictly beneath
+
+    @property
+    def name(self) -> str:
+        return self.rel[-1] if self.rel else ""
+
+    def has_entry(self, name: str) -> bool:
+        return name in self.entries
+
+
+class TreeIndex:
+    """In-memory directory index of an extraction tree, built in a single
+    scandir pass. Aggregates are filled bottom-up so selection and scoring
+    never touch the disk again. Symlinks are recorded but not followed.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.nodes: dict[tuple[str, ...], DirNode] = {}
+        self._scan()
+
+    def _scan(self) -> None:
+        top = DirNode(rel=())
+        self.nodes[()] = top
+        order: list[DirNode] = []
+        stack = [top]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            try:
+                it = os.scandir(self.root.joinpath(*node.rel))
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    node.entries.add(entry.name)
+                    try:
+                        is_link = entry.is_symlink()
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_link, is_dir = False, False
+                    if is_dir:
+                        node.dirs.append(entry.name)
+                        if not is_link:
+                            child = DirNode(rel=node.rel + (entry.name,))
+                            node.children[entry.name] = child
+                            self.nodes[child.rel] = child
+                            stack.append(child)
+                        continue
+                    node.files.append(entry.name)
+                    if not is_link:
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        if stat.S_ISREG(st.st_mode):
+                            node.total_bytes += st.st_size
+            node.dirs.sort()
+            node.files.sort()
+        # `order` is parents-before-children, so walking it backwards
+        # finalises every child before its parent reads the aggregates.
+        for node in reversed(order):
+            node.file_count += len(node.files)
+            for child in node.children.values():
+                node.file_count += child.file_count
+                node.dir_count += 1 + child.dir_count
+                node.total_bytes += child.total_bytes
+                if child.extract_below or child.name.endswith("_extract"):
+                    node.extract_below = True
+
+    def node(self, path: Path) -> Optional[DirNode]:
+        try:
+            rel = path.relative_to(self.root)
+        except ValueError:
+            return None
+        return self.nodes.get(rel.parts)
+
+    def path(self, node: DirNode) -> Path:
+        return self.root.joinpath(*node.rel)
+
+    def lexists(self, node: DirNode, subpath: str) -> bool:
+        """True if `subpath` (relative, '/'-separated) exists under `node`
+        without following symlinks — host-independent, unlike Path.exists()
+        on firmware symlinks such as `sbin/init -> /bin/busybox`.
+        """
+        *parents, leaf = subpath.split("/")
+        cur = node
+        for part in parents:
+            nxt = cur.children.get(part)
+            if nxt is None:
+                return False
+            cur = nxt
+        return cur.has_entry(leaf)
 
 
-def score_directory(path: Path, top_children: list[str], extraction_root: Path | None = None) -> tuple[int, dict]:
+_INTERESTING_SUBPATHS = ("etc/init.d", "usr/local", "usr/bin", "lib/modules", "etc/config")
+
+
+def score_directory(index: TreeIndex, node: DirNode) -> tuple[int, dict]:
     """Score how filesystem-like a directory is. Score is informational — used
     for ranking and to help the LLM tell base from overlay. Selection is
     primarily driven by unblob's `*_extract` naming (see find_shards).
     """
-    top_set = set(top_children)
-    matched_root_dirs = sorted(top_set & ROOT_DIRS)
+    matched_root_dirs = sorted(set(node.dirs) & ROOT_DIRS)
     score = 5 * len(matched_root_dirs)
 
     matched_files: list[str] = []
     for f in ROOTFS_FILES:
-        if (path / f).exists():
+        if index.lexists(node, f):
             score += 3
             matched_files.append(f)
 
-    interesting_subpaths = ("etc/init.d", "usr/local", "usr/bin", "lib/modules", "etc/config")
-    for sp in interesting_subpaths:
-        if (path / sp).exists():
+    for sp in _INTERESTING_SUBPATHS:
+        if index.lexists(node, sp):
             score += 2
 
-    if extraction_root is not None:
-        try:
-            rel = path.relative_to(extraction_root)
-            for part in rel.parts:
-                for suffix, _ty in EXTRACT_SUFFIX_TYPES:
-                    if part.endswith(suffix):
-                        score += 5
-                        break
-        except ValueError:
-            pass
-
-    file_count = _count_files(path) if score > 0 or top_children else 0
+    for part in node.rel:
+        for suffix, _ty in EXTRACT_SUFFIX_TYPES:
+            if part.endswith(suffix):
+                score += 5
+                break
 
     return score, {
         "matched_root_dirs": matched_root_dirs,
         "matched_files": matched_files,
-        "file_count": file_count,
+        "file_count": node.file_count,
+        "total_bytes": node.total_bytes,
     }
 
 
-def _is_descendant(child: Path, parent: Path) -> bool:
-    try:
-        child.relative_to(parent)
-        return child != parent
-    except ValueError:
-        return False
-
-
-def _has_extract_descendant(d: Path) -> bool:
-    """True if any directory inside `d` is itself a `*_extract` dir."""
-    for _dirpath, dirnames, _ in os.walk(d):
-        for sub in dirnames:
-            if sub.endswith("_extract"):
-                return True
-    return False
+def _is_rel_descendant(child: tuple[str, ...], parent: tuple[str, ...]) -> bool:
+    return len(child) > len(parent) and child[:len(parent)] == parent
 
 
 # Of the fs types in EXTRACT_SUFFIX_TYPES, these are real on-disk filesystems
@@ -199,30 +312,86 @@ def _has_known_fs_type_suffix(name: str) -> bool:
     return False
 
 
-def _find_fs_root(extract_dir: Path) -> Path:
+def _is_fs_boundary(node: DirNode, report: Optional[UnblobReport]) -> bool:
+    """Is this `*_extract` dir a whole filesystem? The report's handler
+    decides when it covers the dir; otherwise the name suffix does.
+    """
+    if report is not None:
+        rec = report.extract_dir_record(node.rel)
+        if rec is not None:
+            return rec.fs_type in _TERMINAL_FS_TYPES
+    return _has_known_fs_type_suffix(node.name)
+
+
+def _find_fs_root(extract_dir: DirNode) -> DirNode:
     """Descend through single-subdirectory wrappers (e.g. `squashfs-root`) to
     reach the actual filesystem root. Stops if the wrapper itself looks like a
     sub-extract or if there's branching.
     """
     current = extract_dir
-    for _ in range(8):  # hard cap to avoid pathological symlink loops
-        try:
-            children = list(current.iterdir())
-        except OSError:
-            return current
-        dir_children = [c for c in children if c.is_dir()]
+    for _ in range(8):  # hard cap on wrapper depth
         if (
-            len(children) == 1
-            and len(dir_children) == 1
-            and not dir_children[0].name.endswith("_extract")
+            not current.files
+            and len(current.dirs) == 1
+            and len(current.children) == 1
+            and not current.dirs[0].endswith("_extract")
         ):
-            current = dir_children[0]
+            current = current.children[current.dirs[0]]
             continue
         return current
     return current
 
 
-def find_shards(extracted: Path, min_score: int = 3, max_depth: int = 14) -> list[tuple[Path, int, dict]]:
+def _select_extract_dirs(
+    index: TreeIndex,
+    max_depth: int = 14,
+    known_fs_only: bool = False,
+    report: Optional[UnblobReport] = None,
+) -> dict[tuple[str, ...], DirNode]:
+    """Pass 1 of find_shards: *_extract directories that look like a complete
+    filesystem, keyed by the rel path of their (wrapper-descended) fs root.
+
+    A directory qualifies if EITHER:
+      (a) unblob's report says it holds a filesystem chunk, or (without a
+          report entry) its name carries a known on-disk-fs suffix
+          (ubifs_extract, squashfs_v4_le_extract, jffs2_extract, cpio_extract,
+          ramdisk_el_extract, ...) — in that case it IS the filesystem even
+          if unblob also recursed into a sub-blob inside it, OR
+      (b) it's a terminal *_extract (no further *_extract anywhere below) —
+          used for generic blob chains where unblob couldn't name the fs type.
+
+    `known_fs_only` drops rule (b), whose answer can still change while an
+    extraction is running.
+    """
+    found: dict[tuple[str, ...], DirNode] = {}
+    stack = [index.nodes[()]]
+    while stack:
+        d = stack.pop()
+        if len(d.rel) > max_depth:
+            continue
+        if d.rel and d.name.endswith("_extract"):
+            qualifies = _is_fs_boundary(d, report) or (
+                not known_fs_only and not d.extract_below
+            )
+            if qualifies and d.dirs:
+                root = _find_fs_root(d)
+                found[root.rel] = root
+                # Don't recurse into this candidate — its insides aren't
+                # separate shards.
+                continue
+        stack.extend(d.children.values())
+    return found
+
+
+def find_shards(
+    extracted: Path,
+    min_score: int = 3,
+    max_depth: int = 14,
+    index: Optional[TreeIndex] = None,
+    report: Optional[UnblobReport] = None,
+    dedupe: bool = True,
+    verbose: bool = False,
+) -> list[tuple[Path, int, dict]]:
     """Pick filesystem-fragment leaves from an extraction tree.
 
     Selection rules (union):
@@ -237,86 +406,234 @@ def find_shards(extracted: Path, min_score: int = 3, max_depth: int = 14) -> lis
     Then return only the leaves of the candidate forest — most-specific wins.
     For each terminal extract, descend through single-child wrappers (e.g.
     `squashfs-root`) to find the real filesystem root.
+
+    Both passes answer from a single `TreeIndex` scan of `extracted`; pass one
+    in via `index` to reuse a scan the caller already has. An unblob `report`
+    replaces suffix guessing for the dirs it covers. With `dedupe`, identical
+    leaves collapse into one result (see `dedupe_shards`).
     """
-    # Pass 1: *_extract directories that look like a complete filesystem.
-    # A directory qualifies if EITHER:
-    #   (a) its name carries a known on-disk-fs suffix (ubifs_extract,
-    #       squashfs_v4_le_extract, jffs2_extract, cpio_extract, ramdisk_el_extract,
-    #       ...) — in that case it IS the filesystem even if unblob also
-    #       recursed into a sub-blob inside it, OR
-    #   (b) it's a terminal *_extract (no further *_extract anywhere below) —
-    #       used for generic blob chains where unblob couldn't name the fs type.
-    extract_candidates: set[Path] = set()
-    for dirpath, dirnames, _filenames in os.walk(extracted):
-        d = Path(dirpath)
-        if d == extracted:
-            continue
-        if len(d.relative_to(extracted).parts) > max_depth:
-            dirnames[:] = []
-            continue
-        if d.name.endswith("_extract"):
-            qualifies = (
-                _has_known_fs_type_suffix(d.name)
-                or not _has_extract_descendant(d)
-            )
-            if qualifies and any(c.is_dir() for c in d.iterdir()):
-                extract_candidates.add(_find_fs_root(d))
-                # Don't recurse into this candidate — its insides aren't
-                # separate shards.
-                dirnames[:] = []
+    if index is None:
+        index = TreeIndex(extracted)
+
+    extract_candidates = _select_extract_dirs(index, max_depth, report=report)
 
     # Pass 2: score-based fallback for trees that don't use unblob's naming
     # (binwalk output, pre-extracted directories, etc.). Gate: skip anything
     # at or below an already-identified extract shard.
-    score_candidates: set[Path] = set()
-    for dirpath, dirnames, _filenames in os.walk(extracted):
-        d = Path(dirpath)
-        if d == extracted:
+    score_candidates: dict[tuple[str, ...], DirNode] = {}
+    stack = [index.nodes[()]]
+    while stack:
+        d = stack.pop()
+        if len(d.rel) > max_depth or d.rel in extract_candidates:
             continue
-        if len(d.relative_to(extracted).parts) > max_depth:
-            dirnames[:] = []
+        stack.extend(d.children.values())
+        if not d.rel:
             continue
-        if any(d == ec or _is_descendant(d, ec) for ec in extract_candidates):
-            continue
-        score, _ev = score_directory(d, dirnames, extraction_root=extracted)
+        score, _ev = score_directory(index, d)
         if score >= min_score:
-            score_candidates.add(d)
+            score_candidates[d.rel] = d
 
     # Score every candidate, then keep the highest-scoring path in each
     # ancestor chain. Extract candidates get an unbeatable boost so they always
     # win against score-based candidates inside the same chain (though the
     # gate above already prevents most overlaps).
     EXTRACT_BOOST = 10_000
-    scored: list[tuple[Path, int, dict, bool]] = []
-    for p in extract_candidates | score_candidates:
-        children = [c.name for c in p.iterdir() if c.is_dir()]
-        s, ev = score_directory(p, children, extraction_root=extracted)
-        is_extract = p in extract_candidates
+    scored: list[tuple[DirNode, int, dict, bool]] = []
+    for rel, node in {**score_candidates, **extract_candidates}.items():
+        s, ev = score_directory(index, node)
+        is_extract = rel in extract_candidates
         rank = s + (EXTRACT_BOOST if is_extract else 0)
-        scored.append((p, rank, ev, is_extract))
+        scored.append((node, rank, ev, is_extract))
 
     # Highest rank wins; tie-break by deeper path so descendants edge out parents.
-    scored.sort(key=lambda c: (-c[1], -len(c[0].parts)))
-    kept: list[tuple[Path, int, dict, bool]] = []
-    for p, rank, ev, is_extract in scored:
-        if any(_is_descendant(p, k[0]) or _is_descendant(k[0], p) for k in kept):
+    scored.sort(key=lambda c: (-c[1], -len(c[0].rel), c[0].rel))
+    kept: list[tuple[DirNode, int, dict, bool]] = []
+    for node, rank, ev, is_extract in scored:
+        if any(_is_rel_descendant(node.rel, k[0].rel) or _is_rel_descendant(k[0].rel, node.rel)
+               for k in kept):
             continue
-        kept.append((p, rank, ev, is_extract))
+        kept.append((node, rank, ev, is_extract))
 
     results: list[tuple[Path, int, dict]] = []
-    for p, rank, ev, is_extract in kept:
+    for node, rank, ev, is_extract in kept:
         score = rank - (EXTRACT_BOOST if is_extract else 0)
-        results.append((p, score, ev))
+        results.append((index.path(node), score, ev))
     results.sort(key=lambda c: (-c[1], str(c[0])))
+    if dedupe:
+        results = dedupe_shards(results, index, verbose=verbose)
     return results
 
 
+# --------------- Dedupe (identical shards) ---------------
+
+def _subtree_signature(node: DirNode) -> tuple[int, int, int]:
+    return (node.file_count, node.dir_count, node.total_bytes)
+
+
+def tree_hash(path: Path) -> str:
+    """Merkle-style SHA-256 of the tree under `path`. Each directory hashes
+    its entries in name order: name, mode, uid, gid, size, plus the content
+    digest (files), link target (symlinks), rdev (devices), or the child's
+    own tree hash (dirs). mtimes and the root's own attributes are left out,
+    so two banks written at different times still match.
+    """
+    return _tree_digest(path).hex()
+
+
+def _tree_digest(path: Path) -> bytes:
+    h = hashlib.sha256()
+    try:
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return h.digest()
+    for e in entries:
+        try:
+            st = e.stat(follow_symlinks=False)
+            if stat.S_ISDIR(st.st_mode):
+                payload = _tree_digest(Path(e.path))
+            elif stat.S_ISLNK(st.st_mode):
+                payload = os.fsencode(os.readlink(e.path))
+            elif stat.S_ISREG(st.st_mode):
+                payload = _file_digest(Path(e.path))
+            else:
+                payload = str(st.st_rdev).encode()
+        except OSError:
+            payload = b"?"
+            st = None
+        name = os.fsencode(e.name)
+        meta = (f"{st.st_mode:o}:{st.st_uid}:{st.st_gid}:{st.st_size}" if st else "?").encode()
+        h.update(b"%d:%s\0%s\0%d:%s" % (len(name), name, meta, len(payload), payload))
+    return h.digest()
+
+
+def _file_digest(path: Path) -> bytes:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+def dedupe_shards(
+    results: list[tuple[Path, int, dict]],
+    index: TreeIndex,
+    verbose: bool = False,
+) -> list[tuple[Path, int, dict]]:
+    """Collapse byte-identical shards (A/B banks, duplicated rootfs images).
+
+    Only candidates whose cheap subtree signature (file count, dir count,
+    byte total) collides with another candidate get a full `tree_hash`, so
+    firmware without duplicates pays nothing beyond the index scan. Within a
+    set of identical trees the first one in `results` order (best score) is
+    kept. Its `ev` gets `tree_hash` and `aliases` (root paths of the copies
+    that won't be tarred), and the copies are dropped.
+    """
+    by_sig: dict[tuple[int, int, int], list[int]] = {}
+    for i, (path, _score, _ev) in enumerate(results):
+        node = index.node(path)
+        if node is not None and node.file_count:
+            by_sig.setdefault(_subtree_signature(node), []).append(i)
+
+    dropped: set[int] = set()
+    for members in by_sig.values():
+        if len(members) < 2:
+            continue
+        by_hash: dict[str, list[int]] = {}
+        for i in members:
+            by_hash.setdefault(tree_hash(results[i][0]), []).append(i)
+        for digest, same in by_hash.items():
+            if len(same) < 2:
+                continue
+            keep, *copies = same
+            ev = results[keep][2]
+            ev["tree_hash"] = digest
+            ev["aliases"] = ["/".join(index.node(results[c][0]).rel) for c in copies]
+            dropped.update(copies)
+            if verbose:
+                print(f"[shard] {len(same)} identical copies of "
+                      f"{'/'.join(index.node(results[keep][0]).rel)}; tarring it once",
+                      file=sys.stderr)
+    return [r for i, r in enumerate(results) if i not in dropped]
+
+
 def _slugify(rel: Path) -> str:
     s = "__".join(rel.parts)
     s = re.sub(r"[^a-zA-Z0-9._-]+", "_", s).strip("_")
     return s[:80] or "shard"
 
 
+def _tar_one_shard(
+    i: int,
+    path: Path,
+    score: int,
+    ev: dict,
+    extracted: Path,
+    out_dir: Path,
+    firmware_stem: str,
+    scratch_root: Optional[Path],
+    reextract: bool,
+    verbose: bool,
+    archive: ArchiveSpec,
+    report: Optional[UnblobReport] = None,
+    profile_dir: Optional[Path] = None,
+) -> tuple[ShardInfo, dict[str, StageStats]]:
+    """Re-extract (if applicable) and tar a single shard. Module-level so it
+    can run in a worker process; everything it needs travels as arguments.
+    Returns the shard's info and its reextract/tar stage stats.
+    """
+    timer = StageTimer(profile_dir, tag=f"{i:02d}")
+    rel = path.relative_to(extracted)
+    slug = _slugify(rel)
+    fs_type = _guess_fs_type(path, extracted, report)
+    chunk = report.nearest(rel.parts) if report is not None else None
+
+    tar_name = f"{firmware_stem}.shard.{i:02d}.{slug}{archive.suffix}"
+    tar_source = path
+    reextractor_used: Optional[str] = None
+    blob_used: Optional[Path] = None
+    if reextract and scratch_root is not None:
+        with timer.stage("reextract") as st:
+            tar_source, reextractor_used, blob_used = reextract_shard(
+                path, fs_type, extracted, scratch_root, verbose=verbose, report=report,
+                dest=out_dir / tar_name, archive=archive,
+            )
+            st.files = ev.get("file_count", 0) if reextractor_used else 0
+
+    # Archive re-extractors have already written the shard.
+    if reextractor_used not in ARCHIVE_REEXTRACTORS:
+        with timer.stage("tar") as st:
+            write_archive(tar_source, out_dir / tar_name, archive)
+            st.files = ev.get("file_count", 0)
+    timer.dump_profiles()
+    info = ShardInfo(
+        name=tar_name, score=score, root_path=str(rel),
+        fs_type_guess=fs_type,
+        matched_root_dirs=ev.get("matched_root_dirs", []),
+        matched_rootfs_files=ev.get("matched_files", []),
+        file_count=ev.get("file_count", 0),
+        total_bytes=ev.get("total_bytes", 0),
+        reextracted_with=reextractor_used,
+        source_blob=(_rel_or_name(blob_used, extracted) if blob_used else None),
+        chunk_handler=chunk[1].handler if chunk else None,
+        chunk_offset=chunk[1].start_offset if chunk else None,
+        chunk_size=chunk[1].size if chunk else None,
+        aliases=list(ev.get("aliases", [])),
+        tree_hash=ev.get("tree_hash"),
+    )
+    return info, timer.stages
+
+
+def _rel_or_name(path: Path, root: Path) -> str:
+    """`path` relative to `root`, or just its name if it lives outside (the
+    input firmware itself, when a whole-blob chunk is re-extracted).
+    """
+    try:
+        return str(path.resolve().relative_to(root.resolve()))
+    except ValueError:
+        return path.name
+
+
 def tar_shards(
     shards: list[tuple[Path, int, dict]],
     extracted: Path,
@@ -325,54 +642,85 @@ def tar_shards(
     scratch_root: Optional[Path] = None,
     reextract: bool = True,
     verbose: bool = False,
+    jobs: int = 1,
+    archive: ArchiveSpec = ArchiveSpec(),
+    report: Optional[UnblobReport] = None,
+    timer: Optional[StageTimer] = None,
 ) -> list[ShardInfo]:
     """Tar each shard. When `reextract` is True and a shard's fs type has a
     native perm-preserving extractor available, the shard is re-extracted from
     its original blob before tarring (avoids 7z's permission corruption for
     cpio and similar). The re-extraction happens under `scratch_root`; if
     omitted, no re-extraction is attempted.
+
+    With `jobs` > 1, shards are re-extracted and tarred concurrently in a
+    process pool of that size (0 means one worker per CPU). Shard indices and
+    tarball names are assigned up front, and the result keeps input order, so
+    the manifest is identical to a serial run.
+
+    `archive` picks the tar engine and codec (see archive.py); its codec
+    decides the tarball suffix. `report` (unblob --report) supplies typing,
+    chunk offsets and re-extraction blobs where it covers a shard.
+
+    Per-shard reextract/tar stats are merged into `timer` if one is given;
+    its profile_dir, if set, is passed on to the workers.
     """
     out_dir.mkdir(parents=True, exist_ok=True)
-    infos: list[ShardInfo] = []
-    for i, (path, score, ev) in enumerate(shards):
-        rel = path.relative_to(extracted)
-        slug = _slugify(rel)
-        fs_type = _guess_fs_type(path, extracted)
-
-        tar_source = path
-        reextractor_used: Optional[str] = None
-        blob_used: Optional[Path] = None
-        if reextract and scratch_root is not None:
-            tar_source, reextractor_used, blob_used = reextract_shard(
-                path, fs_type, extracted, scratch_root, verbose=verbose,
-            )
-
-        tar_name = f"{firmware_stem}.shard.{i:02d}.{slug}.tar.gz"
-        tar_path = out_dir / tar_name
-        with tarfile.open(tar_path, "w:gz") as t:
-            t.add(tar_source, arcname=".", recursive=True)
-        infos.append(ShardInfo(
-            name=tar_name, score=score, root_path=str(rel),
-            fs_type_guess=fs_type,
-            matched_root_dirs=ev.get("matched_root_dirs", []),
-            matched_rootfs_files=ev.get("matched_files", []),
-            file_count=ev.get("file_count", 0),
-            reextracted_with=reextractor_used,
-            source_blob=(str(blob_used.relative_to(extracted)) if blob_used else None),
-        ))
-    return infos
-
-
-def write_manifest(infos: list[ShardInfo], out_dir: Path, firmware: Optional[Path], extractor: str) -> Path:
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    profile_dir = timer.profile_dir if timer is not None else None
+    common = (extracted, out_dir, firmware_stem, scratch_root, reextract, verbose, archive,
+              report, profile_dir)
+    if jobs == 1 or len(shards) <= 1:
+        results = [
+            _tar_one_shard(i, path, score, ev, *common)
+            for i, (path, score, ev) in enumerate(shards)
+        ]
+    else:
+        # Workers are forked, so they inherit fakeroot's LD_PRELOAD/FAKEROOTKEY
+        # and record ownership against the same faked daemon as the parent.
+        with ProcessPoolExecutor(max_workers=min(jobs, len(shards))) as pool:
+            futures = [
+                pool.submit(_tar_one_shard, i, path, score, ev, *common)
+                for i, (path, score, ev) in enumerate(shards)
+            ]
+            results = [f.result() for f in futures]
+    if timer is not None:
+        for _info, stages in results:
+            timer.merge(stages)
+    return [info for info, _stages in results]
+
+
+def write_manifest(
+    infos: list[ShardInfo],
+    out_dir: Path,
+    firmware: Optional[Path],
+    extractor: str,
+    complete: bool = True,
+    extraction: Optional[dict] = None,
+    timings: Optional[dict] = None,
+) -> Path:
+    """Write shards.json. `complete` is False only for the partial manifests a
+    streaming run publishes while the extractor is still going. `extraction`
+    is the supervised run's outcome (stop_reason, peaks, limits); None for
+    pre-extracted trees. `timings` is the run's per-stage accounting
+    (StageTimer.to_json()).
+    """
     manifest_path = out_dir / "shards.json"
     payload = {
         "firmware": firmware.name if firmware is not None else None,
         "firmware_stem": firmware.stem if firmware is not None else None,
         "extractor": extractor,
+        "complete": complete,
+        "extraction": extraction,
+        "timings": timings,
         "shards": [asdict(i) for i in infos],
     }
-    with open(manifest_path, "w") as f:
+    # Write-then-rename: the old manifest may be hard-linked into a run cache.
+    tmp_path = manifest_path.with_name(manifest_path.name + ".part")
+    with open(tmp_path, "w") as f:
         json.dump(payload, f, indent=2)
+    os.replace(tmp_path, manifest_path)
     return manifest_path
 
 
@@ -477,10 +825,14 @@ def reextract_cpio(blob_path: Path, out_dir: Path, verbose: bool = False) -> boo
 
 
 # Registry: maps reextractor key -> function (blob, out_dir, verbose) -> bool.
+# Keys in ARCHIVE_REEXTRACTORS instead take (blob, dest, archive, verbose) and
+# write the shard archive themselves, with no scratch tree.
 # Add entries here as new perm-preserving native extractors are needed.
 REEXTRACTORS: dict[str, callable] = {
+    "cpio-stream": transcode_cpio,
     "cpio": reextract_cpio,
 }
+ARCHIVE_REEXTRACTORS = frozenset({"cpio-stream"})
 
 
 def _find_extract_ancestor(path: Path, extraction_root: Path) -> Optional[Path]:
@@ -516,38 +868,95 @@ def reextract_shard(
     extraction_root: Path,
     scratch_root: Path,
     verbose: bool = False,
+    report: Optional[UnblobReport] = None,
+    dest: Optional[Path] = None,
+    archive: Optional[ArchiveSpec] = None,
 ) -> tuple[Path, Optional[str], Optional[Path]]:
     """If this shard's type has a known native re-extractor and we can locate
     the original blob, re-extract into a new directory under scratch_root and
     return that path. Otherwise return the original path.
 
+    Given `dest` and `archive`, re-extractors in ARCHIVE_REEXTRACTORS are
+    tried too. They write the shard archive at `dest` straight from the
+    blob, and `dest` is returned. Candidates run in REEXTRACTOR_FOR_TYPE
+    order until one succeeds.
+
+    With an unblob report the blob comes from the chunk record. That is the
+    containing file for whole-file chunks, or else the carved chunk. unblob
+    usually deletes carved chunks, so in that case [start, end) is sliced out
+    of the containing file into scratch. Without a report, the sibling of the
+    nearest `*_extract` ancestor is used.
+
     Returns (effective_path, reextractor_name_or_None, source_blob_or_None).
     """
-    if fs_type is None or fs_type not in REEXTRACTOR_FOR_TYPE:
-        return shard_path, None, None
-    extractor_name = REEXTRACTOR_FOR_TYPE[fs_type]
-    fn = REEXTRACTORS.get(extractor_name)
-    if fn is None:
+    names = [
+        n for n in REEXTRACTOR_FOR_TYPE.get(fs_type or "", ())
+        if n in REEXTRACTORS and (dest is not None or n not in ARCHIVE_REEXTRACTORS)
+    ]
+    if not names:
         return shard_path, None, None
-    extract_dir = _find_extract_ancestor(shard_path, extraction_root)
-    if extract_dir is None:
-        return shard_path, None, None
-    blob = _find_original_blob(extract_dir)
+    # Place the re-extraction under scratch_root so it gets cleaned up.
+    safe_slug = re.sub(r"[^a-zA-Z0-9._-]+", "_", str(shard_path.relative_to(extraction_root)))[:120]
+
+    # `provenance` is what the manifest records as source_blob: the firmware
+    # file rather than a scratch slice of it.
+    hit = report.nearest(shard_path.relative_to(extraction_root).parts) if report else None
+    if hit is not None:
+        extract_rel, rec = hit
+        sliced = scratch_root / "reextract" / f"{safe_slug}.chunk"
+        blob = _blob_for_chunk(extraction_root.joinpath(*extract_rel), rec, sliced)
+        provenance = rec.source_file if blob == sliced else blob
+    else:
+        extract_dir = _find_extract_ancestor(shard_path, extraction_root)
+        blob = _find_original_blob(extract_dir) if extract_dir is not None else None
+        provenance = blob
     if blob is None:
         return shard_path, None, None
 
-    # Place the re-extraction under scratch_root so it gets cleaned up.
-    safe_slug = re.sub(r"[^a-zA-Z0-9._-]+", "_", str(shard_path.relative_to(extraction_root)))[:120]
-    out = scratch_root / "reextract" / f"{extractor_name}_{safe_slug}"
-    if verbose:
-        print(f"[reextract] {extractor_name}: {blob.name} -> {out}", file=sys.stderr)
-    ok = fn(blob, out, verbose=verbose)
-    if not ok:
+    for extractor_name in names:
+        fn = REEXTRACTORS[extractor_name]
+        if extractor_name in ARCHIVE_REEXTRACTORS:
+            out = dest
+            if verbose:
+                print(f"[reextract] {extractor_name}: {blob.name} -> {dest.name}", file=sys.stderr)
+            ok = fn(blob, dest, archive, verbose=verbose)
+        else:
+            out = scratch_root / "reextract" / f"{extractor_name}_{safe_slug}"
+            if verbose:
+                print(f"[reextract] {extractor_name}: {blob.name} -> {out}", file=sys.stderr)
+            ok = fn(blob, out, verbose=verbose)
+        if ok:
+            return out, extractor_name, provenance
         if verbose:
-            print(f"[reextract] {extractor_name} failed; keeping 7z extraction at {shard_path}",
-                  file=sys.stderr)
-        return shard_path, None, None
-    return out, extractor_name, blob
+            print(f"[reextract] {extractor_name} failed", file=sys.stderr)
+    if verbose:
+        print(f"[reextract] keeping 7z extraction at {shard_path}", file=sys.stderr)
+    return shard_path, None, None
+
+
+def _blob_for_chunk(extract_dir: Path, rec: ChunkRecord, scratch_chunk: Path) -> Optional[Path]:
+    """Locate (or carve) the bytes of a reported chunk for re-extraction."""
+    if rec.whole_file:
+        return rec.source_file if rec.source_file.is_file() else None
+    carved = extract_dir.with_name(extract_dir.name[: -len("_extract")])
+    if carved.is_file():
+        return carved
+    if not rec.source_file.is_file():
+        return None
+    scratch_chunk.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(rec.source_file, "rb") as src, open(scratch_chunk, "wb") as dst:
+            src.seek(rec.start_offset)
+            remaining = rec.size
+            while remaining > 0:
+                buf = src.read(min(remaining, 1 << 20))
+                if not buf:
+                    break
+                dst.write(buf)
+                remaining -= len(buf)
+    except OSError:
+        return None
+    return scratch_chunk
 
 
 # --------------- Extractor invocation ---------------
@@ -560,8 +969,7 @@ def _which(cmd: str) -> Optional[str]:
     return shutil.which(cmd)
 
 
-def run_unblob(firmware: Path, scratch: Path, verbose: bool = False) -> Path:
-    """Run unblob into scratch/unblob, return that directory."""
+def _unblob_cmd(firmware: Path, scratch: Path) -> tuple[list[str], Path]:
     if not _which("unblob"):
         raise ExtractorMissing(
             "unblob not found on PATH. Install it locally or run this inside "
@@ -573,20 +981,62 @@ def run_unblob(firmware: Path, scratch: Path, verbose: bool = False) -> Path:
     # root and not writable for non-root users in the container. Pin it inside
     # the scratch dir instead.
     log_path = scratch / "unblob.log"
-    cmd = ["unblob", "--extract-dir", str(out), "--log", str(log_path), str(firmware)]
+    return ["unblob", "--extract-dir", str(out), "--log", str(log_path),
+            "--report", str(_unblob_report_path(scratch)), str(firmware)], out
+
+
+def _unblob_report_path(scratch: Path) -> Path:
+    """Where `_unblob_cmd` asks unblob to write its structured --report."""
+    return scratch / "unblob.report.json"
+
+
+def load_unblob_report(scratch: Path, extraction_root: Path, verbose: bool = False) -> Optional[UnblobReport]:
+    """Load the report of an unblob run in `scratch`, or None (the suffix
+    heuristic then covers everything).
+    """
+    report = UnblobReport.load(_unblob_report_path(scratch), extraction_root)
+    if verbose:
+        if report is None:
+            print("[shard] no usable unblob report; typing shards by dir suffix", file=sys.stderr)
+        else:
+            print(f"[shard] unblob report covers {len(report.by_extract_dir)} extract dir(s)",
+                  file=sys.stderr)
+    return report
+
+
+def _check_outcome(outcome: ExtractOutcome, cmd: list[str], out: Path) -> None:
+    """A non-zero exit is harvested like a timeout if anything was extracted;
+    with nothing to show for it, it's a hard failure as before.
+    """
+    if outcome.stop_reason == "exit_status" and not any(out.iterdir()):
+        raise subprocess.CalledProcessError(outcome.returncode, cmd)
+
+
+def run_unblob(
+    firmware: Path,
+    scratch: Path,
+    verbose: bool = False,
+    limits: ExtractLimits = ExtractLimits(),
+) -> tuple[Path, ExtractOutcome]:
+    """Run unblob into scratch/unblob under `limits`. Returns that directory
+    and how the run ended.
+    """
+    cmd, out = _unblob_cmd(firmware, scratch)
     if verbose:
         print(f"[shard] running: {' '.join(cmd)}", file=sys.stderr)
-    # unblob can be chatty even on success; suppress unless verbose.
-    subprocess.run(
-        cmd, check=True,
-        stdout=None if verbose else subprocess.DEVNULL,
-        stderr=None if verbose else subprocess.DEVNULL,
-    )
-    return out
+    # unblob can be chatty even on success; run_supervised silences it unless verbose.
+    outcome = run_supervised(cmd, out, limits, verbose=verbose)
+    _check_outcome(outcome, cmd, out)
+    return out, outcome
 
 
-def run_binwalk(firmware: Path, scratch: Path, verbose: bool = False) -> Path:
-    """Run binwalk recursive extraction into scratch/binwalk."""
+def run_binwalk(
+    firmware: Path,
+    scratch: Path,
+    verbose: bool = False,
+    limits: ExtractLimits = ExtractLimits(),
+) -> tuple[Path, ExtractOutcome]:
+    """Run binwalk recursive extraction into scratch/binwalk under `limits`."""
     if not _which("binwalk"):
         raise ExtractorMissing(
             "binwalk not found on PATH. Install it locally or run this inside "
@@ -597,16 +1047,189 @@ def run_binwalk(firmware: Path, scratch: Path, verbose: bool = False) -> Path:
     cmd = ["binwalk", "--extract", "--matryoshka", "--directory", str(out), str(firmware)]
     if verbose:
         print(f"[shard] running: {' '.join(cmd)}", file=sys.stderr)
-    subprocess.run(
-        cmd, check=True,
-        stdout=None if verbose else subprocess.DEVNULL,
-        stderr=None if verbose else subprocess.DEVNULL,
-    )
-    return out
+    outcome = run_supervised(cmd, out, limits, verbose=verbose)
+    _check_outcome(outcome, cmd, out)
+    return out, outcome
+
+
+# --------------- Streaming (tar while unblob runs) ---------------
+
+def stream_unblob_shards(
+    firmware: Path,
+    scratch_root: Path,
+    out_dir: Path,
+    firmware_stem: str,
+    min_score: int = 3,
+    reextract: bool = True,
+    verbose: bool = False,
+    jobs: int = 1,
+    archive: ArchiveSpec = ArchiveSpec(),
+    limits: ExtractLimits = ExtractLimits(),
+    settle_polls: int = 3,
+    timer: Optional[StageTimer] = None,
+) -> tuple[Path, list[ShardInfo], ExtractOutcome]:
+    """Run unblob and tar filesystem shards while it is still extracting.
+
+    unblob only writes its --report at exit, so progress comes from polling
+    the extraction tree, and early shards are typed by dir suffix. Every
+    poll (each `limits.poll_interval`) rebuilds the TreeIndex, which also
+    feeds the supervisor's budget checks. A known-fs
+    `*_extract` dir (squashfs, ubifs, cpio, ...) whose file count, dir count
+    and byte total stay the same for `settle_polls` consecutive polls counts
+    as finished. It is handed to the tar pool right away, and shards.json is
+    rewritten with `"complete": false` as each tarball lands, so `plan` can
+    start on a partial manifest.
+
+    When unblob exits, the normal find_shards runs on the final tree. Shards
+    whose subtree changed after they were tarred are re-tarred under the same
+    name. The final pass has the report, so it types and re-extracts from
+    that. Generic terminal-extract and score-pass shards are added then, and
+    early shards the final selection no longer picks are removed. Shard
+    indices follow emission order, not score order. A run stopped by
+    `limits` gets the same final pass over whatever was extracted.
+
+    With a `timer`, the unblob run (including the polling walks) counts as
+    "extract", the final pass as "walk", and worker stats as reextract/tar.
+
+    Returns (extraction_root, infos in index order, outcome).
+    """
+    cmd, extraction_root = _unblob_cmd(firmware, scratch_root)
+    if verbose:
+        print(f"[shard] running (streaming): {' '.join(cmd)}", file=sys.stderr)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    common = (extraction_root, out_dir, firmware_stem, scratch_root, reextract, verbose, archive)
+    timer = timer if timer is not None else StageTimer()
+    report: Optional[UnblobReport] = None
+    emitted: dict[tuple[str, ...], tuple[int, tuple[int, int, int]]] = {}  # rel -> (idx, signature)
+    pending: dict[tuple[str, ...], Future] = {}
+    done: dict[tuple[str, ...], ShardInfo] = {}
+    settling: dict[tuple[str, ...], tuple[tuple[int, int, int], int]] = {}
+    next_index = 0
+
+    def submit(pool, index: TreeIndex, node: DirNode, idx: int) -> None:
+        score, ev = score_directory(index, node)
+        emitted[node.rel] = (idx, _subtree_signature(node))
+        pending[node.rel] = pool.submit(_tar_one_shard, idx, index.path(node), score, ev,
+                                        *common, report, timer.profile_dir)
+
+    def land(fut: Future) -> ShardInfo:
+        info, stages = fut.result()
+        timer.merge(stages)
+        return info
+
+    def ordered() -> list[ShardInfo]:
+        return [done[rel] for rel in sorted(done, key=lambda r: emitted[r][0])]
+
+    def collect(wait: bool = False) -> None:
+        landed = False
+        for rel, fut in list(pending.items()):
+            if wait or fut.done():
+                done[rel] = land(fut)
+                del pending[rel]
+                landed = True
+        if landed:
+            write_manifest(ordered(), out_dir, firmware, "unblob", complete=False)
+
+    with ProcessPoolExecutor(max_workers=max(1, jobs)) as pool:
+        def tick() -> tuple[int, int]:
+            nonlocal next_index
+            index = TreeIndex(extraction_root)
+            for rel, node in _select_extract_dirs(index, known_fs_only=True).items():
+                if rel in emitted:
+                    continue
+                sig = _subtree_signature(node)
+                prev, polls = settling.get(rel, (None, 0))
+                polls = polls + 1 if sig == prev else 1
+                settling[rel] = (sig, polls)
+                if polls >= settle_polls:
+                    if verbose:
+                        print(f"[shard] streaming shard {next_index:02d}: "
+                              f"{'/'.join(rel)}", file=sys.stderr)
+                    submit(pool, index, node, next_index)
+                    next_index += 1
+            collect()
+            top = index.nodes[()]
+            return top.total_bytes, top.file_count + top.dir_count
+
+        with timer.stage("extract") as st:
+            outcome = run_supervised(cmd, extraction_root, limits, verbose=verbose, on_tick=tick)
+            st.files = outcome.peak_inodes
+        _check_outcome(outcome, cmd, extraction_root)
+
+        # Final pass over the finished tree.
+        with timer.stage("walk") as st:
+            report = load_unblob_report(scratch_root, extraction_root, verbose=verbose)
+            index = TreeIndex(extraction_root)
+            final = find_shards(extraction_root, min_score=min_score, index=index, report=report,
+                                verbose=verbose)
+            top = index.nodes[()]
+            st.files = top.file_count + top.dir_count
+        final_ev: dict[tuple[str, ...], dict] = {}
+        for path, _score, ev in final:
+            node = index.node(path)
+            final_ev[node.rel] = ev
+            if node.rel in emitted:
+                idx, sig = emitted[node.rel]
+                if sig == _subtree_signature(node):
+                    continue
+                if node.rel in pending:
+                    land(pending.pop(node.rel))
+                if verbose:
+                    print(f"[shard] re-tarring shard {idx:02d}, it changed after tarring",
+                          file=sys.stderr)
+                submit(pool, index, node, idx)
+            else:
+                submit(pool, index, node, next_index)
+                next_index += 1
+        collect(wait=True)
+
+    for rel in set(done) - set(final_ev):
+        info = done.pop(rel)
+        if verbose:
+            print(f"[shard] dropping early shard {info.name}: not in the final selection",
+                  file=sys.stderr)
+        (out_dir / info.name).unlink(missing_ok=True)
+        index_path(out_dir / info.name).unlink(missing_ok=True)
+        # plan may already have grepped this early shard.
+        trigram_path(out_dir / info.name).unlink(missing_ok=True)
+    for rel, info in done.items():
+        # Dedupe only runs on the final tree; an unchanged early shard keeps
+        # its tarball but picks up its aliases here.
+        info.aliases = list(final_ev[rel].get("aliases", []))
+        info.tree_hash = final_ev[rel].get("tree_hash")
+    if report is not None:
+        # Early shards were typed by suffix; their tarballs stand, but the
+        # manifest gets the report's view.
+        for rel, info in done.items():
+            hit = report.nearest(rel)
+            if hit is not None:
+                rec = hit[1]
+                info.fs_type_guess = rec.fs_type
+                info.chunk_handler = rec.handler
+                info.chunk_offset = rec.start_offset
+                info.chunk_size = rec.size
+    return extraction_root, ordered(), outcome
 
 
 # --------------- Top-level ---------------
 
+def _summary(out_dir: Path, manifest_path: Path, extractor: str, archive: ArchiveSpec,
+             shards: list[dict], extraction: Optional[dict] = None) -> dict:
+    return {
+        "shard_dir": str(out_dir),
+        "manifest": str(manifest_path),
+        "extractor": extractor,
+        "archive": archive.describe(),
+        "reextracted_count": sum(1 for s in shards if s.get("reextracted_with")),
+        "deduplicated_count": sum(len(s.get("aliases") or []) for s in shards),
+        "count": len(shards),
+        "stop_reason": extraction["stop_reason"] if extraction else None,
+        "extraction": extraction,
+        "shards": shards,
+    }
+
+
 def shard(
     firmware: Optional[Path],
     out_dir: Path,
@@ -615,6 +1238,13 @@ def shard(
     min_score: int = 3,
     reextract: bool = True,
     verbose: bool = False,
+    jobs: int = 1,
+    archive: ArchiveSpec = ArchiveSpec(),
+    cache: Optional[RunCache] = None,
+    stream: bool = False,
+    limits: ExtractLimits = ExtractLimits(),
+    scratch: ScratchPolicy = ScratchPolicy(),
+    profile: Optional[Path] = None,
 ) -> dict:
     """Extract a firmware blob into per-shard .tar.gz files + a manifest.
 
@@ -623,30 +1253,126 @@ def shard(
     still works as long as the original blobs are present next to the
     *_extract dirs.
 
+    `stream` (unblob only) tars filesystem shards while unblob is still
+    running; see stream_unblob_shards.
+
+    The extractor runs under `limits` (timeout, byte and inode budgets; see
+    supervise.py). A run cut short still yields shards from whatever was
+    extracted, and `stop_reason` in the summary and shards.json says why.
+
+    `scratch` places the scratch tree on disk or tmpfs (see scratch.py); the
+    summary's `scratch` block records where it went and its peak size.
+
+    Per-stage wall/CPU/I/O accounting (see timing.py) goes to the `timings`
+    block of shards.json and the summary. With `profile`, each stage's
+    cProfile stats are also dumped there as <stage>.pstats.
+
+    With a `cache`, runs on a firmware blob are looked up by content hash +
+    extractor + options first; a hit restores the shards without extracting.
+    Pre-extracted trees and runs that didn't complete are never cached.
+
     Returns a dict summary suitable for printing.
     """
-    cleanup_scratch: Path | None = None
-    scratch_root: Path
+    # Missing pigz/zstd/bsdtar should fail now, not after a long extraction.
+    archive.check_tools()
+    if stream and (extractor != "unblob" or extracted_dir is not None):
+        raise ValueError("streaming shard mode needs a firmware blob and --extractor unblob")
+    run_args = (firmware, out_dir, extractor, extracted_dir, min_score, reextract,
+                verbose, jobs, archive, stream, limits, scratch, profile)
+    if cache is None or extracted_dir is not None:
+        return _shard_uncached(*run_args)
+    if firmware is None or not firmware.is_file():
+        raise FileNotFoundError(f"firmware not found: {firmware}")
+
+    # Everything that changes shard names or contents. `jobs` doesn't.
+    options = {
+        "firmware_name": firmware.name,
+        "min_score": min_score,
+        "reextract": reextract,
+        "archive": archive.describe(),
+        # Stream runs number and pick shards in emission order.
+        "stream": stream,
+    }
+    key = cache.make_key(firmware, extractor, options)
+    timer = StageTimer(profile)
+    with cache.locked(key):
+        with timer.stage("restore") as st:
+            manifest = cache.restore(key, out_dir)
+            st.files = len(manifest["shards"]) if manifest is not None else 0
+        if manifest is not None:
+            if verbose:
+                print(f"[shard] cache hit {key[:12]} — skipping extraction", file=sys.stderr)
+            summary = _summary(out_dir, out_dir / "shards.json", manifest["extractor"],
+                               archive, manifest["shards"], manifest.get("extraction"))
+            # shards.json keeps the timings of the run that produced it.
+            summary["timings"] = timer.to_json()
+            summary["cache"] = "hit"
+            timer.dump_profiles()
+            return summary
+        summary = _shard_uncached(*run_args)
+        if summary["stop_reason"] == "completed":
+            names = [s["name"] for s in summary["shards"]]
+            sidecars = [index_path(out_dir / n).name for n in names
+                        if index_path(out_dir / n).exists()]
+            cache.store(key, out_dir, names + sidecars,
+                        {"extractor": extractor, "options": options})
+        summary["cache"] = "miss"
+        return summary
+
+
+def _spill_limits(limits: ExtractLimits, placement: ScratchPlacement) -> ExtractLimits:
+    """Cap the byte budget at the measured tmpfs headroom for auto->ram runs."""
+    if placement.headroom is None:
+        return limits
+    cap = placement.headroom if limits.max_bytes is None else min(limits.max_bytes, placement.headroom)
+    return dataclasses.replace(limits, max_bytes=cap)
+
+
+def _must_spill(outcome: ExtractOutcome, placement: ScratchPlacement, limits: ExtractLimits) -> bool:
+    """Did an auto->ram run stop on the tmpfs cap rather than the user's budget?"""
+    return (
+        placement.headroom is not None
+        and outcome.stop_reason == "disk_budget"
+        and (limits.max_bytes is None or placement.headroom < limits.max_bytes)
+    )
+
+
+def _shard_uncached(
+    firmware: Optional[Path],
+    out_dir: Path,
+    extractor: str,
+    extracted_dir: Optional[Path],
+    min_score: int,
+    reextract: bool,
+    verbose: bool,
+    jobs: int,
+    archive: ArchiveSpec,
+    stream: bool,
+    limits: ExtractLimits,
+    scratch: ScratchPolicy,
+    profile: Optional[Path] = None,
+) -> dict:
+    timer = StageTimer(profile)
+    report: Optional[UnblobReport] = None
+    outcome: Optional[ExtractOutcome] = None
+    spilled = False
     if extracted_dir is not None:
         if not extracted_dir.is_dir():
             raise FileNotFoundError(f"extracted_dir not found: {extracted_dir}")
         extraction_root = extracted_dir
         used_extractor = "preextracted"
         # Even with a pre-extracted tree we need a scratch dir for re-extraction.
-        scratch_root = Path(tempfile.mkdtemp(prefix="fw2shard_"))
-        cleanup_scratch = scratch_root
+        placement = place_scratch(scratch, None, verbose=verbose)
     else:
         if firmware is None or not firmware.is_file():
             raise FileNotFoundError(f"firmware not found: {firmware}")
-        scratch_root = Path(tempfile.mkdtemp(prefix="fw2shard_"))
-        cleanup_scratch = scratch_root
-        if extractor == "unblob":
-            extraction_root = run_unblob(firmware, scratch_root, verbose=verbose)
-        elif extractor == "binwalk":
-            extraction_root = run_binwalk(firmware, scratch_root, verbose=verbose)
-        else:
+        if extractor not in ("unblob", "binwalk"):
             raise ValueError(f"unknown extractor: {extractor!r}")
+        placement = place_scratch(scratch, firmware, verbose=verbose)
         used_extractor = extractor
+        # stream_unblob_shards runs unblob itself, inside the try below.
+        extraction_root = placement.root / "unblob"
+    scratch_root = placement.root
 
     # When --from-extracted was used we may not have a firmware path; pick a
     # stable stem from the extracted dir name so the per-shard tarball names
@@ -654,29 +1380,94 @@ def shard(
     firmware_stem = firmware.stem if firmware is not None else extraction_root.resolve().name
 
     try:
-        candidates = find_shards(extraction_root, min_score=min_score)
-        if verbose:
-            print(f"[shard] {len(candidates)} candidate fragment(s) selected", file=sys.stderr)
-            for p, s, ev in candidates:
-                print(f"  score={s:3d}  files={ev.get('file_count')}  "
-                      f"{p.relative_to(extraction_root)}", file=sys.stderr)
-        infos = tar_shards(
-            candidates, extraction_root, out_dir, firmware_stem,
-            scratch_root=scratch_root, reextract=reextract, verbose=verbose,
-        )
-        manifest_path = write_manifest(infos, out_dir, firmware, used_extractor)
+        if stream:
+            extraction_root, infos, outcome = stream_unblob_shards(
+                firmware, scratch_root, out_dir, firmware_stem,
+                min_score=min_score, reextract=reextract, verbose=verbose,
+                jobs=jobs, archive=archive, limits=_spill_limits(limits, placement),
+                timer=timer,
+            )
+            if _must_spill(outcome, placement, limits):
+                for info in infos:
+                    (out_dir / info.name).unlink(missing_ok=True)
+                    index_path(out_dir / info.name).unlink(missing_ok=True)
+                    trigram_path(out_dir / info.name).unlink(missing_ok=True)
+                placement, spilled = _respill(placement, scratch, firmware, verbose), True
+                scratch_root = placement.root
+                extraction_root, infos, outcome = stream_unblob_shards(
+                    firmware, scratch_root, out_dir, firmware_stem,
+                    min_score=min_score, reextract=reextract, verbose=verbose,
+                    jobs=jobs, archive=archive, limits=limits, timer=timer,
+                )
+        else:
+            if extracted_dir is None:
+                run = run_unblob if extractor == "unblob" else run_binwalk
+                with timer.stage("extract") as st:
+                    extraction_root, outcome = run(firmware, scratch_root, verbose=verbose,
+                                                   limits=_spill_limits(limits, placement))
+                    st.files = outcome.peak_inodes
+                if _must_spill(outcome, placement, limits):
+                    placement, spilled = _respill(placement, scratch, firmware, verbose), True
+                    scratch_root = placement.root
+                    with timer.stage("extract") as st:
+                        extraction_root, outcome = run(firmware, scratch_root, verbose=verbose,
+                                                       limits=limits)
+                        st.files = outcome.peak_inodes
+            with timer.stage("walk") as st:
+                if extracted_dir is None and extractor == "unblob":
+                    report = load_unblob_report(scratch_root, extraction_root, verbose=verbose)
+                index = TreeIndex(extraction_root)
+                candidates = find_shards(extraction_root, min_score=min_score, index=index,
+                                         report=report, verbose=verbose)
+                top = index.nodes[()]
+                st.files = top.file_count + top.dir_count
+            if verbose:
+                print(f"[shard] {len(candidates)} candidate fragment(s) selected", file=sys.stderr)
+                for p, s, ev in candidates:
+                    print(f"  score={s:3d}  files={ev.get('file_count')}  "
+                          f"{p.relative_to(extraction_root)}", file=sys.stderr)
+            infos = tar_shards(
+                candidates, extraction_root, out_dir, firmware_stem,
+                scratch_root=scratch_root, reextract=reextract, verbose=verbose,
+                jobs=jobs, archive=archive, report=report, timer=timer,
+            )
+        extraction = outcome.to_json() if outcome is not None else None
+        timings = timer.to_json()
+        manifest_path = write_manifest(infos, out_dir, firmware, used_extractor,
+                                       extraction=extraction, timings=timings)
         reextract_count = sum(1 for i in infos if i.reextracted_with)
         if verbose and reextract_count:
             print(f"[shard] re-extracted {reextract_count} shard(s) with native tools "
                   f"(perm-preserving)", file=sys.stderr)
-        return {
-            "shard_dir": str(out_dir),
-            "manifest": str(manifest_path),
-            "extractor": used_extractor,
-            "reextracted_count": reextract_count,
-            "count": len(infos),
-            "shards": [asdict(i) for i in infos],
+        summary = _summary(out_dir, manifest_path, used_extractor, archive,
+                           [asdict(i) for i in infos], extraction)
+        # Extraction trees, re-extractions and chunk slices all stay until
+        # cleanup, so the end-of-run size bounds everything but the
+        # extractor's own transient files, which the supervisor sampled.
+        used, inodes = dir_usage(scratch_root)
+        summary["scratch"] = {
+            "mode": placement.mode,
+            "dir": str(scratch_root.parent),
+            "spilled": spilled,
+            "peak_bytes": max(used, outcome.peak_bytes if outcome else 0),
+            "peak_inodes": max(inodes, outcome.peak_inodes if outcome else 0),
         }
+        summary["timings"] = timings
+        timer.dump_profiles()
+        return summary
     finally:
-        if cleanup_scratch is not None:
-            shutil.rmtree(cleanup_scratch, ignore_errors=True)
+        shutil.rmtree(placement.root, ignore_errors=True)
+
+
+def _respill(
+    placement: ScratchPlacement,
+    scratch: ScratchPolicy,
+    firmware: Path,
+    verbose: bool,
+) -> ScratchPlacement:
+    """Throw away an auto->ram scratch that ran out of room and start over on disk."""
+    if verbose:
+        print(f"[shard] tmpfs scratch exceeded {placement.headroom >> 20} MiB; "
+              f"re-running the extractor on disk", file=sys.stderr)
+    shutil.rmtree(placement.root, ignore_errors=True)
+    return place_scratch(ScratchPolicy(mode="disk", dir=scratch.dir), firmware, verbose=verbose)
@@ -0,0 +1,222 @@
+"""Supervised extractor runs: wall-clock timeout, scratch budget, partial
+harvest.
+
+unblob and binwalk used to run under a bare `subprocess.run`, so a huge or
+hostile blob could block a worker forever or fill the scratch disk. Here the
+extractor runs in its own process group. A watchdog wakes every
+`poll_interval`, samples how many bytes and inodes the extraction dir holds,
+and kills the whole group (SIGTERM, then SIGKILL) once the timeout or a
+budget is exceeded. That matches the Rust side's `--timeout`, plus a
+decompression-bomb guard.
+
+Being stopped is not an error. The caller runs `find_shards` on whatever
+landed and records `ExtractOutcome.stop_reason` in shards.json:
+
+    completed      extractor exited 0
+    exit_status    extractor exited non-zero (returncode is recorded)
+    timeout        wall-clock limit hit
+    disk_budget    extraction dir grew past max_bytes
+    inode_budget   extraction dir grew past max_inodes
+"""
+from __future__ import annotations
+
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from .runcache import parse_size
+
+_RATIO_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*x\s*$", re.IGNORECASE)
+
+# Budgets relative to the firmware size are floored here, so a tiny blob
+# that legitimately unpacks a few hundred MB isn't cut short.
+_MIN_RELATIVE_BUDGET = 1 << 30
+
+_KILL_GRACE = 5.0
+# The watchdog's own walk of the extraction dir backs off: the gap between
+# walks doubles after each one, from poll_interval up to this many seconds,
+# so a large output tree isn't re-walked every poll.
+_MAX_WALK_GAP = 30.0
+_GROUP_POLL = 0.05
+
+
+def parse_budget(value: str) -> tuple[str, float]:
+    """Parse a byte budget: an absolute size (`50G`, `1048576`), a multiple
+    of the firmware size (`100x`), or `none`. Returns ("abs", bytes),
+    ("ratio", factor) or ("none", 0).
+    """
+    if value.strip().lower() in ("none", "0", "off"):
+        return ("none", 0)
+    m = _RATIO_RE.match(value)
+    if m:
+        return ("ratio", float(m.group(1)))
+    return ("abs", float(parse_size(value)))
+
+
+def resolve_budget(budget: tuple[str, float], firmware: Optional[Path]) -> Optional[int]:
+    kind, n = budget
+    if kind == "none":
+        return None
+    if kind == "abs":
+        return int(n)
+    size = firmware.stat().st_size if firmware is not None and firmware.is_file() else 0
+    return max(int(n * size), _MIN_RELATIVE_BUDGET)
+
+
+@dataclass(frozen=True)
+class ExtractLimits:
+    timeout: Optional[float] = None      # seconds of wall clock
+    max_bytes: Optional[int] = None      # apparent size of the extraction dir
+    max_inodes: Optional[int] = None     # files + dirs in the extraction dir
+    poll_interval: float = 1.0
+
+
+@dataclass
+class ExtractOutcome:
+    stop_reason: str
+    returncode: Optional[int]
+    elapsed_s: float
+    peak_bytes: int
+    peak_inodes: int
+    limits: dict
+
+    @property
+    def complete(self) -> bool:
+        return self.stop_reason == "completed"
+
+    def to_json(self) -> dict:
+        d = asdict(self)
+        d["elapsed_s"] = round(self.elapsed_s, 3)
+        return d
+
+
+def dir_usage(root: Path) -> tuple[int, int]:
+    """(apparent bytes of regular files, inode count) under root. Symlinks
+    are counted as inodes but not followed.
+    """
+    total = 0
+    inodes = 0
+    stack = [str(root)]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                inodes += 1
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+    return total, inodes
+
+
+def _kill_group(proc: subprocess.Popen) -> None:
+    """SIGTERM the extractor's process group, give the group _KILL_GRACE
+    seconds to exit, then SIGKILL whatever is left of it. The leader
+    exiting early proves nothing about its children (decompressors that
+    ignore SIGTERM), so the SIGKILL is always sent."""
+    pgid = proc.pid  # start_new_session: the leader's pid is the group id
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+    except ProcessLookupError:
+        proc.wait()
+        return
+    deadline = time.monotonic() + _KILL_GRACE
+    while time.monotonic() < deadline:
+        proc.poll()  # reap the leader so a zombie doesn't keep the group alive
+        try:
+            os.killpg(pgid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(_GROUP_POLL)
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    proc.wait()
+
+
+def run_supervised(
+    cmd: list[str],
+    watch_dir: Path,
+    limits: ExtractLimits,
+    verbose: bool = False,
+    on_tick: Optional[Callable[[], Optional[tuple[int, int]]]] = None,
+) -> ExtractOutcome:
+    """Run `cmd` in a new process group and enforce `limits` on it.
+
+    `on_tick` is called once per poll while the extractor runs. If it returns
+    a (bytes, inodes) sample, for example from a TreeIndex the caller built
+    anyway, that sample is used and the watchdog skips its own walk.
+    Otherwise the budgets are checked against the last walk, and walks back
+    off (see _MAX_WALK_GAP); the timeout is checked on every poll. Any
+    exception (including KeyboardInterrupt) kills the group and is re-raised.
+    """
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        cmd,
+        stdout=None if verbose else subprocess.DEVNULL,
+        stderr=None if verbose else subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    peak_bytes = peak_inodes = 0
+    used = inodes = 0
+    walk_gap = limits.poll_interval
+    next_walk = start
+    reason: Optional[str] = None
+    try:
+        while True:
+            try:
+                proc.wait(timeout=limits.poll_interval)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            sample = on_tick() if on_tick is not None else None
+            if sample is not None:
+                used, inodes = sample
+            elif time.monotonic() >= next_walk:
+                used, inodes = dir_usage(watch_dir)
+                next_walk = time.monotonic() + walk_gap
+                walk_gap = min(walk_gap * 2, _MAX_WALK_GAP)
+            peak_bytes, peak_inodes = max(peak_bytes, used), max(peak_inodes, inodes)
+            if limits.timeout is not None and time.monotonic() - start > limits.timeout:
+                reason = "timeout"
+            elif limits.max_bytes is not None and used > limits.max_bytes:
+                reason = "disk_budget"
+            elif limits.max_inodes is not None and inodes > limits.max_inodes:
+                reason = "inode_budget"
+            if reason is not None:
+                if verbose:
+                    print(f"[shard] stopping {cmd[0]}: {reason} "
+                          f"({used} bytes, {inodes} inodes after "
+                          f"{time.monotonic() - start:.0f}s); harvesting partial output",
+                          file=sys.stderr)
+                _kill_group(proc)
+                break
+    except BaseException:
+        _kill_group(proc)
+        raise
+    used, inodes = dir_usage(watch_dir)
+    peak_bytes, peak_inodes = max(peak_bytes, used), max(peak_inodes, inodes)
+    if reason is None:
+        reason = "completed" if proc.returncode == 0 else "exit_status"
+    return ExtractOutcome(
+        stop_reason=reason,
+        returncode=proc.returncode,
+        elapsed_s=time.monotonic() - start,
+        peak_bytes=peak_bytes,
+        peak_inodes=peak_inodes,
+        limits=asdict(limits),
+    )
@@ -0,0 +1,137 @@
+"""Per-stage wall time, CPU time and I/O accounting.
+
+`shard()` records extract / walk / reextract / tar stages in shards.json's
+`timings` block, and `apply_plan()` records its merge and trailer stages in
+its return dict. Each stage gets:
+
+    wall_s        elapsed wall clock (summed over calls)
+    cpu_s         user + system CPU of this process plus any children reaped
+                  during the stage (unblob, cpio, pigz, ...)
+    read_bytes    bytes read through read(2)-style syscalls (/proc/self/io
+    write_bytes   rchar/wchar, so page-cache hits and tmpfs count); 0 where
+                  /proc is unavailable
+    files         what the stage handled: inodes extracted, entries walked,
+                  files tarred, members merged
+    calls         how many times the stage ran (shards, spill re-runs)
+
+Stages that run in worker processes (re-extraction and tarring with
+`--jobs`) are measured in the worker and merged, so their wall_s is busy
+time summed across workers and can exceed the run's elapsed time.
+
+With a `profile_dir`, each stage also runs under cProfile and its stats are
+dumped to `<profile_dir>/<stage>.pstats` (`<stage>.<tag>.pstats` for a
+per-shard worker timer); load them with `pstats.Stats`.
+"""
+from __future__ import annotations
+
+import contextlib
+import cProfile
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+@dataclass
+class StageStats:
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    read_bytes: int = 0
+    write_bytes: int = 0
+    files: int = 0
+    calls: int = 0
+
+    def merge(self, other: "StageStats") -> None:
+        self.wall_s += other.wall_s
+        self.cpu_s += other.cpu_s
+        self.read_bytes += other.read_bytes
+        self.write_bytes += other.write_bytes
+        self.files += other.files
+        self.calls += other.calls
+
+    def to_json(self) -> dict:
+        d = asdict(self)
+        d["wall_s"] = round(self.wall_s, 3)
+        d["cpu_s"] = round(self.cpu_s, 3)
+        return d
+
+
+def _cpu_seconds() -> float:
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _io_counters() -> tuple[int, int]:
+    """(rchar, wchar) for this process, including reaped children."""
+    read = written = 0
+    try:
+        with open("/proc/self/io", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key == "rchar":
+                    read = int(value)
+                elif key == "wchar":
+                    written = int(value)
+    except (OSError, ValueError):
+        pass
+    return read, written
+
+
+class StageTimer:
+    """Accumulates StageStats by stage name for one run."""
+
+    def __init__(self, profile_dir: Optional[Path] = None, tag: Optional[str] = None):
+        self.stages: dict[str, StageStats] = {}
+        self.profile_dir = profile_dir
+        self.tag = tag
+        self._profiles: dict[str, cProfile.Profile] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, profile: bool = True) -> Iterator[StageStats]:
+        """Measure the body as one call of `name`. The yielded StageStats is
+        the caller's to set `files` on. `profile=False` keeps an enclosing
+        stage (such as "total") out of cProfile, which can't nest.
+        """
+        st = StageStats(calls=1)
+        prof = None
+        if profile and self.profile_dir is not None:
+            prof = self._profiles.setdefault(name, cProfile.Profile())
+        wall0, cpu0 = time.monotonic(), _cpu_seconds()
+        read0, write0 = _io_counters()
+        if prof is not None:
+            prof.enable()
+        try:
+            yield st
+        finally:
+            if prof is not None:
+                prof.disable()
+            read1, write1 = _io_counters()
+            st.wall_s = time.monotonic() - wall0
+            st.cpu_s = _cpu_seconds() - cpu0
+            st.read_bytes = read1 - read0
+            st.write_bytes = write1 - write0
+            self.add(name, st)
+
+    def add(self, name: str, st: StageStats) -> None:
+        self.stages.setdefault(name, StageStats()).merge(st)
+
+    def merge(self, stages: dict[str, StageStats]) -> None:
+        for name, st in stages.items():
+            self.add(name, st)
+
+    def to_json(self) -> dict:
+        return {name: st.to_json() for name, st in self.stages.items()}
+
+    def dump_profiles(self) -> list[Path]:
+        """Write one .pstats file per profiled stage; returns the paths."""
+        if self.profile_dir is None:
+            return []
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for name, prof in self._profiles.items():
+            stem = f"{name}.{self.tag}" if self.tag else name
+            path = self.profile_dir / f"{stem}.pstats"
+            prof.dump_stats(path)
+            paths.append(path)
+        return paths
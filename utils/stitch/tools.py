@@ -7,22 +7,42 @@ small local models.
 """
 from __future__ import annotations
 
-import fnmatch
+import bisect
 import json
 import re
 import tarfile
+import threading
+from array import array
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Callable
 
 from pydantic import BaseModel, Field
 
+from .archive import ARCHIVE_SUFFIX_RE, is_archive_name, open_tar
+from .catalog import Catalog
+from .memberindex import MemberIndex, MemberRecord, type_name
+from .pathglob import compile_glob
+from .pathindex import PathIndex
+from .seekable import SeekableReader, open_reader
+from .trigram import TrigramIndex
+
 
 # fw2tar's per-extractor output naming: <fwname>.<extractor>.<idx>.tar.gz
-_FW2TAR_NAME_RE = re.compile(r"^(?P<fw>.+?)\.(?P<extractor>binwalk|binwalkv3|binwalk3|unblob)\.(?P<idx>\d+)\.tar\.gz$")
+_FW2TAR_NAME_RE = re.compile(
+    r"^(?P<fw>.+?)\.(?P<extractor>binwalk|binwalkv3|binwalk3|unblob)\.(?P<idx>\d+)" + ARCHIVE_SUFFIX_RE + "$"
+)
+
+# The shard step's output naming: <fwname>.shard.<NN>.<slug>.<tar|tar.gz|tar.zst>
+_SHARD_NAME_RE = re.compile(
+    r"^(?P<fw>.+?)\.shard\.(?P<idx>\d+)\.(?P<slug>.+?)" + ARCHIVE_SUFFIX_RE + "$"
+)
 
-# The shard step's output naming: <fwname>.shard.<NN>.<slug>.tar.gz
-_SHARD_NAME_RE = re.compile(r"^(?P<fw>.+?)\.shard\.(?P<idx>\d+)\.(?P<slug>.+)\.tar\.gz$")
+# grep skips files larger than this; the trigram index covers the rest.
+_GREP_MAX_BYTES = 256 * 1024
+# Below this many glob candidates, reading them beats building a trigram
+# index for the fragment (an index already on disk is always used).
+_TRIGRAM_MIN_CANDIDATES = 16
 
 
 @dataclass
@@ -41,6 +61,8 @@ class FragmentInfo:
     shard_score: int | None = None
     file_count: int | None = None
     reextracted_with: str | None = None
+    # root_paths of byte-identical copies that were not tarred separately.
+    aliases: list[str] = field(default_factory=list)
 
 
 def _load_manifest(frag_dir: Path) -> dict[str, dict]:
@@ -56,17 +78,123 @@ def _load_manifest(frag_dir: Path) -> dict[str, dict]:
     return {s["name"]: s for s in data.get("shards", [])}
 
 
+class MemberTable:
+    """One fragment's members with O(1) path lookup and prefix ranges.
+
+    `norm_names` is every member name normalised (leading "./" and "/"
+    dropped), in archive order. `sorted_names` is the same names sorted,
+    with `sorted_pos` mapping each back to its archive position, so a
+    prefix query is two bisects instead of a scan, and a glob only tests
+    the names under its literal path or basename prefixes (see pathglob.py).
+    """
+
+    def __init__(self, members: list[MemberRecord] | list[tarfile.TarInfo]):
+        self.members = members
+        self.norm_names = [_normalize(m.name) for m in members]
+        self._exact: dict[str, Any] = {}
+        self._norm: dict[str, Any] = {}
+        for m, n in zip(members, self.norm_names):
+            self._exact[m.name] = m  # last wins, like TarFile.getmember
+            self._norm.setdefault(n, m)  # first wins, like the old fallback scan
+        order = sorted(range(len(members)), key=self.norm_names.__getitem__)
+        self.sorted_names = [self.norm_names[i] for i in order]
+        self.sorted_pos = array("I", order)
+        self._basenames: tuple[list[str], array] | None = None
+        # The model repeats globs (list_paths, then grep over the same glob).
+        self._globs: dict[tuple[str, int], list[str]] = {}
+        self._globs_lock = threading.Lock()
+
+    def resolve(self, path: str) -> MemberRecord | tarfile.TarInfo | None:
+        """Tarballs may store names as './foo'; try the likely spellings
+        exactly, then match on the normalised name."""
+        for c in (path, "./" + path.lstrip("/"), path.lstrip("/")):
+            m = self._exact.get(c)
+            if m is not None:
+                return m
+        return self._norm.get(_normalize(path))
+
+    def __contains__(self, norm_name: str) -> bool:
+        return norm_name in self._norm
+
+    def _basename_view(self) -> tuple[list[str], array]:
+        if self._basenames is None:
+            bases = [n.rsplit("/", 1)[-1] for n in self.norm_names]
+            order = sorted(range(len(bases)), key=bases.__getitem__)
+            self._basenames = ([bases[i] for i in order], array("I", order))
+        return self._basenames
+
+    def _glob_candidates(self, g) -> list[int]:
+        """Archive positions that can match `g`: those under its path
+        prefixes, or under its basename prefixes if that range is smaller."""
+        if g.prefixes == [""] and g.base_prefixes is None:
+            return list(range(len(self.members)))
+        names, pos = self.sorted_names, self.sorted_pos
+        spans = [_span(names, p) for p in g.prefixes]
+        if g.base_prefixes is not None:
+            bnames, bpos = self._basename_view()
+            bspans = [_span(bnames, p) for p in g.base_prefixes]
+            if sum(hi - lo for lo, hi in bspans) < sum(hi - lo for lo, hi in spans):
+                pos, spans = bpos, bspans
+        if len(spans) == 1:
+            lo, hi = spans[0]
+            return sorted(pos[lo:hi])
+        return sorted(i for lo, hi in spans for i in pos[lo:hi])
+
+    def glob(self, pattern: str, limit: int) -> list[str]:
+        """Up to `limit` normalised names matching `pattern`, in archive order."""
+        key = (pattern, limit)
+        hits = self._globs.get(key)
+        if hits is None:
+            g = compile_glob(pattern)
+            hits = []
+            for i in self._glob_candidates(g):
+                n = self.norm_names[i]
+                if g.match(n):
+                    hits.append(n)
+                    if len(hits) >= limit:
+                        break
+            with self._globs_lock:
+                if len(self._globs) >= 64:
+                    del self._globs[next(iter(self._globs))]
+                self._globs[key] = hits
+        return list(hits)
+
+
 class FragmentCache:
-    """Owns open TarFile handles, keyed by fragment basename."""
+    """Owns open TarFile handles, keyed by fragment basename.
+
+    Name/type/link questions are answered from a fragment's member index
+    sidecar when it has a current one, so the tar is only opened (and, for
+    compressed shards, decompressed) when file contents are needed. If the
+    sidecar also has a seek table, contents are read by seeking to the
+    member instead of going through tarfile at all.
+
+    With `catalog`, member lists and grep-able text come from the fragment
+    dir's SQLite catalogue (catalog.py) instead, populated by one streaming
+    pass per fragment and reused across runs until the fragment changes.
+
+    Safe to share between the harness's tool threads: each per-fragment
+    structure is built once under that fragment's lock, and TarFile handles
+    and seek readers (which carry a file position) are per thread.
+    """
 
-    def __init__(self, frag_dir: Path):
+    def __init__(self, frag_dir: Path, catalog: bool = False):
         self.frag_dir = frag_dir
+        self._catalog = Catalog(frag_dir, _GREP_MAX_BYTES) if catalog else None
         self._infos: dict[str, FragmentInfo] = {}
-        self._tars: dict[str, tarfile.TarFile] = {}
-        self._names: dict[str, list[str]] = {}
+        self._local = threading.local()  # .tars / .readers: this thread's handles
+        self._handles: list[tarfile.TarFile | SeekableReader] = []  # every thread's, for close()
+        self._lock = threading.Lock()  # _handles, _path_index
+        self._frag_locks: dict[str, threading.RLock] = {}
+        self._indexes: dict[str, MemberIndex | None] = {}
+        self._tarmembers: dict[str, list[tarfile.TarInfo]] = {}
+        self._tables: dict[str, MemberTable] = {}
+        self._tarinfos: dict[str, dict[str, tarfile.TarInfo]] = {}
+        self._trigrams: dict[str, TrigramIndex | None] = {}
+        self._path_index: PathIndex | None = None
         manifest = _load_manifest(frag_dir)
         for p in sorted(frag_dir.iterdir()):
-            if not p.is_file() or not p.name.endswith(".tar.gz"):
+            if not p.is_file() or not is_archive_name(p.name):
                 continue
             if ".rootfs." in p.name and ".stitched." not in p.name:
                 # Skip fw2tar's final selected output; we want the raw per-extractor or shard pieces.
@@ -95,7 +223,11 @@ class FragmentCache:
                 info.shard_score = meta.get("score")
                 info.file_count = meta.get("file_count")
                 info.reextracted_with = meta.get("reextracted_with")
+                info.aliases = list(meta.get("aliases") or [])
             self._infos[p.name] = info
+            self._frag_locks[p.name] = threading.RLock()
+        if self._catalog is not None:
+            self._catalog.prune(set(self._infos))
 
     def names(self) -> list[str]:
         return list(self._infos.keys())
@@ -105,22 +237,152 @@ class FragmentCache:
             raise KeyError(f"unknown fragment: {name!r} (known: {list(self._infos)})")
         return self._infos[name]
 
-    def tar(self, name: str) -> tarfile.TarFile:
-        if name not in self._tars:
-            self._tars[name] = tarfile.open(self.info(name).path, "r:*")
-        return self._tars[name]
+    def _guard(self, name: str) -> threading.RLock:
+        self.info(name)
+        return self._frag_locks[name]
+
+    def _own(self, handle):
+        with self._lock:
+            self._handles.append(handle)
+        return handle
 
-    def member_names(self, name: str) -> list[str]:
-        if name not in self._names:
-            self._names[name] = self.tar(name).getnames()
-        return self._names[name]
+    def tar(self, name: str) -> tarfile.TarFile:
+        """This thread's TarFile for the fragment."""
+        tars = self._local.__dict__.setdefault("tars", {})
+        if name not in tars:
+            tars[name] = self._own(open_tar(self.info(name).path))
+        return tars[name]
+
+    def tar_members(self, name: str) -> list[tarfile.TarInfo]:
+        """The fragment's TarInfos, listed once and shared by every thread's
+        TarFile (extractfile only needs a member's offsets)."""
+        if name not in self._tarmembers:
+            with self._guard(name):
+                if name not in self._tarmembers:
+                    self._tarmembers[name] = self.tar(name).getmembers()
+        return self._tarmembers[name]
+
+    def index(self, name: str) -> MemberIndex | None:
+        """The fragment's member index (current sidecar, catalogue, or an
+        adopted snapshot), or None if it has none."""
+        if name not in self._indexes:
+            with self._guard(name):
+                if name not in self._indexes:
+                    path = self.info(name).path
+                    if self._catalog is not None:
+                        self._indexes[name] = self._catalog.index(name, path)
+                    else:
+                        self._indexes[name] = MemberIndex.load(path)
+        return self._indexes[name]
+
+    def snapshot(self, name: str) -> MemberIndex:
+        """The fragment's member list as a MemberIndex, read from the tar if
+        there is no sidecar or catalogue. Picklable, for adopt() in another
+        process's cache."""
+        index = self.index(name)
+        if index is None:
+            index = MemberIndex([MemberRecord.from_tarinfo(ti) for ti in self.tar_members(name)])
+        return index
+
+    def adopt(self, name: str, index: MemberIndex) -> None:
+        """Use a snapshot() taken elsewhere instead of listing the fragment."""
+        with self._guard(name):
+            self._indexes[name] = index
+
+    def _reader(self, name: str) -> SeekableReader | None:
+        """This thread's seek reader for the fragment, if it has a seek table."""
+        readers = self._local.__dict__.setdefault("readers", {})
+        if name not in readers:
+            index = self.index(name)
+            reader = open_reader(self.info(name).path, index.seek) if index is not None else None
+            readers[name] = self._own(reader) if reader is not None else None
+        return readers[name]
+
+    def members(self, name: str) -> list[MemberRecord] | list[tarfile.TarInfo]:
+        """Index records if available, else TarInfos. Both expose name,
+        linkname, size, isreg(), issym() and islnk()."""
+        index = self.index(name)
+        if index is not None:
+            return index.records
+        return self.tar_members(name)
+
+    def table(self, name: str) -> MemberTable:
+        """Path lookups for the fragment, built on first use."""
+        if name not in self._tables:
+            with self._guard(name):
+                if name not in self._tables:
+                    self._tables[name] = MemberTable(self.members(name))
+        return self._tables[name]
+
+    def path_index(self) -> PathIndex:
+        """Exact and suffix path lookup across every fragment, built on
+        first use from the fragments' tables."""
+        if self._path_index is None:
+            tables = [(n, self.table(n).norm_names) for n in self.names()]
+            with self._lock:
+                if self._path_index is None:
+                    self._path_index = PathIndex(tables)
+        return self._path_index
+
+    def resolve(self, name: str, path: str) -> MemberRecord | tarfile.TarInfo | None:
+        """Find a member by relaxed path lookup (see MemberTable.resolve)."""
+        return self.table(name).resolve(path)
+
+    def read_member(self, name: str, member: MemberRecord | tarfile.TarInfo, max_bytes: int) -> bytes:
+        """Up to max_bytes + 1 bytes of a regular member from resolve(); the
+        extra byte tells the caller it was truncated."""
+        if isinstance(member, MemberRecord):
+            if self._catalog is not None and member.size <= _GREP_MAX_BYTES:
+                data = self._catalog.content(member.hash)
+                if data is not None:
+                    return data[: max_bytes + 1]
+            reader = self._reader(name)
+            if reader is not None:
+                return reader.read(member.offset, min(member.size, max_bytes + 1))
+            member = self._tarinfo(name, member.name)
+        return _read_member_bytes(self.tar(name), member, max_bytes)
+
+    def trigrams(self, name: str, build: bool = True) -> TrigramIndex | None:
+        """The fragment's grep trigram index: loaded from beside the
+        archive, else (with `build`) built in one pass and saved there."""
+        index = self._trigrams.get(name)
+        if index is not None:
+            return index
+        path = self.info(name).path
+        with self._guard(name):
+            if name not in self._trigrams:
+                index = self._trigrams[name] = TrigramIndex.load(path, _GREP_MAX_BYTES)
+            index = self._trigrams[name]
+            if index is None and build:
+                if self._catalog is not None:
+                    index = TrigramIndex.from_texts(self._catalog.texts(name, path), _GREP_MAX_BYTES)
+                else:
+                    with open_tar(path) as tf:
+                        index = TrigramIndex.build(tf, _GREP_MAX_BYTES)
+                self._trigrams[name] = index
+                try:
+                    index.write(path)
+                except OSError:
+                    pass  # read-only fragment dir: keep it for this session only
+        return index
+
+    def _tarinfo(self, name: str, member_name: str) -> tarfile.TarInfo:
+        # Index without a seek table: contents come from tarfile, but look the
+        # TarInfo up by name rather than through getmember's linear scan.
+        if name not in self._tarinfos:
+            self._tarinfos[name] = {ti.name: ti for ti in self.tar_members(name)}
+        return self._tarinfos[name][member_name]
 
     def close(self):
-        for t in self._tars.values():
+        with self._lock:
+            handles, self._handles = self._handles, []
+        for t in handles:
             try:
                 t.close()
             except Exception:
                 pass
+        if self._catalog is not None:
+            self._catalog.close()
 
 
 # ---------- Args models ----------
@@ -160,6 +422,12 @@ class FragmentOnlyArgs(BaseModel):
     fragment: str
 
 
+class LocatePathArgs(BaseModel):
+    paths: list[str] = Field(min_length=1, max_length=20,
+                             description="paths or path tails, e.g. ['/usr/lib/libfoo.so', 'www/cgi-bin/luci']")
+    max: int = Field(default=10, ge=1, le=100, description="matches per path")
+
+
 # ---------- Helpers ----------
 
 def _normalize(name: str) -> str:
@@ -167,40 +435,12 @@ def _normalize(name: str) -> str:
     return n
 
 
-def _resolve_member(tf: tarfile.TarFile, path: str) -> tarfile.TarInfo | None:
-    """Find a member by relaxed path lookup. Tarballs may store names as './foo'."""
-    candidates = [path, "./" + path.lstrip("/"), path.lstrip("/")]
-    for c in candidates:
-        try:
-            return tf.getmember(c)
-        except KeyError:
-            continue
-    norm = _normalize(path)
-    for m in tf.getmembers():
-        if _normalize(m.name) == norm:
-            return m
-    return None
-
-
-def _glob_paths(names: list[str], pattern: str, limit: int) -> list[str]:
-    norm_names = [_normalize(n) for n in names]
-    matched: list[str] = []
-    if "**" in pattern:
-        # fnmatch doesn't handle ** — convert to a regex.
-        regex_pat = re.escape(pattern).replace(r"\*\*", ".*").replace(r"\*", "[^/]*").replace(r"\?", ".")
-        rx = re.compile("^" + regex_pat + "$")
-        for n in norm_names:
-            if rx.match(n):
-                matched.append(n)
-                if len(matched) >= limit:
-                    break
-    else:
-        for n in norm_names:
-            if fnmatch.fnmatchcase(n, pattern):
-                matched.append(n)
-                if len(matched) >= limit:
-                    break
-    return matched
+def _span(sorted_names: list[str], prefix: str) -> tuple[int, int]:
+    """The index range of `sorted_names` starting with `prefix`."""
+    if not prefix:
+        return 0, len(sorted_names)
+    lo = bisect.bisect_left(sorted_names, prefix)
+    return lo, bisect.bisect_left(sorted_names, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo)
 
 
 def _read_member_bytes(tf: tarfile.TarFile, ti: tarfile.TarInfo, max_bytes: int) -> bytes:
@@ -211,6 +451,10 @@ def _read_member_bytes(tf: tarfile.TarFile, ti: tarfile.TarInfo, max_bytes: int)
     return data
 
 
+def _type_of(m: MemberRecord | tarfile.TarInfo) -> str:
+    return m.type if isinstance(m, MemberRecord) else type_name(m)
+
+
 def _safe_decode(data: bytes) -> str:
     return data.decode("utf-8", errors="replace")
 
@@ -218,14 +462,12 @@ def _safe_decode(data: bytes) -> str:
 # ---------- Tool implementations ----------
 
 def tool_list_paths(cache: FragmentCache, args: ListPathsArgs) -> dict:
-    names = cache.member_names(args.fragment)
-    hits = _glob_paths(names, args.pattern, args.max)
+    hits = cache.table(args.fragment).glob(args.pattern, args.max)
     return {"fragment": args.fragment, "pattern": args.pattern, "count": len(hits), "paths": hits}
 
 
 def tool_read_file(cache: FragmentCache, args: ReadFileArgs) -> dict:
-    tf = cache.tar(args.fragment)
-    ti = _resolve_member(tf, args.path)
+    ti = cache.resolve(args.fragment, args.path)
     if ti is None:
         return {"fragment": args.fragment, "path": args.path, "error": "not found"}
     if ti.issym() or ti.islnk():
@@ -234,8 +476,8 @@ def tool_read_file(cache: FragmentCache, args: ReadFileArgs) -> dict:
             "symlink_to": ti.linkname, "size": 0, "truncated": False, "content": "",
         }
     if not ti.isreg():
-        return {"fragment": args.fragment, "path": args.path, "error": f"not a regular file (type={ti.type!r})"}
-    data = _read_member_bytes(tf, ti, args.max_bytes)
+        return {"fragment": args.fragment, "path": args.path, "error": f"not a regular file (type={_type_of(ti)!r})"}
+    data = cache.read_member(args.fragment, ti, args.max_bytes)
     truncated = len(data) > args.max_bytes
     data = data[: args.max_bytes]
     return {
@@ -246,23 +488,26 @@ def tool_read_file(cache: FragmentCache, args: ReadFileArgs) -> dict:
 
 
 def tool_grep(cache: FragmentCache, args: GrepArgs) -> dict:
-    tf = cache.tar(args.fragment)
-    names = cache.member_names(args.fragment)
     try:
         rx = re.compile(args.pattern)
     except re.error as e:
         return {"error": f"bad regex: {e}"}
-    candidate_paths = _glob_paths(names, args.path_glob, limit=500)
+    candidate_paths = cache.table(args.fragment).glob(args.path_glob, limit=500)
+    # Only files holding every literal the regex needs can have a hit.
+    index = cache.trigrams(args.fragment, build=len(candidate_paths) >= _TRIGRAM_MIN_CANDIDATES)
+    possible = index.candidates(args.pattern) if index is not None else None
     hits: list[dict] = []
     for p in candidate_paths:
         if len(hits) >= args.max_hits:
             break
-        ti = _resolve_member(tf, p)
+        ti = cache.resolve(args.fragment, p)
         if ti is None or not ti.isreg():
             continue
-        if ti.size > 256 * 1024:
+        if ti.size > _GREP_MAX_BYTES:
+            continue
+        if possible is not None and ti.name not in possible:
             continue
-        data = _read_member_bytes(tf, ti, 256 * 1024)
+        data = cache.read_member(args.fragment, ti, _GREP_MAX_BYTES)
         try:
             text = data.decode("utf-8", errors="strict")
         except UnicodeDecodeError:
@@ -282,14 +527,13 @@ _STRINGS_RE = re.compile(rb"[\x20-\x7e]{%d,}")
 
 
 def tool_strings(cache: FragmentCache, args: StringsArgs) -> dict:
-    tf = cache.tar(args.fragment)
-    ti = _resolve_member(tf, args.path)
+    ti = cache.resolve(args.fragment, args.path)
     if ti is None:
         return {"error": "not found", "fragment": args.fragment, "path": args.path}
     if not ti.isreg():
         return {"error": "not a regular file", "fragment": args.fragment, "path": args.path}
     rx = re.compile(rb"[\x20-\x7e]{%d,}" % args.min_len)
-    data = _read_member_bytes(tf, ti, 2 * 1024 * 1024)
+    data = cache.read_member(args.fragment, ti, 2 * 1024 * 1024)
     hits = []
     for m in rx.finditer(data):
         s = m.group(0).decode("ascii", errors="replace")
@@ -305,28 +549,51 @@ def tool_strings(cache: FragmentCache, args: StringsArgs) -> dict:
 
 
 def tool_find_dangling_symlinks(cache: FragmentCache, args: FragmentArgs) -> dict:
-    tf = cache.tar(args.fragment)
-    names_set = set(_normalize(n) for n in cache.member_names(args.fragment))
+    table = cache.table(args.fragment)
     hits = []
-    for ti in tf.getmembers():
+    for ti in table.members:
         if not (ti.issym() or ti.islnk()):
             continue
         target = ti.linkname
         if not target.startswith("/"):
             continue
         rel = target.lstrip("/")
-        if rel not in names_set:
+        if rel not in table:
             hits.append({"link": _normalize(ti.name), "target": target})
             if len(hits) >= args.max:
                 break
     return {"fragment": args.fragment, "count": len(hits), "dangling": hits}
 
 
+def _locate_row(cache: FragmentCache, hit, key: str) -> dict:
+    m = cache.table(hit.fragment).members[hit.pos]
+    row = {"fragment": hit.fragment, "path": hit.path, "type": _type_of(m),
+           key: "/" + hit.prefix if key == "mount_point" else hit.prefix}
+    if m.issym() or m.islnk():
+        row["linkname"] = m.linkname
+    return row
+
+
+def tool_locate_path(cache: FragmentCache, args: LocatePathArgs) -> dict:
+    index = cache.path_index()
+    results = []
+    for path in args.paths:
+        found = index.suffix(path)
+        mounts = index.mount_points(path)
+        results.append({
+            "query": path,
+            "count": len(found),
+            "matches": [_locate_row(cache, h, "prefix") for h in found[: args.max]],
+            "if_mounted": [_locate_row(cache, h, "mount_point") for h in mounts[: args.max]],
+        })
+    return {"results": results}
+
+
 _KEY_CHECKS = {
     "has_etc_passwd": "etc/passwd",
     "has_sbin_init": "sbin/init",
     "has_bin_sh": "bin/sh",
-    "has_lib_ld": "lib",  # checked specially below
+    "has_lib_ld": "lib/ld[-.]*",  # a glob, unlike the rest
     "has_etc_fstab": "etc/fstab",
     "has_etc_inittab": "etc/inittab",
     "has_etc_init_d_rcS": "etc/init.d/rcS",
@@ -334,16 +601,14 @@ _KEY_CHECKS = {
 
 
 def tool_fs_summary(cache: FragmentCache, args: FragmentOnlyArgs) -> dict:
-    tf = cache.tar(args.fragment)
-    names = cache.member_names(args.fragment)
-    norm = [_normalize(n) for n in names]
-    norm_set = set(norm)
+    table = cache.table(args.fragment)
+    norm = table.norm_names
     result: dict[str, Any] = {"fragment": args.fragment}
     for k, p in _KEY_CHECKS.items():
         if k == "has_lib_ld":
-            result[k] = any(n.startswith("lib/ld-") or n.startswith("lib/ld.") or n == "lib/ld-linux.so" for n in norm)
+            result[k] = bool(table.glob(p, 1))
         else:
-            result[k] = p in norm_set or any(n == p for n in norm)
+            result[k] = p in table
     # top-level directory counts
     counts: dict[str, int] = {}
     for n in norm:
@@ -366,6 +631,9 @@ def tool_fs_summary(cache: FragmentCache, args: FragmentOnlyArgs) -> dict:
         result["manifest_file_count"] = info.file_count
     if info.reextracted_with is not None:
         result["reextracted_with"] = info.reextracted_with
+    if info.aliases:
+        result["identical_copies"] = 1 + len(info.aliases)
+        result["alias_root_paths"] = info.aliases
     return result
 
 
@@ -425,6 +693,17 @@ TOOLS: list[Tool] = [
         args_model=FragmentArgs,
         fn=tool_find_dangling_symlinks,
     ),
+    Tool(
+        name="locate_path",
+        description=(
+            "Find paths across ALL fragments in one call. For each query: 'matches' are members "
+            "whose path ends with it (prefix = leading dirs, '' = same path); 'if_mounted' are "
+            "members that would provide it if their fragment were mounted at mount_point. "
+            "Use on dangling symlink targets and paths named in init scripts."
+        ),
+        args_model=LocatePathArgs,
+        fn=tool_locate_path,
+    ),
     Tool(
         name="fs_summary",
         description=(
@@ -0,0 +1,280 @@
+"""Per-fragment trigram index for `grep_in_fragment`.
+
+grep only searches regular files of at most `max_size` bytes that decode as
+UTF-8. The first grep on a fragment reads those files once, in archive order,
+and records which (ASCII-lowercased) byte trigrams each one contains. A regex
+is reduced to the literal strings every match must contain (see
+`regex_query`), and only files holding all of their trigrams are read and
+scanned. Files grep would skip anyway (too big, binary) are never read again.
+
+The index is written to `<archive>.trigrams` and reused while the archive's
+fingerprint (memberindex.archive_fingerprint) still matches. Layout, after
+the magic line, zlib-compressed:
+
+    u32 header length, JSON header {version, archive_size, archive_tail,
+        max_size, files: [member name, ...]}
+    u32 n, then three little-endian u32 arrays:
+        keys      n sorted trigrams, (b0 << 16) | (b1 << 8) | b2
+        offsets   n + 1 cumulative posting counts
+        postings  file ids, ascending per trigram
+
+A query trigram is a bisect in `keys`; nothing is unpacked at load time.
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import re
+import struct
+import sys
+import tarfile
+import zlib
+from array import array
+from pathlib import Path
+from typing import Optional, Union
+
+try:
+    from re import _parser as _sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover - older interpreters
+    import sre_parse as _sre_parse  # type: ignore
+
+from .memberindex import archive_fingerprint
+
+TRIGRAM_SUFFIX = ".trigrams"
+TRIGRAM_VERSION = 1
+
+_MAGIC = b"fwstitch-trigrams\n"
+
+_CI_UNSAFE = frozenset(b"iks")
+
+# A query is None (no constraint), ("lit", text, ignorecase), or
+# ("and" | "or", [query, ...]).
+Query = Optional[tuple]
+
+
+def trigram_path(archive: Path) -> Path:
+    return archive.with_name(archive.name + TRIGRAM_SUFFIX)
+
+
+def _u32(values) -> array:
+    a = array("I", values)
+    if a.itemsize != 4:  # pragma: no cover
+        a = array("L", values)
+    return a
+
+
+def _le(a: array) -> bytes:
+    if sys.byteorder != "little":  # pragma: no cover
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _from_le(data: bytes) -> array:
+    a = _u32([])
+    a.frombytes(data)
+    if sys.byteorder != "little":  # pragma: no cover
+        a.byteswap()
+    return a
+
+
+def _trigrams(data: bytes) -> set[int]:
+    return {(a << 16) | (b << 8) | c for a, b, c in zip(data, data[1:], data[2:])}
+
+
+class TrigramIndex:
+    def __init__(self, files: list[str], keys: array, offsets: array, postings: array, max_size: int):
+        self.files = files
+        self.max_size = max_size
+        self._keys = keys
+        self._offsets = offsets
+        self._postings = postings
+
+    # --------------- build / persist ---------------
+
+    @classmethod
+    def build(cls, tf: tarfile.TarFile, max_size: int) -> "TrigramIndex":
+        """Index every regular member of `tf` no larger than `max_size`
+        that is valid UTF-8. Reads the archive once, front to back."""
+        def texts():
+            for ti in tf:
+                if not ti.isreg() or ti.size > max_size:
+                    continue
+                f = tf.extractfile(ti)
+                data = f.read() if f is not None else b""
+                try:
+                    data.decode("utf-8", errors="strict")
+                except UnicodeDecodeError:
+                    continue
+                yield ti.name, data
+        return cls.from_texts(texts(), max_size)
+
+    @classmethod
+    def from_texts(cls, texts, max_size: int) -> "TrigramIndex":
+        """Index already-filtered (member name, data) pairs, e.g. from the
+        SQLite catalogue."""
+        files: list[str] = []
+        table: dict[int, list[int]] = {}
+        for name, data in texts:
+            fid = len(files)
+            files.append(name)
+            for t in _trigrams(data.lower()):
+                table.setdefault(t, []).append(fid)
+        keys = sorted(table)
+        offsets = [0]
+        postings: list[int] = []
+        for k in keys:
+            postings.extend(table[k])
+            offsets.append(len(postings))
+        return cls(files, _u32(keys), _u32(offsets), _u32(postings), max_size)
+
+    def write(self, archive: Path) -> Path:
+        size, tail = archive_fingerprint(archive)
+        header = json.dumps({
+            "version": TRIGRAM_VERSION, "archive_size": size, "archive_tail": tail,
+            "max_size": self.max_size, "files": self.files,
+        }, separators=(",", ":")).encode()
+        body = b"".join([
+            struct.pack("<I", len(header)), header, struct.pack("<I", len(self._keys)),
+            _le(self._keys), _le(self._offsets), _le(self._postings),
+        ])
+        dest = trigram_path(archive)
+        part = dest.with_name(dest.name + ".part")
+        with open(part, "wb") as f:
+            f.write(_MAGIC)
+            f.write(zlib.compress(body, 1))
+        os.replace(part, dest)
+        return dest
+
+    @classmethod
+    def load(cls, archive: Path, max_size: int) -> Optional["TrigramIndex"]:
+        """The persisted index for `archive`, or None if missing, unreadable,
+        built with another `max_size`, or built for different archive bytes."""
+        try:
+            with open(trigram_path(archive), "rb") as f:
+                if f.read(len(_MAGIC)) != _MAGIC:
+                    return None
+                body = zlib.decompress(f.read())
+            (hlen,) = struct.unpack_from("<I", body, 0)
+            header = json.loads(body[4: 4 + hlen])
+            if header.get("version") != TRIGRAM_VERSION or header.get("max_size") != max_size:
+                return None
+            if (header["archive_size"], header["archive_tail"]) != archive_fingerprint(archive):
+                return None
+            pos = 4 + hlen
+            (n,) = struct.unpack_from("<I", body, pos)
+            pos += 4
+            keys = _from_le(body[pos: pos + 4 * n])
+            pos += 4 * n
+            offsets = _from_le(body[pos: pos + 4 * (n + 1)])
+            pos += 4 * (n + 1)
+            postings = _from_le(body[pos:])
+            if len(offsets) != n + 1 or len(postings) != (offsets[-1] if n else 0):
+                return None
+            return cls(header["files"], keys, offsets, postings, max_size)
+        except (OSError, ValueError, KeyError, TypeError, struct.error, zlib.error):
+            return None
+
+    # --------------- query ---------------
+
+    def _posting(self, trigram: int) -> array:
+        i = bisect.bisect_left(self._keys, trigram)
+        if i == len(self._keys) or self._keys[i] != trigram:
+            return _u32([])
+        return self._postings[self._offsets[i]: self._offsets[i + 1]]
+
+    def _literal(self, text: str, ignorecase: bool) -> Optional[set[int]]:
+        data = text.encode("utf-8").lower()
+        grams = _trigrams(data)
+        if ignorecase:
+            # Case-insensitive matching lets non-ASCII letters match other
+            # bytes, and i/k/s match U+0130/U+0131, U+212A and U+017F.
+            grams = {t for t in grams
+                     if not t & 0x808080 and not _CI_UNSAFE.intersection(t.to_bytes(3, "big"))}
+        if not grams:
+            return None
+        result: Optional[set[int]] = None
+        for plist in sorted((self._posting(t) for t in grams), key=len):
+            result = set(plist) if result is None else result.intersection(plist)
+            if not result:
+                break
+        return result
+
+    def _eval(self, q: Query) -> Optional[set[int]]:
+        if q is None:
+            return None
+        kind = q[0]
+        if kind == "lit":
+            return self._literal(q[1], q[2])
+        parts = [self._eval(c) for c in q[1]]
+        if kind == "and":
+            sets = [p for p in parts if p is not None]
+            if not sets:
+                return None
+            sets.sort(key=len)
+            return sets[0].intersection(*sets[1:])
+        if any(p is None for p in parts):
+            return None
+        return set().union(*parts)
+
+    def candidates(self, pattern: str) -> set[str]:
+        """Names of indexed files that can contain a line matching
+        `pattern`. Every grep-eligible file if no literal is required."""
+        ids = self._eval(regex_query(pattern))
+        if ids is None:
+            return set(self.files)
+        return {self.files[i] for i in ids}
+
+
+# --------------- regex -> required literals ---------------
+
+def regex_query(pattern: Union[str, re.Pattern]) -> Query:
+    """The literals any match of `pattern` must contain, as an and/or tree
+    (None: nothing is required). Conservative: anything not understood
+    contributes no constraint."""
+    if isinstance(pattern, re.Pattern):
+        pattern = pattern.pattern
+    try:
+        parsed = _sre_parse.parse(pattern)
+    except Exception:
+        return None
+    return _seq(list(parsed), bool(parsed.state.flags & re.IGNORECASE))
+
+
+def _seq(items: list, ignorecase: bool) -> Query:
+    terms: list = []
+    run: list[str] = []
+
+    def flush():
+        if run:
+            terms.append(("lit", "".join(run), ignorecase))
+            run.clear()
+
+    for op, av in items:
+        if op is _sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        flush()
+        q: Query = None
+        if op is _sre_parse.SUBPATTERN:
+            _group, add_flags, del_flags, sub = av
+            ci = (ignorecase or bool(add_flags & re.IGNORECASE)) and not del_flags & re.IGNORECASE
+            q = _seq(list(sub), ci)
+        elif op in (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT,
+                    getattr(_sre_parse, "POSSESSIVE_REPEAT", None)):
+            lo, _hi, sub = av
+            if lo >= 1:
+                q = _seq(list(sub), ignorecase)
+        elif op is getattr(_sre_parse, "ATOMIC_GROUP", None):
+            q = _seq(list(av), ignorecase)
+        elif op is _sre_parse.BRANCH:
+            alts = [_seq(list(a), ignorecase) for a in av[1]]
+            if all(a is not None for a in alts):
+                q = ("or", alts)
+        if q is not None:
+            terms.append(q)
+    flush()
+    if not terms:
+        return None
+    return terms[0] if len(terms) == 1 else ("and", terms)
@@ -0,0 +1,148 @@
+"""Index over unblob's structured `--report` JSON.
+
+Shard typing used to come from string-matching every path component against
+EXTRACT_SUFFIX_TYPES, which is only as good as the names unblob picks (a
+squashfs carved from `firmware.bin` is `0-1234.squashfs_v4_le_extract`, but a
+whole-file one called `rootfs` is just `rootfs_extract`). The report names the
+handler for every chunk, along with its offsets and the file it came from, so
+we key it by extract directory:
+
+    rel path of `*_extract` dir -> ChunkRecord(handler, fs_type, offsets, blob)
+
+That makes typing, the "is this a filesystem boundary?" test, and blob lookup
+for re-extraction O(1) dict hits. The suffix heuristic in shard.py remains the
+fallback for binwalk, `--from-extracted` trees, and any dir the report
+doesn't cover.
+
+unblob's layout, which the extract-dir derivation mirrors: a file at `F`
+gets carve dir `F_extract` (`<extract-root>/<name>_extract` for the input
+blob itself). A chunk spanning the whole file is extracted straight into the
+carve dir. Other chunks are carved to `F_extract/<start>-<end>.<handler>` and
+extracted next to that as `..._extract`. The carved file itself is usually
+deleted afterwards, so re-extraction slices [start, end) out of `F`.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+
+# unblob handler name prefix -> fs type (same vocabulary as
+# EXTRACT_SUFFIX_TYPES). Longest / most specific first.
+HANDLER_FS_TYPES: list[tuple[str, str]] = [
+    ("squashfs", "squashfs"),
+    ("ubifs", "ubifs"),
+    ("ubi", "ubi"),
+    ("jffs2", "jffs2"),
+    ("cramfs", "cramfs"),
+    ("yaffs2", "yaffs2"),
+    ("yaffs", "yaffs"),
+    ("cpio", "cpio"),
+    ("tar", "tar"),
+    ("gzip", "gzip"),
+    ("extfs", "ext"),
+    ("fat", "fat"),
+    ("iso9660", "iso9660"),
+    ("romfs", "romfs"),
+]
+
+
+def handler_fs_type(handler: str) -> str:
+    for prefix, ty in HANDLER_FS_TYPES:
+        if handler.startswith(prefix):
+            return ty
+    return handler
+
+
+@dataclass(frozen=True)
+class ChunkRecord:
+    handler: str
+    fs_type: str
+    start_offset: int
+    end_offset: int
+    source_file: Path        # the file the chunk lives in
+    whole_file: bool         # chunk spans all of source_file
+
+    @property
+    def size(self) -> int:
+        return self.end_offset - self.start_offset
+
+
+@dataclass
+class UnblobReport:
+    extraction_root: Path
+    by_extract_dir: dict[tuple[str, ...], ChunkRecord]
+
+    @classmethod
+    def load(cls, report_path: Path, extraction_root: Path) -> Optional["UnblobReport"]:
+        """Parse unblob's report. Returns None if it's missing or unreadable,
+        in which case callers fall back to the suffix heuristic.
+        """
+        try:
+            with open(report_path, "r") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if not isinstance(data, list):
+            return None
+        root = extraction_root.resolve()
+        records: dict[tuple[str, ...], ChunkRecord] = {}
+        for task_result in data:
+            if not isinstance(task_result, dict):
+                continue
+            task_path = (task_result.get("task") or {}).get("path")
+            if not task_path:
+                continue
+            src = Path(task_path).resolve()
+            reports = task_result.get("reports") or []
+            chunks = [r for r in reports if r.get("__typename__") == "ChunkReport"]
+            if not chunks:
+                continue
+            file_size = next((r.get("size") for r in reports
+                              if r.get("__typename__") == "StatReport"), None)
+            carve_dir = _carve_dir_for(src, root)
+            for c in chunks:
+                try:
+                    handler = str(c["handler_name"])
+                    start, end = int(c["start_offset"]), int(c["end_offset"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                whole = start == 0 and len(chunks) == 1 and file_size == end
+                extract_dir = carve_dir if whole else (
+                    carve_dir / f"{start}-{end}.{handler}_extract"
+                )
+                try:
+                    rel = extract_dir.relative_to(root).parts
+                except ValueError:
+                    continue
+                records[rel] = ChunkRecord(
+                    handler=handler, fs_type=handler_fs_type(handler),
+                    start_offset=start, end_offset=end,
+                    source_file=src, whole_file=whole,
+                )
+        return cls(extraction_root=root, by_extract_dir=records)
+
+    def extract_dir_record(self, rel: tuple[str, ...]) -> Optional[ChunkRecord]:
+        """Record for the `*_extract` dir at `rel`, if the report covers it."""
+        return self.by_extract_dir.get(rel)
+
+    def nearest(self, rel: tuple[str, ...]) -> Optional[tuple[tuple[str, ...], ChunkRecord]]:
+        """Closest `*_extract` ancestor of `rel` (inclusive) that the report
+        covers, with its record. O(depth) dict lookups.
+        """
+        for n in range(len(rel), 0, -1):
+            rec = self.by_extract_dir.get(rel[:n])
+            if rec is not None:
+                return rel[:n], rec
+        return None
+
+
+def _carve_dir_for(path: Path, root: Path) -> Path:
+    try:
+        path.relative_to(root)
+        return path.with_name(path.name + "_extract")
+    except ValueError:
+        # The input blob itself lives outside the extraction root.
+        return root / (path.name + "_extract")